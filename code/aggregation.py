@@ -0,0 +1,399 @@
+# -*- coding: utf-8 -*-
+
+from collections import Counter
+import itertools
+import threading
+
+import numpy as np
+
+from cotag_tensor import CoTagTensor, foldedCounts, yearMatrix, yearRange
+
+# NetworkX docs: https://networkx.github.io/documentation/latest/
+
+
+################################
+###     GLOBAL VARIABLES     ###
+################################
+
+# Bits of a packed count key holding the year id (the rest hold code ids)
+YEAR_BITS = 16
+
+# Pending (unreduced) keys held by BulkCounts before it compacts them
+MAX_PENDING = 1 << 22
+
+
+#################################
+###     UTILITY FUNCTIONS     ###
+#################################
+
+class CountShard(object):
+    """
+    Node and edge counts accumulated by a single worker
+
+    Attributes:
+        nodes - Counter keyed by (code, year)
+        edges - Counter keyed by (code_a, code_b, year) with code_a <= code_b
+    """
+
+    def __init__(self):
+        self.nodes = Counter()
+        self.edges = Counter()
+
+    def addPaper(self, year, codes):
+        """
+        Count a single paper
+
+        Args:
+            year - single year string
+            codes - list of JEL codes
+
+        Return:
+            None
+        """
+
+        nodes, edges = self.nodes, self.edges
+        for code in codes:
+            nodes[code, year] += 1
+        for a, b in itertools.combinations(codes, 2):
+            if b < a:
+                a, b = b, a
+            edges[a, b, year] += 1
+
+    def addRecords(self, records):
+        """
+        Count a batch of papers
+
+        Args:
+            records - iterable of (year, codes) tuples
+
+        Return:
+            None
+        """
+
+        for year, codes in records:
+            self.addPaper(year, codes)
+
+    def update(self, other):
+        """Fold the counts of another shard into this one"""
+        self.nodes.update(other.nodes)
+        self.edges.update(other.edges)
+
+
+class ShardedCounts(object):
+    """
+    Lock-free aggregation of paper counts across worker threads
+
+    Every thread writes only to its own CountShard; the shards are combined
+    once, after the workers are done. The only lock is taken when a thread
+    registers its shard on first use.
+    """
+
+    def __init__(self):
+        self.local = threading.local()
+        self.shards = []
+        self.lock = threading.Lock()
+
+    def shard(self):
+        """CountShard of the calling thread, created on first use"""
+        shard = getattr(self.local, "shard", None)
+        if shard is None:
+            shard = self.local.shard = CountShard()
+            with self.lock:
+                self.shards.append(shard)
+        return shard
+
+    def addRecords(self, records):
+        """
+        Count a batch of papers into the calling thread's shard
+
+        Args:
+            records - iterable of (year, codes) tuples
+
+        Return:
+            None
+        """
+
+        self.shard().addRecords(records)
+
+    def merge(self):
+        """
+        Combine all shards
+
+        Return:
+            CountShard holding the total counts
+        """
+
+        total = CountShard()
+        with self.lock:
+            for shard in self.shards:
+                total.update(shard)
+
+        return total
+
+
+def reduceKeys(keys, counts):
+    """
+    Sum counts of equal keys by sorting
+
+    Args:
+        keys - (K,) int64 array
+        counts - (K,) int array
+
+    Return:
+        tuple of (sorted unique keys, summed counts)
+    """
+
+    order = np.argsort(keys, kind="mergesort")
+    keys, counts = keys[order], counts[order]
+    if not len(keys):
+        return keys, counts
+    starts = np.flatnonzero(np.concatenate(([True], keys[1:] != keys[:-1])))
+
+    return keys[starts], np.add.reduceat(counts, starts)
+
+
+def paperPairs(offsets, ids):
+    """
+    All code pairs of every paper, canonically ordered
+
+    Pairs follow itertools.combinations over each paper's codes, so a code
+    repeated inside a paper gives an (a, a) pair.
+
+    Args:
+        offsets - (P + 1,) int array, paper i has codes ids[offsets[i]:offsets[i + 1]]
+        ids - int array of code ids
+
+    Return:
+        tuple of ((M,) paper index, (M,) smaller code id, (M,) larger code id)
+    """
+
+    k = np.diff(offsets)
+    papers, lo, hi = [np.zeros(0, dtype=np.int64)], [np.zeros(0, dtype=np.int64)], [np.zeros(0, dtype=np.int64)]
+
+    # papers with the same number of codes form one (rows, k) block
+    for n in np.unique(k[k >= 2]):
+        rows = np.flatnonzero(k == n)
+        block = ids[offsets[rows][:, None] + np.arange(n)]
+        i, j = np.triu_indices(n, 1)
+        a, b = block[:, i], block[:, j]
+        papers.append(np.repeat(rows, len(i)))
+        lo.append(np.minimum(a, b).ravel())
+        hi.append(np.maximum(a, b).ravel())
+
+    return np.concatenate(papers), np.concatenate(lo), np.concatenate(hi)
+
+
+class BulkCounts(object):
+    """
+    Node and edge counts of paper batches given as code-id arrays
+
+    Each batch is turned into packed (code, year) and (code_a, code_b, year)
+    integer keys with array operations, reduced by sorting, and kept until
+    the pending keys are compacted. Counts leave in one flush, as a
+    CountShard or a CoTagTensor. Counts are the same as CountShard's.
+
+    Args:
+        codes - list of JEL codes, position is the code id
+        max_pending - number of pending keys that triggers a compaction
+    """
+
+    def __init__(self, codes, max_pending=MAX_PENDING):
+        self.codes = list(codes)
+        self.index = dict((code, i) for i, code in enumerate(self.codes))
+        self.years = []
+        self.year_ids = {}
+        self.max_pending = max_pending
+        self.node_keys, self.node_counts = [], []
+        self.edge_keys, self.edge_counts = [], []
+        self.pending = 0
+        self.lock = threading.Lock()
+
+    def yearId(self, year):
+        """Integer id of a year string, assigned on first use"""
+        y = self.year_ids.get(year)
+        if y is None:
+            y = self.year_ids[year] = len(self.years)
+            self.years.append(year)
+            if y >> YEAR_BITS:
+                raise ValueError("More than %i distinct years" % (1 << YEAR_BITS))
+        return y
+
+    def encodeRecords(self, records):
+        """
+        Turn (year, codes) records into code-id arrays
+
+        Codes outside self.codes are ignored.
+
+        Args:
+            records - iterable of (year, codes) tuples
+
+        Return:
+            tuple of ((P,) year ids, (P + 1,) offsets, code ids)
+        """
+
+        index = self.index
+        years, lengths, ids = [], [], []
+        for year, codes in records:
+            years.append(self.yearId(year))
+            paper = [index[c] for c in codes if c in index]
+            lengths.append(len(paper))
+            ids.extend(paper)
+
+        offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        return np.array(years, dtype=np.int64), offsets, np.array(ids, dtype=np.int64)
+
+    def addRecords(self, records):
+        """Count a batch of (year, codes) records"""
+        self.addArrays(*self.encodeRecords(records))
+
+    def addArrays(self, years, offsets, ids):
+        """
+        Count a batch of papers given as arrays
+
+        Args:
+            years - (P,) int array of year ids (see yearId)
+            offsets - (P + 1,) int array, paper i has codes ids[offsets[i]:offsets[i + 1]]
+            ids - int array of code ids
+
+        Return:
+            None
+        """
+
+        years = np.asarray(years, dtype=np.int64)
+        offsets = np.asarray(offsets, dtype=np.int64)
+        ids = np.asarray(ids, dtype=np.int64)
+
+        paper = np.repeat(np.arange(len(years)), np.diff(offsets))
+        node_keys, node_counts = np.unique((ids << YEAR_BITS) | years[paper], return_counts=True)
+
+        paper, lo, hi = paperPairs(offsets, ids)
+        edge_keys = (((lo * len(self.codes)) + hi) << YEAR_BITS) | years[paper]
+        edge_keys, edge_counts = np.unique(edge_keys, return_counts=True)
+
+        with self.lock:
+            self.node_keys.append(node_keys)
+            self.node_counts.append(node_counts)
+            self.edge_keys.append(edge_keys)
+            self.edge_counts.append(edge_counts)
+            self.pending += len(node_keys) + len(edge_keys)
+            if self.pending >= self.max_pending:
+                self.compact()
+
+    def compact(self):
+        """Reduce all pending keys into one sorted array per kind"""
+        if len(self.node_keys) > 1:
+            keys, counts = reduceKeys(np.concatenate(self.node_keys), np.concatenate(self.node_counts))
+            self.node_keys, self.node_counts = [keys], [counts]
+        if len(self.edge_keys) > 1:
+            keys, counts = reduceKeys(np.concatenate(self.edge_keys), np.concatenate(self.edge_counts))
+            self.edge_keys, self.edge_counts = [keys], [counts]
+        self.pending = 0
+
+    def arrays(self):
+        """
+        Reduced counts as arrays
+
+        Return:
+            tuple of ((code ids, year ids, counts) of nodes, (code_a ids, code_b ids, year ids, counts) of edges)
+        """
+
+        with self.lock:
+            self.compact()
+            node_keys = self.node_keys[0] if self.node_keys else np.zeros(0, dtype=np.int64)
+            node_counts = self.node_counts[0] if self.node_counts else np.zeros(0, dtype=np.int64)
+            edge_keys = self.edge_keys[0] if self.edge_keys else np.zeros(0, dtype=np.int64)
+            edge_counts = self.edge_counts[0] if self.edge_counts else np.zeros(0, dtype=np.int64)
+
+        mask = (1 << YEAR_BITS) - 1
+        pairs = edge_keys >> YEAR_BITS
+        n = len(self.codes)
+        return ((node_keys >> YEAR_BITS, node_keys & mask, node_counts),
+                (pairs // n, pairs % n, edge_keys & mask, edge_counts))
+
+    def toShard(self):
+        """
+        Flush the counts into a CountShard, e.g. for addCountsToGraph
+
+        Return:
+            CountShard object
+        """
+
+        (code, year, c), (a, b, eyear, ec) = self.arrays()
+        codes, years = self.codes, self.years
+        shard = CountShard()
+        shard.nodes.update(dict(((codes[i], years[y]), n)
+                                for i, y, n in zip(code.tolist(), year.tolist(), c.tolist())))
+        shard.edges.update(dict(((codes[u], codes[v], years[y]), n)
+                                for u, v, y, n in zip(a.tolist(), b.tolist(), eyear.tolist(), ec.tolist())))
+
+        return shard
+
+    def toTensor(self, years=None):
+        """
+        Flush the counts into a CoTagTensor without building a graph
+
+        Years that are not numbers are left out. Pairs of a code with itself
+        are kept as self-loops, as addCountsToGraph keeps them.
+
+        Args:
+            years - optional (lower, upper) year bounds for the year axis
+
+        Return:
+            CoTagTensor object
+        """
+
+        (code, year, c), (a, b, eyear, ec) = self.arrays()
+        numeric = np.array([y.isdigit() for y in self.years], dtype=bool)
+        year_value = np.array([int(y) if y.isdigit() else 0 for y in self.years], dtype=np.int64)
+
+        keep = numeric[year] if len(year) else np.zeros(0, dtype=bool)
+        code, year, c = code[keep], year_value[year[keep]], c[keep]
+        keep = numeric[eyear] if len(eyear) else np.zeros(0, dtype=bool)
+        a, b, eyear, ec = a[keep], b[keep], year_value[eyear[keep]], ec[keep]
+
+        axis = yearRange(np.unique(np.concatenate((year, eyear))).tolist(), years)
+        pairs, rows = np.unique(a * len(self.codes) + b, return_inverse=True)
+        edges = np.column_stack((pairs // len(self.codes), pairs % len(self.codes)))
+
+        return CoTagTensor(self.codes, axis, edges,
+                           yearMatrix(rows, eyear, ec, len(pairs), axis),
+                           yearMatrix(code, year, c, len(self.codes), axis),
+                           edge_total=np.bincount(rows, weights=ec, minlength=len(pairs)),
+                           node_total=np.bincount(code, weights=c, minlength=len(self.codes)),
+                           edge_fold=foldedCounts(rows, eyear, ec, len(pairs), axis),
+                           node_fold=foldedCounts(code, year, c, len(self.codes), axis))
+
+
+def addCountsToGraph(G, counts, edge_data=True):
+    """
+    Write aggregated counts to node and edge attributes in one pass
+
+    Nodes must already exist with a "citations" attribute; edges are created
+    as needed. The resulting attributes match per-paper updates: "citations"
+    and per-year counts on nodes, "weight" and per-year counts on edges.
+
+    Args:
+        G - nx.Graph() object
+        counts - CountShard object
+        edge_data - whether to store per-year counts on edges
+
+    Return:
+        None
+    """
+
+    for (code, year), c in counts.nodes.iteritems():
+        data = G.node[code]
+        data["citations"] += c
+        data[year] = data.get(year, 0) + c
+
+    adj = G.adj
+    for (a, b, year), c in counts.edges.iteritems():
+        if b in adj[a]:
+            data = adj[a][b]
+            data["weight"] += c
+        else:
+            G.add_edge(a, b, weight=c)
+            data = adj[a][b]
+        if edge_data:
+            data[year] = data.get(year, 0) + c
@@ -0,0 +1,374 @@
+# -*- coding: utf-8 -*-
+
+import json
+import os
+import platform
+import shutil
+import subprocess
+import tempfile
+from time import strftime, time
+
+import networkx as nx
+import numpy as np
+
+from aggregation import BulkCounts, ShardedCounts, addCountsToGraph
+from centrality import eigenvectorSeries, pageRankSeries, sparseEigenvector, sparsePageRank
+from cleaning import defaultPipeline
+from clustering import averageClustering
+from cotag_tensor import CoTagTensor
+from edge_weights import topNeighbourSeries
+from graph_arrays import adjacencyMatrix, letterGroups
+from graph_store import readNetwork, writeNetwork
+from jel_taxonomy import loadTaxonomy
+from modularity import graphModularity
+from page_parser import benchmarkParser, parseDbPage
+from paper_store import PaperStore, aggregatePapers
+from path_metrics import largestComponent, pathMetrics
+from rollup import rollUp
+from synthetic import SyntheticCorpus
+
+# NetworkX docs: https://networkx.github.io/documentation/latest/
+
+
+#################################
+###      RUNTIME OPTIONS      ###
+#################################
+
+# Choose corpus sizes (number of papers) to benchmark, up to 10 ** 7
+SIZES = [1000, 10000, 100000]
+
+# Choose the random seed of the synthetic corpus (same seed, same corpus)
+SEED = 0
+
+# Choose how many papers to render and parse as HTML at most (parsing is timed per paper)
+PARSE_MAX_PAPERS = 100000
+
+# Choose how many papers to generate and aggregate at a time (bounds memory for large sizes)
+CHUNK_PAPERS = 1000000
+
+# Choose papers per synthetic search result page
+PER_PAGE = 100
+
+# Choose which top-level JEL categories make up the network
+CATEGORIES = ['A', 'B', 'C', 'D', 'E', 'F', 'G', 'H', 'I', 'J', 'K', 'L', 'M', 'N', 'O', 'P', 'Q', 'R']
+
+# Choose the year range of cleaning and the metrics
+YEARS = (2000, 2016)
+
+# Choose whether to time the network metrics, and the slow NetworkX ones among them
+METRICS = True
+NX_METRICS = True
+
+# Choose where results are appended (one JSON line per stage and size)
+RESULTS_PATH = "../bench/results.jsonl"
+
+
+################################
+###     GLOBAL VARIABLES     ###
+################################
+
+# A stage is flagged as slower when its time grows by this factor and by this many seconds
+SLOWER_RATIO = 1.2
+SLOWER_SECONDS = 0.05
+
+# Timestamp
+TIME = "%Y-%m-%d %H:%M:%S"
+
+
+#################################
+###     UTILITY FUNCTIONS     ###
+#################################
+
+class StageLog(object):
+    """
+    Timings of benchmark stages for one corpus size
+
+    Args:
+        papers - corpus size the stages run on
+    """
+
+    def __init__(self, papers):
+        self.papers = papers
+        self.rows = []
+
+    def time(self, stage, items, func, *args):
+        """
+        Run and time one stage
+
+        Args:
+            stage - stage name
+            items - number of items the stage processes (for the rate), None for papers
+            func - callable running the stage
+            args - arguments of func
+
+        Return:
+            return value of func
+        """
+
+        start = time()
+        value = func(*args)
+        self.add(stage, time() - start, items)
+        return value
+
+    def add(self, stage, seconds, items=None):
+        """Record a stage timed elsewhere"""
+        items = self.papers if items is None else items
+        self.rows.append({"papers": self.papers, "stage": stage, "seconds": seconds,
+                          "items": items, "rate": items / seconds if seconds > 0 else None})
+        print "  %-20s %10.3fs  %14.1f items/s" % (stage, seconds, items / max(seconds, 1e-9))
+
+
+def aggregateCorpus(corpus, n, log):
+    """
+    Generate a corpus in chunks and aggregate it, timing both separately
+
+    Args:
+        corpus - SyntheticCorpus object
+        n - number of papers
+        log - StageLog object
+
+    Return:
+        merged CountShard object
+    """
+
+    counts = ShardedCounts()
+    generate = aggregate = 0.0
+    for i, start in enumerate(xrange(0, n, CHUNK_PAPERS)):
+        t0 = time()
+        records = corpus.records(min(CHUNK_PAPERS, n - start), corpus.seed + i)
+        t1 = time()
+        counts.addRecords(records)
+        t2 = time()
+        generate += t1 - t0
+        aggregate += t2 - t1
+    log.add("generate", generate)
+    log.add("aggregate", aggregate)
+
+    return log.time("merge", None, counts.merge)
+
+
+def bulkAggregateCorpus(corpus, n, log):
+    """
+    Aggregate a corpus given as code-id arrays with BulkCounts
+
+    Args:
+        corpus - SyntheticCorpus object
+        n - number of papers
+        log - StageLog object
+
+    Return:
+        CoTagTensor object
+    """
+
+    bulk = BulkCounts(corpus.codes)
+    year_ids = dict((y, bulk.yearId(str(y))) for y in corpus.years.tolist())
+    year_map = np.array([year_ids.get(y, 0) for y in xrange(corpus.years.max() + 1)])
+    elapsed = 0.0
+    for i, start in enumerate(xrange(0, n, CHUNK_PAPERS)):
+        years, offsets, ids = corpus.paperArrays(min(CHUNK_PAPERS, n - start), corpus.seed + i)
+        t = time()
+        bulk.addArrays(year_map[years], offsets, ids)
+        elapsed += time() - t
+    log.add("aggregate_bulk", elapsed)
+
+    return log.time("bulk_to_tensor", None, bulk.toTensor, YEARS)
+
+
+def storeCorpus(corpus, n, log):
+    """
+    Write a corpus to a paper store and rebuild its network from the store
+
+    Args:
+        corpus - SyntheticCorpus object
+        n - number of papers
+        log - StageLog object
+
+    Return:
+        None
+    """
+
+    base = tempfile.mkdtemp(prefix="bench")
+    try:
+        store = PaperStore.create(base, corpus.codes)
+        year_map = np.zeros(corpus.years.max() + 1, dtype=np.int64)
+        year_map[corpus.years] = [store.yearId(str(y)) for y in corpus.years.tolist()]
+        elapsed = 0.0
+        for i, start in enumerate(xrange(0, n, CHUNK_PAPERS)):
+            years, offsets, ids = corpus.paperArrays(min(CHUNK_PAPERS, n - start), corpus.seed + i)
+            t = time()
+            store.appendArrays(year_map[years], offsets, ids)
+            elapsed += time() - t
+        log.add("paper_store_write", elapsed)
+        log.time("paper_store_rebuild", None, aggregatePapers, base, None, YEARS)
+    finally:
+        shutil.rmtree(base)
+
+
+def graphItems(G):
+    """Nodes plus edges, the items a cleaning pass visits"""
+    return len(G) + G.size()
+
+
+def pathStage(H):
+    """Diameter and average shortest path length of the largest component"""
+    _, A = largestComponent(adjacencyMatrix(H)[1])
+    return pathMetrics(A)
+
+
+def benchmarkSize(corpus, jel, n):
+    """
+    Time every stage of the pipeline on a synthetic corpus
+
+    Args:
+        corpus - SyntheticCorpus object
+        jel - dict of JEL code -> description of the network's codes
+        n - number of papers
+
+    Return:
+        list of result dicts
+    """
+
+    print ">>> %s | Benchmarking %i papers" % (strftime(TIME), n)
+    log = StageLog(n)
+    codes = frozenset(jel)
+
+    # parsing, on at most PARSE_MAX_PAPERS papers
+    m = min(n, PARSE_MAX_PAPERS)
+    pages = log.time("render", m, lambda: list(corpus.pages(m, PER_PAGE)))
+    log.time("parse", m, lambda: [parseDbPage(s, codes) for s in pages])
+    log.time("parse_pool", m, benchmarkParser, pages, codes)
+    pages = None
+
+    # aggregation into the raw graph
+    shard = aggregateCorpus(corpus, n, log)
+    bulkAggregateCorpus(corpus, n, log)
+    storeCorpus(corpus, n, log)
+    G = nx.Graph()
+    for code in jel:
+        G.add_node(code, description=jel[code], citations=0)
+    log.time("graph", None, addCountsToGraph, G, shard)
+    del shard
+
+    # cleaning and serialisation
+    H, _ = log.time("clean", graphItems(G), defaultPipeline(*YEARS).run, G)
+    base = tempfile.mkdtemp(prefix="bench")
+    try:
+        log.time("store_write", H.size(), writeNetwork, H, os.path.join(base, "net"), "weight")
+        T = log.time("store_read", H.size(), readNetwork, os.path.join(base, "net"), YEARS)
+    finally:
+        shutil.rmtree(base)
+    log.time("tensor_from_graph", H.size(), CoTagTensor.fromGraph, H, YEARS)
+
+    # metrics of calc_metrics
+    if METRICS:
+        e = H.size()
+        nodes, A = adjacencyMatrix(H)
+        _, W = adjacencyMatrix(H, "weight", nodes)
+        log.time("clustering", e, averageClustering, A)
+        log.time("clustering_weighted", e, averageClustering, W, True)
+        log.time("modularity", e, graphModularity, H, letterGroups(H.nodes()), "weight")
+        log.time("paths", e, pathStage, H)
+        log.time("pagerank", e, sparsePageRank, T.adjacency())
+        log.time("pagerank_series", e, pageRankSeries, T)
+        log.time("eigenvector", e, sparseEigenvector, T.adjacency())
+        log.time("eigenvector_series", e, eigenvectorSeries, T)
+        log.time("normalised_weights", e, topNeighbourSeries, T)
+        log.time("rollup", e, lambda: rollUp(T).strengthSeries())
+        if NX_METRICS:
+            log.time("nx_eigenvector", e, nx.eigenvector_centrality, H)
+            log.time("nx_pagerank", e, nx.pagerank, H, 0.85, None, 100, 1.0e-6, None, "weight")
+
+    return log.rows
+
+
+def gitCommit():
+    """Short hash of the checked out commit, None outside a git work tree"""
+    try:
+        with open(os.devnull, "w") as devnull:
+            return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], stderr=devnull).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def saveResults(rows, path):
+    """
+    Append benchmark results to a JSON lines file, tagged with the run
+
+    Args:
+        rows - list of result dicts
+        path - results file, created with its directory if missing
+
+    Return:
+        run id string
+    """
+
+    run = strftime("%Y%m%d-%H%M%S")
+    info = {"run": run, "commit": gitCommit(), "host": platform.node(),
+            "python": platform.python_version(), "seed": SEED}
+    folder = os.path.dirname(path)
+    if folder and not os.path.isdir(folder):
+        os.makedirs(folder)
+    with open(path, "a") as f:
+        for row in rows:
+            row = dict(row)
+            row.update(info)
+            f.write(json.dumps(row, sort_keys=True) + "\n")
+
+    return run
+
+
+def compareRuns(path):
+    """
+    Print the last run against the previous run, stage by stage
+
+    Args:
+        path - results file written by saveResults
+
+    Return:
+        None
+    """
+
+    runs = {}
+    order = []
+    with open(path) as f:
+        for line in f:
+            row = json.loads(line)
+            if row["run"] not in runs:
+                runs[row["run"]] = {}
+                order.append(row["run"])
+            runs[row["run"]][row["papers"], row["stage"]] = row
+
+    if len(order) < 2:
+        return
+    old, new = runs[order[-2]], runs[order[-1]]
+    print "\nRun %s against %s (time ratio, below 1 is faster):" % (order[-1], order[-2])
+    for key in sorted(new):
+        if key in old and old[key]["seconds"] > 0:
+            ratio = new[key]["seconds"] / old[key]["seconds"]
+            slower = ratio > SLOWER_RATIO and new[key]["seconds"] - old[key]["seconds"] > SLOWER_SECONDS
+            flag = "  <-- slower" if slower else ""
+            print "  %10i %-20s %8.3fs -> %8.3fs  x%.2f%s" % (
+                key[0], key[1], old[key]["seconds"], new[key]["seconds"], ratio, flag)
+
+
+######################
+###     OUTPUT     ###
+######################
+
+# main sentinel
+def main():
+    taxonomy = loadTaxonomy()
+    jel = taxonomy.select(CATEGORIES)
+    corpus = SyntheticCorpus(sorted(jel), SEED)
+
+    rows = []
+    for n in SIZES:
+        rows.extend(benchmarkSize(corpus, jel, n))
+
+    run = saveResults(rows, RESULTS_PATH)
+    print ">>> %s | Results of run %s appended to '%s'" % (strftime(TIME), run, RESULTS_PATH)
+    compareRuns(RESULTS_PATH)
+
+
+if __name__ == '__main__':
+    main()
@@ -4,11 +4,21 @@ from ast import literal_eval
 from collections import Counter
 import operator
 import re
-import xml.etree.ElementTree as ET
 
 import networkx as nx
 import zen
 
+from centrality import eigenvectorSeries, pageRankSeries, sparseEigenvector, sparsePageRank, topNodes, writeYearTable
+from cotag_tensor import CoTagTensor
+from edge_weights import topNeighbourSeries
+from graph_arrays import adjacencyMatrix
+from graph_store import readNetwork
+from jel_taxonomy import loadTaxonomy
+from modularity import graphModularity
+from report_runner import CACHED, COMPUTED, reportTasks, runReport, snapshotVariants
+from rollup import rollUp
+from snapshots import SnapshotStore
+
 # Zen docs:      http://www.networkdynamics.org/static/zen/html/api/api.html
 # NetworkX docs: https://networkx.github.io/documentation/latest/
 
@@ -34,7 +44,22 @@ def representsFloat(s):
         return False
 
 
-def addWeightUpToYear(G, year, alt=False):
+def buildTensor(G, years=(2000, 2016)):
+    """
+    Build the year-indexed count tensor of a graph once for all "up to" year queries
+
+    Args:
+        G - nx.Graph() object
+        years - (lower, upper) bounds of the year axis
+
+    Return:
+        CoTagTensor object
+    """
+
+    return CoTagTensor.fromGraph(G, years)
+
+
+def addWeightUpToYear(G, year, alt=False, tensor=None):
     """
     Obtain cumulative edge weight up to a certain year
 
@@ -42,12 +67,21 @@ def addWeightUpToYear(G, year, alt=False):
         G - nx.Graph() object
         year - string representing "up to" year
         alt - recursive mode to save computation time if immediate previous years have been computed
+        tensor - optional CoTagTensor of G, reads prefix sums instead of scanning attribute keys
 
     Return:
         None
     """
 
-    if not alt:
+    if tensor is not None:
+        edge_w = tensor.edgeWeightsUpTo(year)
+        for (u, v), w in zip(tensor.edges, edge_w):
+            G.edge[tensor.nodes[u]][tensor.nodes[v]]["weightUpto" + year] = int(w)
+        node_w = tensor.nodeWeightsUpTo(year)
+        for code, w in zip(tensor.nodes, node_w):
+            G.node[code]["weightUpto" + year] = int(w)
+
+    elif not alt:
         # add a single data attribute tor all edges
         for e1, e2 in G.edges_iter():
             upto_weight = 0
@@ -90,32 +124,116 @@ def printEigenCent(G):
     Return:
         None
     """
-    eigen = nx.eigenvector_centrality(G)
-    sorted_eigen = sorted(eigen.items(), key=operator.itemgetter(1), reverse=True)
-    print "Eigenvector Centrality (Overall):"
-    for i in range(10):
-        print '  %i. %s (%1.10f)' % (i + 1, sorted_eigen[i][0], sorted_eigen[i][1])
+    nodes, A = adjacencyMatrix(G, "weight")
+    x, info = sparseEigenvector(A)
+    print "Eigenvector Centrality (Overall): %s, %i iterations, residual %.1e" % (
+        info["method"], info["iterations"], info["residual"])
+    for i, (node, value) in enumerate(topNodes(nodes, x, 10)):
+        print '  %i. %s (%1.10f)' % (i + 1, node, value)
+
+    return
+
+def printReport(tensor, results, status):
+    """
+    Print network statistics and centralities computed by a report
+
+    Args:
+        tensor - CoTagTensor object the report was run on
+        results - dict of task name -> result, from runReport
+        status - dict of task name -> status, from runReport
+
+    Return:
+        None
+    """
+    print "Network Statistics:"
+    print "  Nodes: %i" % len(tensor.nodes)
+    print "  Edges: %i" % len(tensor.edges)
+    lines = [("average_degree", 0, "Average degree"),
+             ("average_weighted_degree", 0, "Average weighted degree"),
+             ("clustering", 0, "Average clustering coefficient"),
+             ("weighted_clustering", 0, "Average weighted clustering coefficient"),
+             ("modularity", None, "Modularity (Q, Q_max)"),
+             ("paths", 0, "Diameter"),
+             ("paths", 1, "Average shortest path length")]
+    for name, part, label in lines:
+        if name not in results:
+            print "  %s: %s" % (label, status[name])
+        elif part is None:
+            print "  %s: %1.5f, %1.5f" % ((label,) + results[name])
+        elif isinstance(results[name], tuple):
+            print "  %s: %1.5f" % (label, results[name][part])
+        else:
+            print "  %s: %1.5f" % (label, results[name])
+
+    if "eigenvector" in results:
+        top, info = results["eigenvector"]
+        print "Eigenvector Centrality (Overall): %s, %i iterations, residual %.1e" % (
+            info["method"], info["iterations"], info["residual"])
+        for i, (node, value) in enumerate(top):
+            print '  %i. %s (%1.10f)' % (i + 1, node, value)
+
+    if "pagerank" in results:
+        top, _ = results["pagerank"]
+        print "\nPageRank Centrality (Overall):"
+        for i, (node, value) in enumerate(top):
+            print '  %i. %s (%1.5f)' % (i + 1, node, value)
+
+    return
+
+
+def printReportSummary(name, results, status):
+    """
+    Print one line of the main statistics of a report on a graph variant
+
+    Args:
+        name - variant name
+        results - dict of task name -> result, from runReport
+        status - dict of task name -> status, from runReport
+
+    Return:
+        None
+    """
+    fields = []
+    for task, label in [("average_degree", "degree"), ("clustering", "clustering"), ("modularity", "Q")]:
+        if task in results:
+            value = results[task][0] if isinstance(results[task], tuple) else results[task]
+            fields.append("%s %1.5f" % (label, value))
+        else:
+            fields.append("%s %s" % (label, status[task]))
+    if "eigenvector" in results:
+        fields.append("top eigenvector %s" % results["eigenvector"][0][0][0])
+    print "  %s: %s" % (name, ", ".join(fields))
 
     return
 
+
 def list2csv(a,filename):
     f = open(filename,'w')
     f.write(','.join([str(ai) for ai in a]))
     f.close()
 
-def printPageRankCentUpTo(G, year=None):
+def printPageRankCentUpTo(G, year=None, tensor=None):
     """
     Print top 10 nodes with highest PageRank centrality
 
     Args:
-        G - nx.Graph() object
+        G - nx.Graph() object, None when a tensor and year are given
+        year - string representing "up to" year
+        tensor - optional CoTagTensor of G
 
     Return:
         None
     """
-    if year != None:
+    if year != None and tensor is not None:
+        # read the snapshot off the tensor, G is left untouched
+        x, _ = sparsePageRank(tensor.adjacency(year))
+        sorted_pr = sorted(zip(tensor.nodes, x), key=operator.itemgetter(1), reverse=True)
+        print "\nPageRank Centrality (%s):" % year
+        for i in range(10):
+            print '  %i. %s (%1.10f)' % (i + 1, sorted_pr[i][0], sorted_pr[i][1])
+    elif year != None:
         addWeightUpToYear(G, year)
-        pr = nx.pagerank(G, alpha=0.85, weight="weighUpto" + year)
+        pr = nx.pagerank(G, alpha=0.85, weight="weightUpto" + year)
         sorted_pr = sorted(pr.items(), key=operator.itemgetter(1), reverse=True)
         print "\nPageRank Centrality (%s):" % year
         for i in range(10):
@@ -130,22 +248,102 @@ def printPageRankCentUpTo(G, year=None):
     return
 
 
-def printNormalisedWeight(G, code, year=None, alt=False):
+def writePageRankSeries(tensor, filename, years=None):
+    """
+    Write PageRank centrality of every node for every cumulative year to a CSV file
+
+    Args:
+        tensor - CoTagTensor object
+        filename - output CSV path
+        years - optional list of "up to" years, defaults to the tensor's year axis
+
+    Return:
+        None
+    """
+    years, table, iterations = pageRankSeries(tensor, years)
+    writeYearTable(filename, years, tensor.nodes, table)
+    print "\nPageRank Centrality (%s-%s): %i power iterations, written to '%s'" % (
+        years[0], years[-1], sum(iterations), filename)
+
+    return
+
+
+def writeEigenvectorSeries(tensor, filename, years=None):
+    """
+    Write eigenvector centrality of every node for every cumulative year to a CSV file
+
+    Args:
+        tensor - CoTagTensor object
+        filename - output CSV path
+        years - optional list of "up to" years, defaults to the tensor's year axis
+
+    Return:
+        None
+    """
+    years, table, diagnostics = eigenvectorSeries(tensor, years)
+    writeYearTable(filename, years, tensor.nodes, table)
+    print "\nEigenvector Centrality (%s-%s): %i power iterations, written to '%s'" % (
+        years[0], years[-1], sum(info["iterations"] for info in diagnostics), filename)
+    for year, info in zip(years, diagnostics):
+        if info["method"] != "power":
+            print "  %s: power iteration did not converge, %s solution (residual %.1e)" % (
+                year, info["method"], info["residual"])
+
+    return
+
+
+def writeCategorySeries(tensor, filename, level="letter"):
+    """
+    Write the weighted degree of every JEL category for every cumulative year to a CSV file
+
+    Args:
+        tensor - CoTagTensor object of the code network
+        filename - output CSV path
+        level - "letter", "subcategory", or a dict of group name -> list of codes
+
+    Return:
+        None
+    """
+    rollup = rollUp(tensor, level)
+    strength = rollup.strengthSeries()
+    writeYearTable(filename, tensor.years, rollup.tensor.nodes, strength.T)
+    print "\nCategory weighted degree (%i groups, %s-%s), written to '%s'" % (
+        len(rollup.tensor.nodes), tensor.years[0], tensor.years[-1], filename)
+
+    return
+
+
+def printNormalisedWeight(G, code, year=None, alt=False, view=None):
     """
     Print the top 5 edges with the highest normalised edge weight for a given node (JEL code)
 
     Args:
-        G - nx.Graph() object
+        G - nx.Graph() object, None when a view is given
         code - specific node that you are interested in
         year - string representing "up to" year
         alt - recursive mode to save computation time if immediate previous years have been computed
+        view - optional SnapshotView to read weights from instead of G (year and alt are ignored)
 
     Return:
         None
     """
 
     ed = {}
-    if year == None:
+    if view is not None:
+        cit = view.citations(code)
+        for nei, w in view.neighbourWeights(code):
+            ed[nei] = float(w) / float(min(cit, view.citations(nei)))
+        sorted_ed = sorted(ed.items(), key=operator.itemgetter(1), reverse=True)
+        if view.end is None:
+            label = "Overall"
+        elif view.start is None:
+            label = str(view.end)
+        else:
+            label = "%s-%s" % (view.start, view.end)
+        print "\nNormalised edge weights for node %s (%s):" % (code, label)
+        for i in range(min(5, len(sorted_ed))):
+            print '  %i. %s (%1.5f)' % (i + 1, sorted_ed[i][0], sorted_ed[i][1])
+    elif year == None:
         nd = G.neighbors(code)
         for nei in nd:
             if G.edge[code][nei]["weight"] != 0:
@@ -156,7 +354,7 @@ def printNormalisedWeight(G, code, year=None, alt=False):
             ed[nei] = G.edge[code][nei]["normWeight"]
         sorted_ed = sorted(ed.items(), key=operator.itemgetter(1), reverse=True)
         print "\nNormalised edge weights for node %s (Overall):" % code
-        for i in range(5):
+        for i in range(min(5, len(sorted_ed))):
             print '  %i. %s (%1.5f)' % (i+1,sorted_ed[i][0],sorted_ed[i][1])
     else:
         addWeightUpToYear(G, year, alt)
@@ -170,12 +368,46 @@ def printNormalisedWeight(G, code, year=None, alt=False):
             ed[nei] = G.edge[code][nei]["normWeight" + year]
         sorted_ed = sorted(ed.items(), key=operator.itemgetter(1), reverse=True)
         print "\nNormalised edge weights for node %s (%s):" % (code, year)
-        for i in range(5):
+        for i in range(min(5, len(sorted_ed))):
             print '  %i. %s (%1.5f)' % (i + 1, sorted_ed[i][0], sorted_ed[i][1])
 
     return sorted_ed
 
 
+def writeNormalisedWeightSeries(tensor, filename, k=5, top=None):
+    """
+    Write the top k normalised edge weights of every node for every cumulative year to a CSV file
+
+    Batch version of printNormalisedWeight: one row per (year, code, rank),
+    computed for all edges and years at once without touching the graph.
+
+    Args:
+        tensor - CoTagTensor object
+        filename - output CSV path
+        k - number of neighbours per node and year
+        top - optional result of topNeighbourSeries(tensor, k) computed before, e.g. by a report
+
+    Return:
+        None
+    """
+
+    ids, values = topNeighbourSeries(tensor, k) if top is None else top
+    nodes = tensor.nodes
+    with open(filename, "w") as f:
+        f.write("year,code,rank,neighbour,normWeight\n")
+        for col, year in enumerate(tensor.years):
+            for i, code in enumerate(nodes):
+                for rank in xrange(ids.shape[2]):
+                    j = ids[col, i, rank]
+                    if j < 0:
+                        break
+                    f.write("%i,%s,%i,%s,%.10f\n" % (year, code, rank + 1, nodes[j], values[col, i, rank]))
+    print "\nNormalised edge weights (top %i, %s-%s), written to '%s'" % (
+        k, tensor.years[0], tensor.years[-1], filename)
+
+    return
+
+
 def jelXMLParser(categories):
     """
     Extract JEL classification info from XML file and output to a dict
@@ -187,42 +419,22 @@ def jelXMLParser(categories):
         jel_dict - dict of top-level JEL classification and sub-level codes as their values
     """
 
-    jel = ET.parse("jel_classification.xml")
-    root = jel.getroot()
+    return loadTaxonomy("jel_classification.xml").groupByLetter(categories)
 
-    # iterate over xml tags and insert into dict
-    jel_dict = {}
-    for cat in categories:
-        jel_dict[cat] = []
-        for child in root.iter('classification'):
-            m = re.search('([A-Z])(?=[0-9][0-9])', child[0].text)
-            if m.group(0) in cat:
-                jel_dict[cat].append(child[0].text)
 
-    return jel_dict
-
-
-def modularity(G, c):
+def modularity(G, c, weight=None):
     """
     Calculate modularity of the graph according to given grouping
 
     Args:
-        G - filled zen.Graph() or zen.DiGraph() object
-        c - grouping
+        G - nx.Graph() object
+        c - grouping, dict of group -> list of nodes
+        weight - edge attribute for weighted modularity, None for unweighted
 
     Return:
         Tuple of (Q, Qmax)
     """
-    d = dict()
-    for k, v in c.iteritems():
-        for n in v:
-            d[n] = k
-    Q, Qmax = 0, 1
-    for u in G.nodes_iter():
-        for v in G.nodes_iter():
-            if d[u] == d[v]:
-                Q += (int(G.has_edge(v, u)) - G.degree(u) * G.degree(v) / float(G.size())) / float(G.size())
-                Qmax -= (G.degree(u) * G.degree(v) / float(G.size())) / float(G.size())
+    Q, Qmax, per_group = graphModularity(G, c, weight)
     return Q, Qmax
 
 
@@ -233,34 +445,40 @@ def modularity(G, c):
 # main sentinel
 def main():
     # read existing graph
-    # Due to an issue with reading Zen GML files, we are using NetworkX GEXF files instead
-    G = nx.read_gexf("../graphs/econs5_ALL.gexf")
+    # Due to an issue with reading Zen GML files, we are using the columnar store (or NetworkX GEXF files) instead;
+    # every statistic is read off the memory-mapped tensor, no NetworkX graph is built
+    tensor = readNetwork("../graphs/econs5_ALL", (2000, 2016))
+
+    # get general network statistics, eigenvector and pagerank centralities of the network and some snapshots
+    # in parallel; metrics of unchanged graphs are read from the report cache
+    variants = snapshotVariants(tensor, [2005, 2010])
+    variants["ALL"] = tensor
     categories = ['A', 'B', 'C', 'D', 'E', 'F', 'G', 'H', 'I', 'J', 'K', 'L', 'M', 'N', 'O', 'P', 'Q', 'R']
-
-    # get general network statistics
-    print "Network Statistics:"
-    print "  Nodes: %i" % G.__len__()
-    print "  Edges: %i" % G.size()
-    print "  Average degree: %1.5f" % (float(sum(G.degree().values())) / G.__len__())
-    print "  Average weighted degree: %1.5f" % (float(sum(G.degree(weight="weight").values())) / G.__len__())
-    print "  Average clustering coefficient: %1.5f" % nx.average_clustering(G)
-    print "  Modularity (Q, Q_max): %1.5f, %1.5f" % modularity(G, jelXMLParser(categories))
-    print "  Diameter: %1.5f" % nx.diameter(G)
-    print "  Average shortest path length: %1.5f" % nx.average_shortest_path_length(G)
-
-    # Get eigenvector centrality (overall)
-    printEigenCent(G)
+    results, status = runReport(variants, reportTasks(jelXMLParser(categories)), "../graphs/report_cache")
+    states = [st for v in status for st in status[v].values()]
+    print "Report: %i metrics computed, %i cached, %i failed" % (
+        states.count(COMPUTED), states.count(CACHED), len(states) - states.count(COMPUTED) - states.count(CACHED))
+    printReport(tensor, results["ALL"], status["ALL"])
+    print "\nSnapshots:"
+    for name in sorted(variants):
+        if name != "ALL":
+            printReportSummary(name, results[name], status[name])
 
     # Get pagerank centralities
-    printPageRankCentUpTo(G)
-    printPageRankCentUpTo(G, "2010")
-    # printPageRankCentUpTo(G, "2005")
-    # printPageRankCentUpTo(G, "2000")
+    printPageRankCentUpTo(None, "2010", tensor)
+    # printPageRankCentUpTo(None, "2005", tensor)
+    # printPageRankCentUpTo(None, "2000", tensor)
     # feel free to add more if you want
+    writePageRankSeries(tensor, "../graphs/econs5_ALL_pagerank.csv")
+    writeEigenvectorSeries(tensor, "../graphs/econs5_ALL_eigenvector.csv")
+    writeCategorySeries(tensor, "../graphs/econs5_ALL_category_degree.csv")
 
     # get normalised edge weights
-    printNormalisedWeight(G, "G01")
-    printNormalisedWeight(G, "G01", "2006")
+    snapshots = SnapshotStore(tensor)
+    printNormalisedWeight(None, "G01", view=snapshots.overall())
+    printNormalisedWeight(None, "G01", view=snapshots.upTo(2006))
+    printNormalisedWeight(None, "G01", view=snapshots.window(2003, 2008))
+    writeNormalisedWeightSeries(tensor, "../graphs/econs5_ALL_normweight.csv", top=results["ALL"].get("normalised_weights"))
 
 
 if __name__ == '__main__':
@@ -0,0 +1,244 @@
+# -*- coding: utf-8 -*-
+
+import heapq
+
+import numpy as np
+import scipy.sparse.linalg as spla
+
+# NetworkX docs: https://networkx.github.io/documentation/latest/
+# SciPy docs:    https://docs.scipy.org/doc/scipy/reference/sparse.html
+
+
+################################
+###     GLOBAL VARIABLES     ###
+################################
+
+# Matrices up to this size are solved densely instead of by Lanczos (ARPACK needs a few more nodes than vectors)
+DENSE_EIGEN_NODES = 16
+
+
+#################################
+###     UTILITY FUNCTIONS     ###
+#################################
+
+def sparsePageRank(A, alpha=0.85, x0=None, tol=1.0e-6, max_iter=100):
+    """
+    PageRank of a weighted undirected graph by power iteration on a sparse matrix
+
+    Follows nx.pagerank: each node spreads its score over its edges in
+    proportion to their weights, dangling nodes (no weight) spread theirs
+    uniformly, and iteration stops once the L1 change is below N * tol.
+
+    Args:
+        A - (N, N) symmetric scipy.sparse.csr_matrix of edge weights
+        alpha - damping factor
+        x0 - optional (N,) starting vector, e.g. the previous year's solution
+        tol - convergence tolerance
+        max_iter - maximum number of power iterations
+
+    Return:
+        tuple of ((N,) array of PageRank scores, number of iterations)
+    """
+
+    n = A.shape[0]
+    out = np.asarray(A.sum(axis=1)).ravel()
+    dangling = out == 0
+    inv_out = np.zeros(n)
+    inv_out[~dangling] = 1.0 / out[~dangling]
+    AT = A.T.tocsr()
+
+    if x0 is None:
+        x = np.ones(n) / n
+    else:
+        x = np.asarray(x0, dtype=np.float64) / np.sum(x0)
+
+    for i in xrange(1, max_iter + 1):
+        xlast = x
+        x = alpha * (AT.dot(xlast * inv_out) + xlast[dangling].sum() / n) + (1.0 - alpha) / n
+        if np.abs(x - xlast).sum() < n * tol:
+            return x, i
+
+    raise RuntimeError("PageRank failed to converge in %d iterations" % max_iter)
+
+
+def pageRankSeries(tensor, years=None, alpha=0.85, tol=1.0e-6, max_iter=100):
+    """
+    PageRank of every cumulative yearly snapshot, each solve warm-started from the previous year
+
+    Args:
+        tensor - CoTagTensor object
+        years - optional list of "up to" years, defaults to the tensor's year axis
+        alpha - damping factor
+        tol - convergence tolerance
+        max_iter - maximum number of power iterations per year
+
+    Return:
+        tuple of (list of years, (Y, N) array of PageRank scores, list of iterations per year)
+    """
+
+    if years is None:
+        years = tensor.years
+    table = np.zeros((len(years), len(tensor.nodes)))
+    iterations = []
+    x = None
+    for row, year in enumerate(years):
+        x, it = sparsePageRank(tensor.adjacency(year), alpha, x, tol, max_iter)
+        table[row] = x
+        iterations.append(it)
+
+    return list(years), table, iterations
+
+
+def leadingEigenvector(A, v0=None, tol=1.0e-6):
+    """
+    Leading eigenvector of a symmetric matrix by the Lanczos method
+
+    Args:
+        A - (N, N) symmetric scipy.sparse.csr_matrix
+        v0 - optional (N,) starting vector
+        tol - relative accuracy of the eigenvalue
+
+    Return:
+        (N,) unit vector with non-negative sum, or None if ARPACK fails
+    """
+
+    n = A.shape[0]
+    if n <= DENSE_EIGEN_NODES:
+        _, vectors = np.linalg.eigh(A.toarray())
+        x = vectors[:, -1]
+    else:
+        if v0 is not None and not np.any(v0):
+            v0 = None
+        try:
+            _, vectors = spla.eigsh(A.astype(np.float64), k=1, which="LA", v0=v0, tol=tol)
+        except (spla.ArpackNoConvergence, spla.ArpackError):
+            return None
+        x = vectors[:, 0]
+    if x.sum() < 0:
+        x = -x
+    return x / np.linalg.norm(x)
+
+
+def sparseEigenvector(A, x0=None, tol=1.0e-6, max_iter=100):
+    """
+    Eigenvector centrality of a weighted undirected graph
+
+    Follows nx.eigenvector_centrality: power iteration x <- A x normalised
+    to unit length, stopping once the L1 change is below N * tol. If it
+    does not converge (e.g. on a bipartite component, where it oscillates),
+    the leading eigenvector is found by Lanczos instead, and if that fails
+    too the last iterate is returned flagged as not converged.
+
+    Args:
+        A - (N, N) symmetric scipy.sparse.csr_matrix of edge weights
+        x0 - optional (N,) starting vector, e.g. the previous year's solution (mixed with the uniform vector)
+        tol - convergence tolerance
+        max_iter - maximum number of power iterations
+
+    Return:
+        tuple of ((N,) array of centralities, dict of diagnostics: "method" ("power",
+        "lanczos" or "unconverged"), "iterations", "residual" (||Ax - lx|| / l of the
+        result, l its Rayleigh quotient) and "converged")
+    """
+
+    n = A.shape[0]
+    if n == 0:
+        return np.zeros(0), {"method": "power", "iterations": 0, "residual": 0.0, "converged": True}
+
+    if x0 is None or not np.any(x0):
+        x = np.ones(n) / n
+    else:
+        # a warm start is zero on nodes that had no edges before; power iteration never leaves
+        # that subspace, so the uniform vector is mixed in for a component that now dominates
+        x = np.abs(np.asarray(x0, dtype=np.float64))
+        x = x / x.sum() + 1.0 / n
+
+    method = "unconverged"
+    for i in xrange(1, max_iter + 1):
+        xlast = x
+        x = A.dot(xlast)
+        norm = np.linalg.norm(x)
+        if norm > 0:
+            x = x / norm
+        if np.abs(x - xlast).sum() < n * tol:
+            method = "power"
+            break
+
+    if method != "power":
+        lanczos = leadingEigenvector(A, x, tol)
+        if lanczos is not None:
+            x, method = lanczos, "lanczos"
+
+    Ax = A.dot(x)
+    lam = x.dot(Ax)
+    residual = np.linalg.norm(Ax - lam * x) / lam if lam > 0 else float("inf")
+
+    return x, {"method": method, "iterations": i, "residual": float(residual), "converged": method != "unconverged"}
+
+
+def eigenvectorSeries(tensor, years=None, tol=1.0e-6, max_iter=100):
+    """
+    Eigenvector centrality of every cumulative yearly snapshot, each solve warm-started from the previous year
+
+    The previous year's vector is mixed with the uniform one (see
+    sparseEigenvector), so components connected later are still reached.
+
+    Args:
+        tensor - CoTagTensor object
+        years - optional list of "up to" years, defaults to the tensor's year axis
+        tol - convergence tolerance
+        max_iter - maximum number of power iterations per year
+
+    Return:
+        tuple of (list of years, (Y, N) array of centralities, list of diagnostics dicts per year)
+    """
+
+    if years is None:
+        years = tensor.years
+    table = np.zeros((len(years), len(tensor.nodes)))
+    diagnostics = []
+    x = None
+    for row, year in enumerate(years):
+        x, info = sparseEigenvector(tensor.adjacency(year), x, tol, max_iter)
+        table[row] = x
+        diagnostics.append(info)
+
+    return list(years), table, diagnostics
+
+
+def topNodes(nodes, scores, k=10):
+    """
+    The k highest scoring nodes by heap selection, without sorting all of them
+
+    Args:
+        nodes - list of nodes
+        scores - (N,) array of scores, aligned with nodes
+        k - number of nodes to return
+
+    Return:
+        list of (node, score) tuples, highest score first (ties keep node order)
+    """
+
+    scores = np.asarray(scores).tolist()
+    best = heapq.nlargest(k, xrange(len(scores)), key=scores.__getitem__)
+    return [(nodes[i], scores[i]) for i in best]
+
+
+def writeYearTable(filename, years, nodes, table):
+    """
+    Write a year x node table as CSV, one row per year
+
+    Args:
+        filename - output CSV path
+        years - list of years (row labels)
+        nodes - list of nodes (column labels)
+        table - (Y, N) array
+
+    Return:
+        None
+    """
+
+    with open(filename, "w") as f:
+        f.write(",".join(["year"] + [str(node) for node in nodes]) + "\n")
+        for year, row in zip(years, table):
+            f.write(",".join([str(year)] + ["%.10f" % v for v in row]) + "\n")
@@ -0,0 +1,344 @@
+# -*- coding: utf-8 -*-
+
+from collections import Counter
+import re
+
+import networkx as nx
+
+# NetworkX docs: https://networkx.github.io/documentation/latest/
+
+
+################################
+###     GLOBAL VARIABLES     ###
+################################
+
+# Top-level JEL category descriptions
+CATEGORY = {
+    "A": "General Economics & Teaching",
+    "B": "Hostory of Economics & Teaching",
+    "C": "Mathematical & Quantitative Methods",
+    "D": "Microeconomics",
+    "E": "Macroeconomics",
+    "F": "International Economics",
+    "G": "Financial Economics",
+    "H": "Public Economics",
+    "I": "Health, Education & Welfare",
+    "J": "Labor & Demographic Economics",
+    "K": "Law & Economics",
+    "L": "Industrial Organisation",
+    "M": "Business Administration & Business Economics",
+    "N": "Economic History",
+    "O": "Economic Development, Technological Change & Growth",
+    "P": "Economic Systems",
+    "Q": "Agricultural, Natural Resource, Environmental & Ecological Economics",
+    "R": "Urban, Rural & Regional Economics"}
+
+# "Others" codes (X*9) of the categories we keep
+OTHERS_CODE = re.compile("[C-G][0-9]9")
+
+# Plausible publication years
+VALID_YEAR = re.compile('((19\d)|(20[01]))\d{1}')
+
+
+#################################
+###     UTILITY FUNCTIONS     ###
+#################################
+
+class KeyKinds(object):
+    """
+    Memo of attribute key classification, so each distinct key is inspected once
+
+    A key is numeric if it can be converted to a float (a raw year key such
+    as "2006"); a numeric key is invalid if it does not look like a
+    plausible year. Rules test whole attribute dicts against these sets.
+
+    Attributes:
+        known - set of keys classified so far
+        numeric - set of numeric keys
+        invalid - set of numeric keys that are not plausible years
+    """
+
+    def __init__(self):
+        self.known = set()
+        self.numeric = set()
+        self.invalid = set()
+
+    def classify(self, data):
+        """Classify the keys of an attribute dict not seen before"""
+        if self.known.issuperset(data):
+            return
+        for k in data.viewkeys() - self.known:
+            self.known.add(k)
+            try:
+                float(k)
+            except ValueError:
+                continue
+            self.numeric.add(k)
+            if not VALID_YEAR.search(k):
+                self.invalid.add(k)
+
+
+class CleaningRule(object):
+    """
+    Base class of a pluggable cleaning transform
+
+    Subclasses override node() and/or edge(). Each hook receives a private
+    copy of the attribute dict and returns it (modified in place or not), or
+    None to drop the node or edge. Rules count what they did in self.counts.
+    """
+
+    name = "rule"
+
+    def __init__(self):
+        self.counts = Counter()
+        self.keys = KeyKinds()
+
+    def node(self, code, data):
+        return data
+
+    def edge(self, u, v, data):
+        return data
+
+
+class RemoveSelfEdge(CleaningRule):
+    """Remove self-loops due to parsing errors"""
+
+    name = "removeSelfEdge"
+
+    def edge(self, u, v, data):
+        if u == v:
+            self.counts["edges dropped"] += 1
+            return None
+        return data
+
+
+class RemoveNodeOthersCategory(CleaningRule):
+    """Remove "Others" (X*9) nodes and their edges"""
+
+    name = "removeNodeOthersCategory"
+
+    def node(self, code, data):
+        if OTHERS_CODE.search(code):
+            self.counts["nodes dropped"] += 1
+            return None
+        return data
+
+
+class RemoveIncorrectYears(CleaningRule):
+    """Remove numeric attribute keys that are not plausible years"""
+
+    name = "removeIncorrectYears"
+
+    def strip(self, data, what):
+        self.keys.classify(data)
+        bad = data.viewkeys() & self.keys.invalid
+        for k in bad:
+            del data[k]
+        if bad:
+            self.counts[what + " rewritten"] += 1
+            self.counts[what + " keys dropped"] += len(bad)
+        return data
+
+    def node(self, code, data):
+        return self.strip(data, "nodes")
+
+    def edge(self, u, v, data):
+        return self.strip(data, "edges")
+
+
+class AddNodeCategoryDesc(CleaningRule):
+    """Add the description of the node's top-level category"""
+
+    name = "addNodeCategoryDesc"
+
+    def node(self, code, data):
+        for ch in code:
+            if ch in CATEGORY:
+                data["category"] = CATEGORY[ch]
+                self.counts["nodes rewritten"] += 1
+                break
+        return data
+
+
+class AddMissingYears(CleaningRule):
+    """
+    Add a zero count for every year in a range without papers
+
+    Args:
+        lowerBound - first year
+        upperBound - last year
+    """
+
+    name = "addMissingYears"
+
+    def __init__(self, lowerBound, upperBound):
+        CleaningRule.__init__(self)
+        self.years = set(str(y) for y in xrange(lowerBound, upperBound + 1))
+
+    def fill(self, data, what):
+        missing = self.years - data.viewkeys()
+        added = len(missing)
+        if added:
+            data.update(dict.fromkeys(missing, 0))
+            self.counts[what + " rewritten"] += 1
+            self.counts[what + " keys added"] += added
+        return data
+
+    def node(self, code, data):
+        return self.fill(data, "nodes")
+
+    def edge(self, u, v, data):
+        return self.fill(data, "edges")
+
+
+class KeyNames(dict):
+    """Memo of renamed attribute keys, filled on first lookup of each key"""
+
+    def __init__(self, prefix, keys):
+        dict.__init__(self)
+        self.prefix = prefix
+        self.keys = keys
+
+    def __missing__(self, k):
+        self.keys.classify({k: None})
+        name = self[k] = self.prefix + k if k in self.keys.numeric else k
+        return name
+
+
+class ModifyAttributeKeys(CleaningRule):
+    """
+    Prefix numeric (year) attribute keys, e.g. "2006" becomes "weight2006"
+
+    Args:
+        prefix - string put in front of every numeric key
+    """
+
+    name = "modifyAttributeKeys"
+
+    def __init__(self, prefix="weight"):
+        CleaningRule.__init__(self)
+        self.prefix = prefix
+        self.names = None
+
+    def rename(self, data, what):
+        if self.names is None or self.names.keys is not self.keys:
+            self.names = KeyNames(self.prefix, self.keys)
+        names = self.names
+        renamed = {names[k]: v for k, v in data.iteritems()}
+        if not self.keys.numeric.isdisjoint(data):
+            self.counts[what + " rewritten"] += 1
+        return renamed
+
+    def node(self, code, data):
+        return self.rename(data, "nodes")
+
+    def edge(self, u, v, data):
+        return self.rename(data, "edges")
+
+
+class CleaningPipeline(object):
+    """
+    Apply a sequence of cleaning rules in one pass over nodes and one over edges
+
+    Rules run in the given order on every node, then on every edge. Edges
+    touching a dropped node are dropped without running the edge rules.
+    The input graph is never mutated.
+
+    Args:
+        rules - list of CleaningRule objects
+    """
+
+    def __init__(self, rules):
+        self.rules = rules
+        keys = KeyKinds()
+        for rule in rules:
+            rule.keys = keys
+
+    def run(self, G):
+        """
+        Clean a graph
+
+        Args:
+            G - nx.Graph() object
+
+        Return:
+            tuple of (cleaned nx.Graph() object, report list of (rule name, Counter))
+        """
+
+        H = nx.Graph()
+        H.graph.update(G.graph)
+        orphaned = Counter()
+
+        # the cleaned attribute dicts are fresh copies, so they are put
+        # straight into H's node and adjacency dicts instead of copied again
+        for code, data in G.nodes_iter(data=True):
+            data = dict(data)
+            for rule in self.rules:
+                data = rule.node(code, data)
+                if data is None:
+                    break
+            if data is not None:
+                H.node[code] = data
+                H.adj[code] = {}
+
+        adj = H.adj
+        for u, v, data in G.edges_iter(data=True):
+            if u not in adj or v not in adj:
+                orphaned["edges dropped"] += 1
+                continue
+            data = dict(data)
+            for rule in self.rules:
+                data = rule.edge(u, v, data)
+                if data is None:
+                    break
+            if data is not None:
+                adj[u][v] = data
+                adj[v][u] = data
+
+        report = [(rule.name, rule.counts) for rule in self.rules]
+        report.append(("(edges of dropped nodes)", orphaned))
+
+        return H, report
+
+
+def defaultPipeline(lowerBound=2000, upperBound=2016):
+    """
+    The cleaning rules of modify_graph, in their canonical order
+
+    Missing years are filled in before year keys get their "weight" prefix,
+    so every year in range ends up under a "weight<year>" key.
+
+    Args:
+        lowerBound - first year to fill in
+        upperBound - last year to fill in
+
+    Return:
+        CleaningPipeline object
+    """
+
+    return CleaningPipeline([
+        RemoveSelfEdge(),
+        RemoveNodeOthersCategory(),
+        RemoveIncorrectYears(),
+        AddNodeCategoryDesc(),
+        AddMissingYears(lowerBound, upperBound),
+        ModifyAttributeKeys("weight")])
+
+
+def printReport(report):
+    """
+    Print what every cleaning rule dropped or rewrote
+
+    Args:
+        report - list of (rule name, Counter) as returned by CleaningPipeline.run
+
+    Return:
+        None
+    """
+
+    print "Cleaning report:"
+    for name, counts in report:
+        if counts:
+            print "  %s: %s" % (name, ", ".join("%i %s" % (c, k) for k, c in sorted(counts.items())))
+        else:
+            print "  %s: nothing to do" % name
@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+
+import numpy as np
+import scipy.sparse as sp
+
+# NetworkX docs: https://networkx.github.io/documentation/latest/
+# SciPy docs:    https://docs.scipy.org/doc/scipy/reference/sparse.html
+
+
+#################################
+###     UTILITY FUNCTIONS     ###
+#################################
+
+def triangleCounts(A, weighted=False):
+    """
+    Twice the number of triangles through every node, by sparse matrix multiplication
+
+    Self-loops are ignored. In the weighted variant each triangle counts
+    as the geometric mean of its edge weights, scaled by the largest edge
+    weight, as in nx.clustering(G, weight=...).
+
+    Args:
+        A - (N, N) symmetric scipy.sparse matrix, non-zero entries are edges
+        weighted - use the entries of A as edge weights
+
+    Return:
+        tuple of ((N,) float array of (weighted) triangle counts x 2, (N,) int array of degrees)
+    """
+
+    A = sp.csr_matrix(A, dtype=np.float64, copy=True)
+    A.eliminate_zeros()
+    if weighted and A.nnz:
+        C = A / A.data.max()
+        C.data = np.cbrt(C.data)
+    else:
+        C = A.copy()
+        C.data[:] = 1.0
+    C = (sp.triu(C, 1) + sp.tril(C, -1)).tocsr()
+
+    # (C C C)_ii = sum over neighbours j, k of i of c_ij c_jk c_ki
+    triangles = np.asarray(C.dot(C).multiply(C).sum(axis=1)).ravel()
+    degrees = np.diff(C.indptr)
+
+    return triangles, degrees
+
+
+def localClustering(A, weighted=False):
+    """
+    Clustering coefficient of every node, matching nx.clustering
+
+    Args:
+        A - (N, N) symmetric scipy.sparse matrix, non-zero entries are edges
+        weighted - use the entries of A as edge weights
+
+    Return:
+        (N,) float array, 0 for nodes with fewer than two neighbours
+    """
+
+    triangles, degrees = triangleCounts(A, weighted)
+    pairs = degrees * (degrees - 1.0)
+    c = np.zeros(len(triangles))
+    np.divide(triangles, pairs, out=c, where=triangles > 0)
+
+    return c
+
+
+def averageClustering(A, weighted=False):
+    """Average clustering coefficient over all nodes, matching nx.average_clustering"""
+    return float(localClustering(A, weighted).mean()) if A.shape[0] else 0.0
+
+
+def clusteringSeries(tensor, years=None, weighted=False):
+    """
+    Clustering of every node for every cumulative yearly snapshot
+
+    Args:
+        tensor - CoTagTensor object
+        years - optional list of "up to" years, defaults to the tensor's year axis
+        weighted - weight edges by their paper counts up to each year
+
+    Return:
+        tuple of (list of years, (Y, N) array of local clustering, (Y,) array of average clustering)
+    """
+
+    if years is None:
+        years = tensor.years
+    table = np.zeros((len(years), len(tensor.nodes)))
+    for row, year in enumerate(years):
+        table[row] = localClustering(tensor.adjacency(year, weighted), weighted)
+
+    return list(years), table, table.mean(axis=1)
@@ -0,0 +1,493 @@
+# -*- coding: utf-8 -*-
+
+from collections import Counter
+import itertools
+import re
+
+import numpy as np
+import scipy.sparse as sp
+
+# NumPy docs:    https://docs.scipy.org/doc/numpy/reference/
+# NetworkX docs: https://networkx.github.io/documentation/latest/
+
+
+################################
+###     GLOBAL VARIABLES     ###
+################################
+
+# Year attribute keys, either raw crawler keys ("2006") or cleaned keys ("weight2006")
+YEAR_KEY = re.compile(r"^(?:weight)?(\d{4})$")
+
+# Attribute keys that hold running totals rather than per-year counts
+EDGE_TOTAL_KEY = "weight"
+NODE_TOTAL_KEY = "citations"
+
+# Integer types used for the count arrays
+INDEX_DTYPE = np.int32
+COUNT_DTYPE = np.int32
+
+
+#################################
+###     UTILITY FUNCTIONS     ###
+#################################
+
+def yearRange(observed, years=None, clip=False):
+    """
+    Pick the dense year axis for a tensor
+
+    Args:
+        observed - iterable of integer years seen in the data
+        years - optional explicit (lower, upper) bound or list of years
+        clip - shrink the explicit bounds to the observed years inside them
+
+    Return:
+        list of consecutive integer years
+    """
+
+    observed = list(observed)
+    if years is not None:
+        years = [int(y) for y in years]
+        lo, hi = min(years), max(years)
+        if not clip:
+            return range(lo, hi + 1)
+        observed = [y for y in observed if lo <= y <= hi]
+    if not observed:
+        return []
+    return range(min(observed), max(observed) + 1)
+
+
+def yearMatrix(rows, yrs, vals, n, years, fold=True):
+    """
+    Scatter (row, year, count) triples into a dense (n, Y) count matrix
+
+    Years earlier than the axis are folded into its first column so that
+    cumulative "up to year" totals stay correct; later years are dropped.
+
+    Args:
+        rows - sequence of row ids
+        yrs - sequence of integer years
+        vals - sequence of counts
+        n - number of rows
+        years - list of consecutive integer years (the year axis)
+        fold - if False, earlier years are dropped as well
+
+    Return:
+        (n, Y) int array
+    """
+
+    if not years or not len(rows):
+        return np.zeros((n, len(years)), dtype=COUNT_DTYPE)
+    rows, yrs, vals = np.asarray(rows), np.asarray(yrs), np.asarray(vals)
+    lo, hi = years[0], years[-1]
+    keep = yrs <= hi if fold else (yrs >= lo) & (yrs <= hi)
+    cols = np.maximum(yrs[keep], lo) - lo
+    flat = rows[keep].astype(np.int64) * len(years) + cols
+    counts = np.bincount(flat, weights=vals[keep], minlength=n * len(years))
+    return counts.astype(COUNT_DTYPE).reshape(n, len(years))
+
+
+def foldedCounts(rows, yrs, vals, n, years):
+    """
+    Part of the counts yearMatrix folds into the first column, from years before the axis
+
+    Args:
+        rows - sequence of row ids
+        yrs - sequence of integer years
+        vals - sequence of counts
+        n - number of rows
+        years - list of consecutive integer years (the year axis)
+
+    Return:
+        (n,) int array, or None if no count is from before the axis
+    """
+
+    if not years or not len(rows):
+        return None
+    rows, yrs, vals = np.asarray(rows), np.asarray(yrs), np.asarray(vals)
+    early = yrs < years[0]
+    if not early.any():
+        return None
+    return np.bincount(rows[early], weights=vals[early], minlength=n).astype(COUNT_DTYPE)
+
+
+def edgeOrder(edges):
+    """
+    Permutation sorting an (E, 2) edge array by (u, v)
+
+    Args:
+        edges - (E, 2) int array of node ids
+
+    Return:
+        (E,) int array of edge positions
+    """
+
+    edges = np.asarray(edges).reshape(-1, 2)
+    return np.lexsort((edges[:, 1], edges[:, 0]))
+
+
+def weightedAdjacency(edges, w, n, weighted=True):
+    """
+    Symmetric sparse adjacency matrix of the edges with non-zero weight
+
+    Args:
+        edges - (E, 2) int array of node ids
+        w - (E,) array of edge weights
+        n - number of nodes
+        weighted - if False, every edge with non-zero weight counts as 1
+
+    Return:
+        (N, N) scipy.sparse.csr_matrix indexed by node id
+    """
+
+    keep = w > 0
+    u, v = edges[keep, 0], edges[keep, 1]
+    data = w[keep].astype(np.float64) if weighted else np.ones(keep.sum())
+
+    # mirror off-diagonal entries only, self-loops appear once
+    off = u != v
+    A = sp.coo_matrix((np.concatenate([data, data[off]]),
+                       (np.concatenate([u, v[off]]), np.concatenate([v, u[off]]))), shape=(n, n))
+    return A.tocsr()
+
+
+class CoTagTensor(object):
+    """
+    Dense year-indexed counts of the JEL co-tagging network
+
+    Nodes are indexed once; edges are stored as an (E, 2) array of node ids
+    with u < v, next to (E, Y) and (N, Y) arrays of per-year paper counts.
+    Cumulative "up to year" weights are a single prefix sum along the year
+    axis and are cached after the first request.
+
+    Attributes:
+        nodes - list of JEL codes, position is the node id
+        index - dict of JEL code -> node id
+        years - list of consecutive integer years (the year axis)
+        edges - (E, 2) int array of node ids
+        edge_counts - (E, Y) int array of papers per edge per year
+        node_counts - (N, Y) int array of papers per node per year
+        edge_total - (E,) int array of the overall "weight" attribute
+        node_total - (N,) int array of the overall "citations" attribute
+        node_data - list of dicts of remaining (non-count) node attributes
+        edge_fold - (E,) int array of the papers before the year axis folded into its
+            first column, None if there are none
+        node_fold - (N,) int array, the same for nodes
+    """
+
+    def __init__(self, nodes, years, edges, edge_counts, node_counts,
+                 edge_total=None, node_total=None, node_data=None, edge_fold=None, node_fold=None):
+        self.nodes = list(nodes)
+        self.index = dict((code, i) for i, code in enumerate(self.nodes))
+        self.years = [int(y) for y in years]
+        self.edges = np.asarray(edges, dtype=INDEX_DTYPE).reshape(-1, 2)
+        self.edge_counts = np.asarray(edge_counts, dtype=COUNT_DTYPE).reshape(len(self.edges), len(self.years))
+        self.node_counts = np.asarray(node_counts, dtype=COUNT_DTYPE).reshape(len(self.nodes), len(self.years))
+        if edge_total is None:
+            edge_total = self.edge_counts.sum(axis=1)
+        if node_total is None:
+            node_total = self.node_counts.sum(axis=1)
+        self.edge_total = np.asarray(edge_total, dtype=COUNT_DTYPE)
+        self.node_total = np.asarray(node_total, dtype=COUNT_DTYPE)
+        if node_data is None:
+            node_data = [{} for _ in self.nodes]
+        self.node_data = node_data
+        self.edge_fold = None if edge_fold is None else np.asarray(edge_fold, dtype=COUNT_DTYPE)
+        self.node_fold = None if node_fold is None else np.asarray(node_fold, dtype=COUNT_DTYPE)
+        self._edge_cum = None
+        self._node_cum = None
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def size(self):
+        """Number of edges"""
+        return len(self.edges)
+
+    @classmethod
+    def fromGraph(cls, G, years=None, fold=True):
+        """
+        Build the tensor from a NetworkX graph in a single pass over attributes
+
+        Args:
+            G - nx.Graph() object with raw ("2006") or cleaned ("weight2006") year keys
+            years - optional (lower, upper) year bounds for the year axis
+            fold - fold years before the lower bound into it, else drop them and fit the axis to the observed years
+
+        Return:
+            CoTagTensor object
+        """
+
+        nodes = sorted(G.nodes())
+        index = dict((code, i) for i, code in enumerate(nodes))
+
+        # parse each distinct attribute key once
+        key_year = {}
+
+        def yearOf(k):
+            if k not in key_year:
+                m = YEAR_KEY.match(k)
+                key_year[k] = int(m.group(1)) if m else None
+            return key_year[k]
+
+        node_rows, node_yrs, node_vals = [], [], []
+        node_total, node_data = [], []
+        for i, code in enumerate(nodes):
+            rest, total, subtotal = {}, None, 0
+            for k, v in G.node[code].iteritems():
+                y = yearOf(k)
+                if y is not None:
+                    node_rows.append(i)
+                    node_yrs.append(y)
+                    node_vals.append(int(v))
+                    subtotal += int(v)
+                elif k == NODE_TOTAL_KEY:
+                    total = int(v)
+                elif not k.startswith("weight"):
+                    rest[k] = v
+            node_total.append(subtotal if total is None else total)
+            node_data.append(rest)
+
+        edges, edge_total = [], []
+        edge_rows, edge_yrs, edge_vals = [], [], []
+        for e, (e1, e2, data) in enumerate(G.edges_iter(data=True)):
+            u, v = index[e1], index[e2]
+            edges.append((min(u, v), max(u, v)))
+            total, subtotal = None, 0
+            for k, w in data.iteritems():
+                y = yearOf(k)
+                if y is not None:
+                    edge_rows.append(e)
+                    edge_yrs.append(y)
+                    edge_vals.append(int(w))
+                    subtotal += int(w)
+                elif k == EDGE_TOTAL_KEY:
+                    total = int(w)
+            edge_total.append(subtotal if total is None else total)
+
+        # edges sorted by (u, v) so equal graphs give equal arrays
+        order = edgeOrder(edges)
+        rank = np.empty(len(order), dtype=np.int64)
+        rank[order] = np.arange(len(order))
+        edges = np.asarray(edges, dtype=INDEX_DTYPE).reshape(-1, 2)[order]
+        edge_total = np.asarray(edge_total, dtype=COUNT_DTYPE)[order]
+        edge_rows = rank[np.asarray(edge_rows, dtype=np.int64)]
+
+        years = yearRange(set(node_yrs) | set(edge_yrs), years, clip=not fold)
+        node_counts = yearMatrix(node_rows, node_yrs, node_vals, len(nodes), years, fold)
+        edge_counts = yearMatrix(edge_rows, edge_yrs, edge_vals, len(edges), years, fold)
+        node_fold = foldedCounts(node_rows, node_yrs, node_vals, len(nodes), years) if fold else None
+        edge_fold = foldedCounts(edge_rows, edge_yrs, edge_vals, len(edges), years) if fold else None
+
+        return cls(nodes, years, edges, edge_counts, node_counts,
+                   edge_total=edge_total, node_total=node_total, node_data=node_data,
+                   edge_fold=edge_fold, node_fold=node_fold)
+
+    @classmethod
+    def fromRecords(cls, records, nodes, years=None):
+        """
+        Build the tensor directly from parsed paper records
+
+        Args:
+            records - iterable of (year, codes) tuples, one per paper
+            nodes - iterable of JEL codes to index (codes outside it are ignored)
+            years - optional (lower, upper) year bounds for the year axis
+
+        Return:
+            CoTagTensor object
+        """
+
+        nodes = sorted(nodes)
+        index = dict((code, i) for i, code in enumerate(nodes))
+        node_counter, edge_counter = Counter(), Counter()
+        for year, codes in records:
+            if not str(year).isdigit():
+                continue
+            year = int(year)
+            ids = sorted(set(index[c] for c in codes if c in index))
+            for i in ids:
+                node_counter[i, year] += 1
+            for u, v in itertools.combinations(ids, 2):
+                edge_counter[u, v, year] += 1
+
+        return cls.fromCounts(nodes, node_counter, edge_counter, years)
+
+    @classmethod
+    def fromCounts(cls, nodes, node_counter, edge_counter, years=None):
+        """
+        Build the tensor from (node, year) and (u, v, year) count mappings
+
+        Args:
+            nodes - list of JEL codes, position is the node id
+            node_counter - dict of (node id, year) -> count
+            edge_counter - dict of (u, v, year) -> count with u < v
+            years - optional (lower, upper) year bounds for the year axis
+
+        Return:
+            CoTagTensor object
+        """
+
+        years = yearRange(set(k[-1] for k in node_counter) | set(k[-1] for k in edge_counter), years)
+
+        node_rows, node_yrs, node_vals = [], [], []
+        for (i, year), c in node_counter.iteritems():
+            node_rows.append(i)
+            node_yrs.append(year)
+            node_vals.append(c)
+        node_total = np.bincount(node_rows, weights=node_vals, minlength=len(nodes)) if node_rows else None
+
+        edge_ids = {}
+        for e, pair in enumerate(sorted(set((u, v) for (u, v, year) in edge_counter))):
+            edge_ids[pair] = e
+        edges = sorted(edge_ids, key=edge_ids.get)
+        edge_rows, edge_yrs, edge_vals = [], [], []
+        for (u, v, year), c in edge_counter.iteritems():
+            edge_rows.append(edge_ids[u, v])
+            edge_yrs.append(year)
+            edge_vals.append(c)
+        edge_total = np.bincount(edge_rows, weights=edge_vals, minlength=len(edges)) if edge_rows else None
+
+        return cls(nodes, years, edges,
+                   yearMatrix(edge_rows, edge_yrs, edge_vals, len(edges), years),
+                   yearMatrix(node_rows, node_yrs, node_vals, len(nodes), years),
+                   edge_total=edge_total, node_total=node_total,
+                   edge_fold=foldedCounts(edge_rows, edge_yrs, edge_vals, len(edges), years),
+                   node_fold=foldedCounts(node_rows, node_yrs, node_vals, len(nodes), years))
+
+    def restrictYears(self, lower, upper):
+        """
+        Copy of the tensor on a narrower year axis
+
+        Counts before the lower bound are folded into it, so cumulative
+        weights are unchanged; counts after the upper bound are dropped.
+        The folded counts are kept as edge_fold and node_fold.
+
+        Args:
+            lower - first year of the new axis
+            upper - last year of the new axis
+
+        Return:
+            CoTagTensor object
+        """
+
+        if not self.years:
+            raise ValueError("Cannot restrict an empty year axis to %s-%s" % (lower, upper))
+        years = range(int(lower), int(upper) + 1)
+        lo, hi = self.yearIndex(lower), self.yearIndex(upper)
+        edge_counts = np.zeros((len(self.edges), len(years)), dtype=COUNT_DTYPE)
+        node_counts = np.zeros((len(self.nodes), len(years)), dtype=COUNT_DTYPE)
+        edge_fold, node_fold = self.edge_fold, self.node_fold
+        if int(upper) >= self.years[0] and int(lower) <= self.years[-1]:
+            start = self.years[lo] - int(lower)
+            width = hi - lo + 1
+            edge_counts[:, start:start + width] = self.edge_counts[:, lo:hi + 1]
+            node_counts[:, start:start + width] = self.node_counts[:, lo:hi + 1]
+            if lo > 0:
+                # the old first column, with its own folded papers, is part of the new fold
+                edge_fold = self.edge_counts[:, :lo].sum(axis=1)
+                node_fold = self.node_counts[:, :lo].sum(axis=1)
+                edge_counts[:, start] += edge_fold
+                node_counts[:, start] += node_fold
+            elif start > 0:
+                # papers folded into the old first column stay in the first column
+                if edge_fold is not None:
+                    edge_counts[:, start] -= edge_fold
+                    edge_counts[:, 0] += edge_fold
+                if node_fold is not None:
+                    node_counts[:, start] -= node_fold
+                    node_counts[:, 0] += node_fold
+        elif int(lower) > self.years[-1]:
+            edge_counts[:, 0] = edge_fold = self.edge_counts.sum(axis=1)
+            node_counts[:, 0] = node_fold = self.node_counts.sum(axis=1)
+        else:
+            edge_fold = node_fold = None
+
+        return CoTagTensor(self.nodes, years, self.edges, edge_counts, node_counts,
+                           edge_total=self.edge_total, node_total=self.node_total,
+                           node_data=self.node_data, edge_fold=edge_fold, node_fold=node_fold)
+
+    def yearIndex(self, year):
+        """
+        Column of the year axis for a given year
+
+        Args:
+            year - integer or string year
+
+        Return:
+            integer column index, clipped to the year axis
+        """
+
+        if not self.years:
+            raise ValueError("No column for year %s, the year axis is empty" % year)
+        col = int(year) - self.years[0]
+        return min(max(col, 0), len(self.years) - 1)
+
+    def cumulativeEdgeCounts(self):
+        """(E, Y) array of edge weights up to and including each year"""
+        if self._edge_cum is None:
+            self._edge_cum = np.cumsum(self.edge_counts, axis=1, dtype=COUNT_DTYPE)
+        return self._edge_cum
+
+    def cumulativeNodeCounts(self):
+        """(N, Y) array of node weights up to and including each year"""
+        if self._node_cum is None:
+            self._node_cum = np.cumsum(self.node_counts, axis=1, dtype=COUNT_DTYPE)
+        return self._node_cum
+
+    def edgeWeightsUpTo(self, year):
+        """
+        Cumulative edge weights up to a certain year
+
+        Args:
+            year - integer or string representing "up to" year
+
+        Return:
+            (E,) int array aligned with self.edges
+        """
+
+        if not self.years or int(year) < self.years[0]:
+            return np.zeros(len(self.edges), dtype=COUNT_DTYPE)
+        return self.cumulativeEdgeCounts()[:, self.yearIndex(year)]
+
+    def nodeWeightsUpTo(self, year):
+        """
+        Cumulative node weights up to a certain year
+
+        Args:
+            year - integer or string representing "up to" year
+
+        Return:
+            (N,) int array aligned with self.nodes
+        """
+
+        if not self.years or int(year) < self.years[0]:
+            return np.zeros(len(self.nodes), dtype=COUNT_DTYPE)
+        return self.cumulativeNodeCounts()[:, self.yearIndex(year)]
+
+    def edgeWeights(self, year=None):
+        """
+        Edge weights, overall or up to a certain year
+
+        Args:
+            year - optional "up to" year, None for the overall "weight" attribute
+
+        Return:
+            (E,) int array aligned with self.edges
+        """
+
+        if year is None:
+            return self.edge_total
+        return self.edgeWeightsUpTo(year)
+
+    def adjacency(self, year=None, weighted=True):
+        """
+        Symmetric sparse adjacency matrix of the network
+
+        Args:
+            year - optional "up to" year, None for overall weights
+            weighted - if False, every edge with non-zero weight counts as 1
+
+        Return:
+            (N, N) scipy.sparse.csr_matrix indexed by node id
+        """
+
+        return weightedAdjacency(self.edges, self.edgeWeights(year), len(self.nodes), weighted)
@@ -0,0 +1,300 @@
+# -*- coding: utf-8 -*-
+
+import errno
+import httplib
+import Queue
+import random
+import socket
+import threading
+from time import strftime, sleep, time
+import urlparse
+import zlib
+
+
+################################
+###     GLOBAL VARIABLES     ###
+################################
+
+# Default HTTP user agent
+AGENT = 'Mozilla/5.0 (Windows NT 10.0; WOW64; rv:45.0) Gecko/20100101 Firefox/45.0'
+
+# HTTP status codes worth retrying (rate limited or server-side failures)
+RETRY_STATUS = (408, 429, 500, 502, 503, 504)
+
+# How many redirects to follow for a single fetch
+MAX_REDIRECTS = 5
+
+# Socket errors of a kept-alive connection the server closed while it was idle
+STALE_ERRNOS = (errno.ECONNRESET, errno.EPIPE, errno.ECONNABORTED)
+
+# Timestamp
+TIME = "%Y-%m-%d %H:%M:%S"
+
+
+#################################
+###     UTILITY FUNCTIONS     ###
+#################################
+
+class FetchError(Exception):
+    """Raised when a page cannot be fetched within the retry budget"""
+    pass
+
+
+class TokenBucket(object):
+    """
+    Thread-safe token bucket used as a per-host politeness limit
+
+    Args:
+        rate - tokens added per second (sustained requests per second)
+        burst - bucket capacity (requests allowed back to back)
+    """
+
+    def __init__(self, rate, burst=1):
+        self.rate = float(rate)
+        self.burst = float(burst)
+        self.tokens = float(burst)
+        self.stamp = time()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """
+        Block until a token is available and take it
+
+        Return:
+            float - seconds spent waiting
+        """
+
+        waited = 0.0
+        while True:
+            with self.lock:
+                now = time()
+                self.tokens = min(self.burst, self.tokens + (now - self.stamp) * self.rate)
+                self.stamp = now
+                if self.tokens >= 1.0:
+                    self.tokens -= 1.0
+                    return waited
+                delay = (1.0 - self.tokens) / self.rate
+            sleep(delay)
+            waited += delay
+
+
+def staleConnection(e):
+    """Whether a request error means a reused connection had been closed by the server"""
+    if isinstance(e, httplib.BadStatusLine):
+        return True
+    return isinstance(e, socket.error) and not isinstance(e, socket.timeout) and e.errno in STALE_ERRNOS
+
+
+def backoffDelay(attempt, base, cap):
+    """
+    Jittered exponential backoff ("full jitter")
+
+    Args:
+        attempt - zero-based retry attempt
+        base - delay of the first retry in seconds
+        cap - upper bound on the delay in seconds
+
+    Return:
+        float - seconds to wait before the next attempt
+    """
+
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+class CrawlEngine(object):
+    """
+    Rate-limited fetch scheduler with keep-alive connection reuse
+
+    A fixed number of worker threads bounds the requests in flight. Each
+    worker keeps one persistent HTTP/1.1 connection per host, every request
+    first takes a token from its host's bucket, and failed requests are
+    retried with jittered exponential backoff. A request failing on a
+    kept-alive connection the server has closed is resent at once on a new one.
+
+    Args:
+        concurrency - maximum number of requests in flight
+        rate - sustained requests per second allowed per host
+        burst - requests per host allowed back to back
+        retries - attempts per URL before giving up
+        backoff - base delay of the first retry in seconds
+        max_backoff - upper bound on a single retry delay in seconds
+        timeout - socket timeout in seconds
+        agent - HTTP user agent string
+        stats - optional CrawlStats object recording latency, bytes, waits and retries
+    """
+
+    def __init__(self, concurrency=8, rate=1.0, burst=1, retries=5, backoff=2.0,
+                 max_backoff=120.0, timeout=60, agent=AGENT, stats=None):
+        self.concurrency = concurrency
+        self.rate = rate
+        self.burst = burst
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.timeout = timeout
+        self.agent = agent
+        self.stats = stats
+        self.buckets = {}
+        self.buckets_lock = threading.Lock()
+        self.local = threading.local()
+
+    def bucket(self, host):
+        """Token bucket of a host, created on first use"""
+        with self.buckets_lock:
+            if host not in self.buckets:
+                self.buckets[host] = TokenBucket(self.rate, self.burst)
+            return self.buckets[host]
+
+    def connection(self, scheme, host):
+        """Persistent connection of the calling thread to a host"""
+        conns = getattr(self.local, "conns", None)
+        if conns is None:
+            conns = self.local.conns = {}
+        key = (scheme, host)
+        if key not in conns:
+            cls = httplib.HTTPSConnection if scheme == "https" else httplib.HTTPConnection
+            conns[key] = cls(host, timeout=self.timeout)
+        return conns[key]
+
+    def dropConnection(self, scheme, host):
+        """Close and forget the calling thread's connection to a host"""
+        conns = getattr(self.local, "conns", {})
+        conn = conns.pop((scheme, host), None)
+        if conn is not None:
+            conn.close()
+
+    def closeAll(self):
+        """Close the calling thread's connections"""
+        for conn in getattr(self.local, "conns", {}).values():
+            conn.close()
+        self.local.conns = {}
+
+    def request(self, url):
+        """
+        Single rate-limited GET request over a kept-alive connection
+
+        Args:
+            url - absolute URL string
+
+        Return:
+            tuple of (status, headers dict, body string)
+        """
+
+        parts = urlparse.urlsplit(url)
+        path = parts.path or "/"
+        if parts.query:
+            path += "?" + parts.query
+        waited = self.bucket(parts.netloc).acquire()
+        start = time()
+        for reconnected in (False, True):
+            conn = self.connection(parts.scheme, parts.netloc)
+            reused = conn.sock is not None
+            try:
+                conn.request("GET", path, headers={"User-Agent": self.agent,
+                                                    "Accept-Encoding": "gzip",
+                                                    "Connection": "keep-alive"})
+                resp = conn.getresponse()
+                body = resp.read()
+                headers = dict(resp.getheaders())
+                break
+            except (socket.error, httplib.HTTPException) as e:
+                self.dropConnection(parts.scheme, parts.netloc)
+                if reconnected or not reused or not staleConnection(e):
+                    raise
+            if self.stats is not None:
+                self.stats.count("reconnects")
+        if self.stats is not None:
+            self.stats.add("rate_wait", waited)
+            self.stats.fetched(time() - start, len(body))
+        if resp.will_close:
+            self.dropConnection(parts.scheme, parts.netloc)
+        if headers.get("content-encoding") == "gzip":
+            body = zlib.decompress(body, 16 + zlib.MAX_WBITS)
+
+        return resp.status, headers, body
+
+    def fetch(self, url):
+        """
+        Fetch a page, following redirects and retrying transient failures
+
+        Args:
+            url - absolute URL string
+
+        Return:
+            s - page body string
+        """
+
+        for attempt in xrange(self.retries):
+            try:
+                target = url
+                for _ in xrange(MAX_REDIRECTS):
+                    status, headers, body = self.request(target)
+                    if status in (301, 302, 303, 307, 308) and "location" in headers:
+                        target = urlparse.urljoin(target, headers["location"])
+                        continue
+                    break
+                if status == 200:
+                    return body
+                if status not in RETRY_STATUS:
+                    raise FetchError("HTTP %i for '%s'" % (status, url))
+                reason = "HTTP %i" % status
+            except (socket.error, httplib.HTTPException, zlib.error) as e:
+                reason = e.__class__.__name__
+            if attempt == self.retries - 1:
+                print '>>> %s | !!! %s on %s, giving up' % (strftime(TIME), reason, url)
+                break
+            delay = backoffDelay(attempt, self.backoff, self.max_backoff)
+            print '>>> %s | !!! %s on %s, retrying in %.1fs...' % (strftime(TIME), reason, url, delay)
+            if self.stats is not None:
+                self.stats.count("retries")
+                self.stats.add("backoff", delay)
+            sleep(delay)
+
+        raise FetchError("Gave up on '%s' after %i attempts" % (url, self.retries))
+
+    def map(self, handler, urls):
+        """
+        Fetch URLs with bounded concurrency and pass each page to a handler
+
+        The handler runs on the worker thread that fetched the page. URLs that
+        exhaust their retries, or whose handler raises, are reported and skipped.
+
+        Args:
+            handler - callable taking (url, body string)
+            urls - iterable of absolute URL strings
+
+        Return:
+            failed - list of URL strings that could not be fetched or handled
+        """
+
+        work = Queue.Queue(maxsize=self.concurrency * 2)
+        failed = []
+        failed_lock = threading.Lock()
+
+        def worker():
+            while True:
+                url = work.get()
+                if url is None:
+                    self.closeAll()
+                    return
+                try:
+                    handler(url, self.fetch(url))
+                except Exception as e:
+                    print ">>> %s | !!! %s, skipping '%s'" % (strftime(TIME), e.__class__.__name__, url)
+                    if self.stats is not None:
+                        self.stats.count("failed")
+                    with failed_lock:
+                        failed.append(url)
+
+        threads = [threading.Thread(target=worker) for _ in xrange(self.concurrency)]
+        for t in threads:
+            t.daemon = True
+            t.start()
+        for url in urls:
+            work.put(url)
+        for _ in threads:
+            work.put(None)
+        for t in threads:
+            t.join()
+
+        return failed
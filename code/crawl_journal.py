@@ -0,0 +1,212 @@
+# -*- coding: utf-8 -*-
+
+import os
+import threading
+from time import time
+
+
+################################
+###     GLOBAL VARIABLES     ###
+################################
+
+# Line tags of the journal file
+TAG_QUERY = "Q"     # Q <url>               header, the search query the journal belongs to
+TAG_RECORD = "R"    # R <page> <year> <codes> [<handle>]  one parsed paper
+TAG_HANDLES = "H"   # H <page> <handles>    handles of the page's papers, for deduplication
+TAG_PAGE = "P"      # P <page>              page completed, always after its records
+TAG_DONE = "D"      # D                     crawl finished, the last line of a complete journal
+
+# Field separators
+SEP = "\t"
+CODE_SEP = " "
+
+
+#################################
+###     UTILITY FUNCTIONS     ###
+#################################
+
+class JournalMismatchError(Exception):
+    """Raised when a journal on disk was written for a different search query"""
+    pass
+
+
+class CrawlJournal(object):
+    """
+    Append-only, fsync-batched journal of completed crawl pages
+
+    Each page is appended as one block: its parsed (year, codes) records
+    followed by a completion marker. A block torn by a crash has no marker
+    and is ignored on replay and cut off when the journal is reopened, so
+    the page is simply crawled again. A finished crawl marks the journal
+    complete, so a later run can tell it has nothing left to resume.
+
+    Args:
+        path - journal file path
+        query - search URL the journal belongs to, checked against the header
+            (a journal opened fresh is reset instead)
+        sync_pages - fsync after this many pages have been appended
+        sync_secs - fsync at least this often (seconds) while pages are appended
+    """
+
+    def __init__(self, path, query, sync_pages=50, sync_secs=30.0):
+        self.path = path
+        self.query = query
+        self.sync_pages = sync_pages
+        self.sync_secs = sync_secs
+        self.lock = threading.Lock()
+        self.pending = 0
+        self.synced = time()
+        self.f = None
+
+    def replay(self, handler, handles=None):
+        """
+        Stream completed pages of an existing journal into a handler
+
+        Args:
+            handler - callable taking (page, list of (year, codes tuple) records,
+                list of the records' paper handles, None where a record has none)
+            handles - optional callable taking the list of paper handles of every completed page
+
+        Return:
+            done - set of integer page numbers already completed
+        """
+
+        done = set()
+        if not os.path.exists(self.path):
+            return done
+
+        with open(self.path, "rb") as f:
+            page, records, papers, seen = None, [], [], []
+            for line in f:
+                if not line.endswith("\n"):
+                    break   # torn tail
+                fields = line.rstrip("\n").split(SEP)
+                tag = fields[0]
+                if tag == TAG_QUERY:
+                    if fields[1] != self.query:
+                        raise JournalMismatchError("'%s' was written for '%s'" % (self.path, fields[1]))
+                elif tag == TAG_RECORD:
+                    pg = int(fields[1])
+                    if pg != page:
+                        page, records, papers = pg, [], []
+                    codes = tuple(fields[3].split(CODE_SEP)) if fields[3] else ()
+                    records.append((fields[2], codes))
+                    papers.append(fields[4] if len(fields) > 4 else None)
+                elif tag == TAG_HANDLES:
+                    pg = int(fields[1])
+                    if pg != page:
+                        page, records, papers = pg, [], []
+                    seen = fields[2].split(CODE_SEP) if fields[2] else []
+                elif tag == TAG_PAGE:
+                    pg = int(fields[1])
+                    if pg not in done:
+                        handler(pg, records if pg == page else [], papers if pg == page else [])
+                        if handles is not None and pg == page:
+                            handles(seen)
+                        done.add(pg)
+                    page, records, papers, seen = None, [], [], []
+
+        return done
+
+    def open(self, fresh=False):
+        """
+        Open the journal for appending, writing the header if it is new
+
+        Args:
+            fresh - start an empty journal, discarding the pages of an earlier run
+
+        Return:
+            self
+        """
+
+        if not fresh and os.path.exists(self.path):
+            self.checkHeader()
+            self.truncateTornTail()
+        new = fresh or not os.path.exists(self.path) or os.path.getsize(self.path) == 0
+        self.f = open(self.path, "wb" if fresh else "ab")
+        if new:
+            self.f.write(SEP.join((TAG_QUERY, self.query)) + "\n")
+            self.sync()
+        return self
+
+    def checkHeader(self):
+        """Raise JournalMismatchError if the journal on disk belongs to another search query"""
+        with open(self.path, "rb") as f:
+            line = f.readline()
+        if line.endswith("\n"):
+            fields = line.rstrip("\n").split(SEP)
+            if fields[0] != TAG_QUERY or fields[1:] != [self.query]:
+                raise JournalMismatchError("'%s' was written for '%s'" % (self.path, SEP.join(fields[1:])))
+
+    def truncateTornTail(self):
+        """Cut records of a page block left incomplete by a crash"""
+        end = 0
+        with open(self.path, "r+b") as f:
+            pos = 0
+            for line in f:
+                pos += len(line)
+                if line.endswith("\n") and line[0] in (TAG_QUERY, TAG_PAGE, TAG_DONE):
+                    end = pos
+            if end != pos:
+                f.truncate(end)
+
+    def recordPage(self, page, records, handles=(), papers=None):
+        """
+        Append a completed page and its parsed records as a single block
+
+        Args:
+            page - integer page number
+            records - list of (year, codes) tuples parsed from the page
+            handles - optional list of handles of the page's papers, for deduplication
+            papers - optional list of the records' paper handles, None where a record has none
+
+        Return:
+            None
+        """
+
+        lines = []
+        for (year, codes), handle in zip(records, papers or [None] * len(records)):
+            fields = (TAG_RECORD, str(page), year, CODE_SEP.join(codes))
+            lines.append(SEP.join(fields + (handle,) if handle else fields))
+        if handles:
+            lines.append(SEP.join((TAG_HANDLES, str(page), CODE_SEP.join(handles))))
+        lines.append(SEP.join((TAG_PAGE, str(page))))
+        block = "\n".join(lines) + "\n"
+
+        with self.lock:
+            self.f.write(block)
+            self.pending += 1
+            if self.pending >= self.sync_pages or time() - self.synced >= self.sync_secs:
+                self.sync()
+
+    def sync(self):
+        """Flush buffered pages to disk"""
+        self.f.flush()
+        os.fsync(self.f.fileno())
+        self.pending = 0
+        self.synced = time()
+
+    def complete(self):
+        """Mark the journal of a finished crawl complete, after it has been closed"""
+        with open(self.path, "ab") as f:
+            f.write(TAG_DONE + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def isComplete(self):
+        """Whether the journal on disk was marked complete by a finished crawl"""
+        if not os.path.exists(self.path):
+            return False
+        end = "\n" + TAG_DONE + "\n"
+        with open(self.path, "rb") as f:
+            f.seek(0, os.SEEK_END)
+            f.seek(max(f.tell() - len(end), 0))
+            return f.read() == end
+
+    def close(self):
+        """Sync and close the journal"""
+        if self.f is not None:
+            with self.lock:
+                self.sync()
+                self.f.close()
+                self.f = None
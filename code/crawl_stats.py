@@ -0,0 +1,241 @@
+# -*- coding: utf-8 -*-
+
+import bisect
+import cProfile
+import json
+import pstats
+import sys
+import threading
+from time import strftime, time
+
+
+################################
+###     GLOBAL VARIABLES     ###
+################################
+
+# Upper bounds (seconds) of the fetch latency histogram buckets, the last one is open
+LATENCY_BOUNDS = (0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Prefix of the periodic structured stats lines
+STATS_TAG = "STATS"
+
+# Timestamp
+TIME = "%Y-%m-%d %H:%M:%S"
+
+
+#################################
+###     UTILITY FUNCTIONS     ###
+#################################
+
+class LatencyHistogram(object):
+    """
+    Fixed-bucket latency histogram
+
+    Args:
+        bounds - increasing upper bounds of the buckets in seconds
+    """
+
+    def __init__(self, bounds=LATENCY_BOUNDS):
+        self.bounds = list(bounds)
+        self.buckets = [0] * (len(self.bounds) + 1)
+        self.n = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, seconds):
+        self.buckets[bisect.bisect_left(self.bounds, seconds)] += 1
+        self.n += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def percentile(self, q):
+        """Upper bound of the bucket holding the q-th percentile (max for the open bucket)"""
+        if not self.n:
+            return 0.0
+        rank = q / 100.0 * self.n
+        seen = 0
+        for bound, c in zip(self.bounds, self.buckets):
+            seen += c
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+    def snapshot(self):
+        """Dict of count, mean, percentiles and bucket counts keyed by upper bound"""
+        labels = ["<=%g" % b for b in self.bounds] + [">%g" % self.bounds[-1]]
+        return {"n": self.n,
+                "mean": self.total / self.n if self.n else 0.0,
+                "p50": self.percentile(50), "p90": self.percentile(90), "p99": self.percentile(99),
+                "max": self.max,
+                "buckets": dict((k, c) for k, c in zip(labels, self.buckets) if c)}
+
+
+class StageTimer(object):
+    """Context manager adding its elapsed time to a stage of a CrawlStats object"""
+
+    def __init__(self, stats, stage):
+        self.stats = stats
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time()
+        return self
+
+    def __exit__(self, *exc):
+        self.stats.add(self.stage, time() - self.start)
+        return False
+
+
+class CrawlStats(object):
+    """
+    Thread-safe crawl counters, stage timers and fetch latency histogram
+
+    Stage times are summed over all threads (and parse processes), so they
+    can exceed wall time; compare them with each other to find where the
+    work goes. A background thread prints one JSON stats line every
+    interval seconds while the crawl runs.
+
+    Args:
+        interval - seconds between stats lines, None to disable them
+        stream - file object the stats lines and summary are written to
+    """
+
+    def __init__(self, interval=30.0, stream=None):
+        self.interval = interval
+        self.stream = stream if stream is not None else sys.stdout
+        self.lock = threading.Lock()
+        self.started = time()
+        self.counters = {}
+        self.stages = {}
+        self.latency = LatencyHistogram()
+        self.stopping = threading.Event()
+        self.reporter = None
+
+    def count(self, name, n=1):
+        """Add n to a counter"""
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def add(self, stage, seconds, n=1):
+        """Add time spent in a stage, counting n calls"""
+        with self.lock:
+            calls, total = self.stages.get(stage, (0, 0.0))
+            self.stages[stage] = (calls + n, total + seconds)
+
+    def timer(self, stage):
+        """Context manager timing a block as a stage"""
+        return StageTimer(self, stage)
+
+    def fetched(self, seconds, nbytes):
+        """Record one HTTP response: its latency and size on the wire"""
+        with self.lock:
+            self.latency.add(seconds)
+            self.counters["responses"] = self.counters.get("responses", 0) + 1
+            self.counters["bytes"] = self.counters.get("bytes", 0) + nbytes
+
+    def snapshot(self):
+        """
+        Current statistics
+
+        Return:
+            dict of elapsed time, rates, counters, stage timings and fetch latency
+        """
+
+        with self.lock:
+            elapsed = max(time() - self.started, 1e-9)
+            c = dict(self.counters)
+            pages = c.get("pages", 0)
+            return {"time": strftime(TIME),
+                    "elapsed": round(elapsed, 3),
+                    "pages_per_sec": pages / elapsed,
+                    "mb_per_sec": c.get("bytes", 0) / elapsed / 1e6,
+                    "papers_per_page": float(c.get("papers", 0)) / pages if pages else 0.0,
+                    "counters": c,
+                    "stages": dict((stage, {"calls": calls, "total": total, "mean": total / calls if calls else 0.0})
+                                   for stage, (calls, total) in self.stages.items()),
+                    "fetch_latency": self.latency.snapshot()}
+
+    def report(self):
+        """Write one structured stats line"""
+        self.stream.write("%s %s\n" % (STATS_TAG, json.dumps(self.snapshot(), sort_keys=True)))
+        self.stream.flush()
+
+    def start(self):
+        """Start the periodic stats line thread"""
+        if self.interval is None or self.reporter is not None:
+            return
+
+        def run():
+            while not self.stopping.wait(self.interval):
+                self.report()
+
+        self.reporter = threading.Thread(target=run)
+        self.reporter.daemon = True
+        self.reporter.start()
+
+    def stop(self):
+        """Stop the periodic stats line thread"""
+        self.stopping.set()
+        if self.reporter is not None:
+            self.reporter.join()
+            self.reporter = None
+
+    def summary(self):
+        """Write an end-of-run summary"""
+        snap = self.snapshot()
+        c = snap["counters"]
+        lat = snap["fetch_latency"]
+        w = self.stream.write
+        w("Crawl summary (%.1fs):\n" % snap["elapsed"])
+        w("  Pages: %i (%.2f pages/s), %i failed\n" % (c.get("pages", 0), snap["pages_per_sec"], c.get("failed", 0)))
+        w("  Papers: %i (%.1f per page)\n" % (c.get("papers", 0), snap["papers_per_page"]))
+        w("  Responses: %i, %.1f MB (%.3f MB/s), %i retries\n" % (
+            c.get("responses", 0), c.get("bytes", 0) / 1e6, snap["mb_per_sec"], c.get("retries", 0)))
+        w("  Fetch latency: mean %.3fs, p50 <=%.3fs, p90 <=%.3fs, p99 <=%.3fs, max %.3fs\n" % (
+            lat["mean"], lat["p50"], lat["p90"], lat["p99"], lat["max"]))
+        w("  Stage times (summed over threads and processes):\n")
+        for stage, s in sorted(snap["stages"].items(), key=lambda item: -item[1]["total"]):
+            w("    %-12s %10.2fs over %7i calls (%.4fs each)\n" % (stage, s["total"], s["calls"], s["mean"]))
+        self.stream.flush()
+
+
+def profileCall(func, path, top=25):
+    """
+    Run a function under cProfile, including the threads it starts
+
+    Every thread started while func runs gets its own profiler; all of
+    them are merged into one stats file. Parse worker processes are not
+    profiled, their time shows up in the "parse" stage instead.
+
+    Args:
+        func - callable taking no arguments
+        path - file the merged pstats data is written to
+        top - number of functions by cumulative time to print
+
+    Return:
+        return value of func
+    """
+
+    profiles = []
+
+    def startThread(frame, event, arg):
+        sys.setprofile(None)
+        p = cProfile.Profile()
+        profiles.append(p)
+        p.enable()
+
+    main = cProfile.Profile()
+    threading.setprofile(startThread)
+    main.enable()
+    try:
+        return func()
+    finally:
+        main.disable()
+        threading.setprofile(None)
+        stats = pstats.Stats(main)
+        for p in profiles:
+            p.disable()
+            stats.add(p)
+        stats.dump_stats(path)
+        print ">>> %s | Profile of %i thread(s) written to '%s'" % (strftime(TIME), len(profiles) + 1, path)
+        stats.sort_stats("cumulative").print_stats(top)
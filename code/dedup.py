@@ -0,0 +1,202 @@
+# -*- coding: utf-8 -*-
+
+import hashlib
+import math
+import os
+
+import numpy as np
+
+
+################################
+###     GLOBAL VARIABLES     ###
+################################
+
+# Bloom filter file format version, bumped on incompatible changes
+BLOOM_VERSION = 3
+
+
+#################################
+###     UTILITY FUNCTIONS     ###
+#################################
+
+def paperHash(handle):
+    """
+    Two 64-bit hashes of a paper handle
+
+    Args:
+        handle - paper handle or URL slug string
+
+    Return:
+        tuple of two non-negative integers
+    """
+
+    digest = hashlib.md5(handle).digest()
+    return int(digest[:8].encode("hex"), 16), int(digest[8:].encode("hex"), 16)
+
+
+class PaperSet(object):
+    """
+    Exact set of papers seen, stored as 64-bit hashes of their handles
+    """
+
+    def __init__(self):
+        self.keys = set()
+
+    def __len__(self):
+        return len(self.keys)
+
+    def __contains__(self, handle):
+        return paperHash(handle)[0] in self.keys
+
+    def add(self, handle):
+        """
+        Mark a paper as seen
+
+        Args:
+            handle - paper handle string
+
+        Return:
+            True if the paper was not seen before
+        """
+
+        key = paperHash(handle)[0]
+        if key in self.keys:
+            return False
+        self.keys.add(key)
+        return True
+
+    def close(self):
+        pass
+
+
+class BloomFilter(object):
+    """
+    Bloom filter of papers seen, optionally persisted across runs
+
+    A paper never seen before is reported as seen with probability about
+    the error rate the filter was sized for, so that share of new papers
+    is dropped once the filter holds its capacity. Papers are keyed by
+    handle alone, so runs sharing the filter, whatever their search query,
+    record each paper once.
+
+    Args:
+        bits - number of bits
+        hashes - number of hash functions
+        path - optional file the filter is loaded from and saved to
+    """
+
+    def __init__(self, bits, hashes, path=None):
+        self.bits = int(bits)
+        self.hashes = int(hashes)
+        self.path = path
+        self.array = bytearray((self.bits + 7) // 8)
+        self.count = 0
+
+    @classmethod
+    def forCapacity(cls, capacity, error=1.0e-4, path=None):
+        """
+        Filter sized for a number of papers and a false positive rate
+
+        If path exists, the filter saved there is loaded instead.
+
+        Args:
+            capacity - expected number of papers
+            error - acceptable false positive rate at capacity
+            path - optional file to load from and save to
+
+        Return:
+            BloomFilter object
+        """
+
+        if path is not None and os.path.exists(path):
+            return cls.load(path)
+        bits = int(math.ceil(-capacity * math.log(error) / math.log(2) ** 2))
+        hashes = max(1, int(round(bits / float(capacity) * math.log(2))))
+        return cls(bits, hashes, path)
+
+    @classmethod
+    def load(cls, path):
+        """Read a filter saved by save()"""
+        with open(path, "rb") as f:
+            data = np.load(f)
+            if int(data["version"]) != BLOOM_VERSION:
+                raise IOError("'%s' has Bloom filter version %i, expected %i" % (path, data["version"], BLOOM_VERSION))
+            bloom = cls(int(data["bits"]), int(data["hashes"]), path)
+            bloom.array = bytearray(data["array"].tobytes())
+            bloom.count = int(data["count"])
+        return bloom
+
+    def save(self, path=None):
+        """Write the filter atomically to path, or to the path it was loaded from"""
+        path = path or self.path
+        tmp = "%s.%i.tmp" % (path, os.getpid())
+        with open(tmp, "wb") as f:
+            np.savez(f, version=BLOOM_VERSION, bits=self.bits, hashes=self.hashes,
+                     count=self.count, array=np.frombuffer(bytes(self.array), dtype=np.uint8))
+        os.rename(tmp, path)
+
+    def positions(self, handle):
+        """Bit positions of a handle (double hashing)"""
+        h1, h2 = paperHash(handle)
+        return [(h1 + i * h2) % self.bits for i in xrange(self.hashes)]
+
+    def __len__(self):
+        return self.count
+
+    def __contains__(self, handle):
+        array = self.array
+        return all(array[p >> 3] & (1 << (p & 7)) for p in self.positions(handle))
+
+    def add(self, handle):
+        """
+        Mark a paper as seen
+
+        Args:
+            handle - paper handle string
+
+        Return:
+            True if the paper was (probably) not seen before
+        """
+
+        array = self.array
+        new = False
+        for p in self.positions(handle):
+            byte, bit = p >> 3, 1 << (p & 7)
+            if not array[byte] & bit:
+                array[byte] |= bit
+                new = True
+        if new:
+            self.count += 1
+        return new
+
+    def close(self):
+        """Save the filter if it has a path"""
+        if self.path is not None:
+            self.save()
+
+
+def dropDuplicates(index, records):
+    """
+    Drop papers already in the index and add the rest to it
+
+    Papers without a handle are always kept.
+
+    Args:
+        index - PaperSet or BloomFilter object
+        records - list of (year, codes, handle) tuples
+
+    Return:
+        tuple of (list of (year, codes, handle) records kept, list of their handles that are not None,
+        number dropped)
+    """
+
+    kept, handles = [], []
+    for record in records:
+        handle = record[2]
+        if handle is None:
+            kept.append(record)
+        elif index.add(handle):
+            kept.append(record)
+            handles.append(handle)
+
+    return kept, handles, len(records) - len(kept)
@@ -0,0 +1,203 @@
+# -*- coding: utf-8 -*-
+
+import glob
+import json
+import os
+import threading
+
+
+################################
+###     GLOBAL VARIABLES     ###
+################################
+
+# File extension of the delta state kept next to a crawled network
+DELTA_EXT = ".delta"
+
+# Journal of the delta crawl in progress, and of merged delta crawls (kept for their paper handles)
+DELTA_JOURNAL_EXT = ".delta.journal"
+MERGED_JOURNAL_EXT = ".delta-%s.journal"    # numbered from 0001 in merge order
+
+
+#################################
+###     UTILITY FUNCTIONS     ###
+#################################
+
+def loadDeltaState(path):
+    """
+    Read the delta state of a network
+
+    Args:
+        path - state file, the network's base path + DELTA_EXT
+
+    Return:
+        dict with "query", "added" (newest added date recorded), "indexed" (whether
+        the handles of the papers recorded on that date were kept), "updated",
+        "affected_years" (of the last merge) and "merged" (see mergeNumber),
+        or None if there is no state yet
+    """
+
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def saveDeltaState(path, state):
+    """Write the delta state of a network atomically"""
+    tmp = "%s.%i.tmp" % (path, os.getpid())
+    with open(tmp, "w") as f:
+        json.dump(state, f, indent=1, sort_keys=True)
+    os.rename(tmp, path)
+
+
+class DeltaTracker(object):
+    """
+    Added dates of crawled papers, and where paging reaches papers already recorded
+
+    Search results list the most recently added papers first, so once a
+    page holds a paper added before the newest one recorded by an earlier
+    crawl (the watermark), or holds only papers seen before, every later
+    page is already part of the network.
+
+    Args:
+        watermark - newest "YYYY-MM-DD" added date recorded so far, None if unknown
+        active - whether to look for recorded papers at all (False only tracks added dates)
+        indexed - whether the paper index holds the papers recorded on the watermark date
+    """
+
+    def __init__(self, watermark=None, active=False, indexed=True):
+        self.watermark = watermark
+        self.active = active
+        self.indexed = indexed
+        self.newest = None
+        self.stop_page = None
+        self.reached = threading.Event()
+        self.lock = threading.Lock()
+
+    def addPage(self, page, dates, papers, recorded):
+        """
+        Take note of a parsed page
+
+        Args:
+            page - integer page number
+            dates - list of added date strings (or None) of the page's papers
+            papers - number of papers on the page
+            recorded - number of them already recorded
+
+        Return:
+            True if this is the first page found to reach papers recorded by an earlier crawl
+        """
+
+        dates = [date for date in dates if date is not None]
+        with self.lock:
+            if dates and (self.newest is None or max(dates) > self.newest):
+                self.newest = max(dates)
+            if not self.active:
+                return False
+            old = ((self.watermark is not None and dates and min(dates) < self.watermark) or
+                   (papers > 0 and recorded == papers))
+            first = old and self.stop_page is None
+            if old and (self.stop_page is None or page < self.stop_page):
+                self.stop_page = page
+        if old:
+            self.reached.set()
+        return bool(first)
+
+    def recent(self, records, dates):
+        """
+        Records of papers not added before the watermark
+
+        Papers added before it were recorded by an earlier crawl, whether or
+        not their handles are in the paper index. Papers added on the
+        watermark date are kept for the index to judge if it holds that
+        date's recorded papers, and dropped otherwise; so are papers without
+        an added date.
+
+        Args:
+            records - list of paper records
+            dates - list of their added date strings (or None)
+
+        Return:
+            tuple of (list of records kept, number dropped)
+        """
+
+        if not self.active or self.watermark is None:
+            return records, 0
+        if self.indexed:
+            kept = [record for record, date in zip(records, dates) if date is None or date >= self.watermark]
+        else:
+            kept = [record for record, date in zip(records, dates) if date is None or date > self.watermark]
+        return kept, len(records) - len(kept)
+
+    def pages(self, first, last):
+        """Generator of page numbers from first to last, ending once reached is set"""
+        for page in xrange(first, last + 1):
+            if self.reached.is_set():
+                return
+            yield page
+
+    def latest(self):
+        """Newest added date of the previous and the current crawl"""
+        if self.newest is None or self.watermark is None:
+            return self.newest or self.watermark
+        return max(self.watermark, self.newest)
+
+
+def mergedJournals(base):
+    """Journals of the delta crawls merged into the network at base, in merge order"""
+    return sorted(glob.glob(base + MERGED_JOURNAL_EXT % ("[0-9]" * 4)))
+
+
+def mergeNumber(base, delta=False):
+    """
+    Number of the crawl being committed to the network at base
+
+    Stored with the network, the paper store and the delta state, it tells
+    which of them already hold the papers of an interrupted merge.
+
+    Args:
+        base - base path of the network
+        delta - whether the crawl is a delta crawl
+
+    Return:
+        number of merged delta crawls, plus one for a delta crawl
+    """
+
+    return len(mergedJournals(base)) + (1 if delta else 0)
+
+
+def archiveJournal(path, base):
+    """
+    Keep the journal of a merged delta crawl under the next free number
+
+    Args:
+        path - journal of the delta crawl
+        base - base path of the network
+
+    Return:
+        new path of the journal
+    """
+
+    target = base + MERGED_JOURNAL_EXT % ("%04i" % (len(mergedJournals(base)) + 1))
+    os.rename(path, target)
+    return target
+
+
+def affectedYears(counts, years=None):
+    """
+    Publication years a batch of counts adds papers to
+
+    Args:
+        counts - CountShard object
+        years - optional (lower, upper) bounds, other years are left out
+
+    Return:
+        sorted list of integer years
+    """
+
+    affected = set()
+    for _, year in counts.nodes:
+        if year.isdigit() and (years is None or years[0] <= int(year) <= years[1]):
+            affected.add(int(year))
+
+    return sorted(affected)
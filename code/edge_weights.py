@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+
+import numpy as np
+
+# NumPy docs:    https://docs.scipy.org/doc/numpy/reference/generated/numpy.partition.html
+
+
+#################################
+###     UTILITY FUNCTIONS     ###
+#################################
+
+def normaliseWeights(edges, edge_w, node_w):
+    """
+    Normalised edge weight, weight / min(citations_a, citations_b), of every edge
+
+    Edges with no weight get 0.0, as in printNormalisedWeight.
+
+    Args:
+        edges - (E, 2) int array of node ids
+        edge_w - (E,) or (E, Y) array of edge weights
+        node_w - (N,) or (N, Y) array of node weights (citations)
+
+    Return:
+        float array shaped like edge_w
+    """
+
+    edge_w = np.asarray(edge_w, dtype=np.float64)
+    node_w = np.asarray(node_w, dtype=np.float64)
+    denom = np.minimum(node_w[edges[:, 0]], node_w[edges[:, 1]])
+    norm = np.zeros_like(edge_w)
+    np.divide(edge_w, denom, out=norm, where=edge_w != 0)
+
+    return norm
+
+
+def normalisedWeightSeries(tensor, cumulative=True):
+    """
+    Normalised edge weights of every edge for every year
+
+    Args:
+        tensor - CoTagTensor object
+        cumulative - use counts up to each year instead of within it
+
+    Return:
+        (E, Y) float array
+    """
+
+    if cumulative:
+        return normaliseWeights(tensor.edges, tensor.cumulativeEdgeCounts(), tensor.cumulativeNodeCounts())
+    return normaliseWeights(tensor.edges, tensor.edge_counts, tensor.node_counts)
+
+
+def normalisedWeightTotal(tensor):
+    """(E,) normalised edge weights over all papers ("weight" / "citations")"""
+    return normaliseWeights(tensor.edges, tensor.edge_total, tensor.node_total)
+
+
+def neighbourLists(edges, n):
+    """
+    Neighbour lists of every node as CSR rows, both directions of every edge and self-loops once
+
+    Args:
+        edges - (E, 2) int array of node ids
+        n - number of nodes
+
+    Return:
+        tuple of ((N + 1,) int array of row offsets, int array of neighbour ids,
+        int array of the edge position of every entry)
+    """
+
+    u, v = edges[:, 0], edges[:, 1]
+    off = np.flatnonzero(u != v)
+    rows = np.concatenate([u, v[off]])
+    order = np.argsort(rows, kind="mergesort")
+    cols = np.concatenate([v, u[off]]).astype(np.int64)[order]
+    pos = np.concatenate([np.arange(len(edges)), off])[order]
+    indptr = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(np.bincount(rows, minlength=n), out=indptr[1:])
+
+    return indptr, cols, pos
+
+
+def topNeighbours(edges, weights, n, k=5, lists=None):
+    """
+    Top-k neighbours of every node by an edge value, using partial sorting
+
+    Nodes with fewer than k neighbours get their remaining slots padded
+    with -1 ids and NaN values. Ties are broken by the smaller node id.
+
+    Args:
+        edges - (E, 2) int array of node ids
+        weights - (E,) array of edge values
+        n - number of nodes
+        k - number of neighbours to keep
+        lists - optional result of neighbourLists(edges, n), to reuse across calls
+
+    Return:
+        tuple of ((N, k) int array of neighbour ids, (N, k) float array of values)
+    """
+
+    indptr, cols, pos = neighbourLists(edges, n) if lists is None else lists
+    vals = np.asarray(weights, dtype=np.float64)[pos]
+    k = min(k, n)
+    ids = np.full((n, k), -1, dtype=np.int64)
+    values = np.full((n, k), np.nan)
+
+    for i in xrange(n):
+        c, w = cols[indptr[i]:indptr[i + 1]], vals[indptr[i]:indptr[i + 1]]
+        if len(w) > k:
+            # candidates: every neighbour at least as large as the k-th largest value, ties included
+            keep = w >= -np.partition(-w, k - 1)[k - 1]
+            c, w = c[keep], w[keep]
+        # stable order of the candidates: by value, then node id
+        top = np.lexsort((c, -w))[:k]
+        ids[i, :len(top)] = c[top]
+        values[i, :len(top)] = w[top]
+
+    return ids, values
+
+
+def topNeighbourSeries(tensor, k=5, cumulative=True):
+    """
+    Top-k neighbours of every node by normalised edge weight, for every year
+
+    Args:
+        tensor - CoTagTensor object
+        k - number of neighbours to keep
+        cumulative - use counts up to each year instead of within it
+
+    Return:
+        tuple of ((Y, N, k) int array of neighbour ids, (Y, N, k) float array of values)
+    """
+
+    norm = normalisedWeightSeries(tensor, cumulative)
+    n = len(tensor.nodes)
+    k = min(k, n)
+    lists = neighbourLists(tensor.edges, n)
+    ids = np.empty((len(tensor.years), n, k), dtype=np.int64)
+    values = np.empty((len(tensor.years), n, k))
+    for col in xrange(len(tensor.years)):
+        ids[col], values[col] = topNeighbours(tensor.edges, norm[:, col], n, k, lists)
+
+    return ids, values
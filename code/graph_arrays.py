@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+
+import networkx as nx
+import numpy as np
+
+# NetworkX docs: https://networkx.github.io/documentation/latest/
+# SciPy docs:    https://docs.scipy.org/doc/scipy/reference/sparse.html
+
+
+#################################
+###     UTILITY FUNCTIONS     ###
+#################################
+
+def adjacencyMatrix(G, weight=None, nodelist=None):
+    """
+    Sparse adjacency matrix of a graph with a fixed node order
+
+    Args:
+        G - nx.Graph() object
+        weight - edge attribute to use as matrix entries, None for 1 per edge
+        nodelist - optional node order, defaults to sorted nodes
+
+    Return:
+        tuple of (list of nodes, (N, N) scipy.sparse.csr_matrix)
+    """
+
+    nodes = sorted(G.nodes()) if nodelist is None else list(nodelist)
+    A = nx.to_scipy_sparse_matrix(G, nodelist=nodes, weight=weight, dtype=np.float64, format="csr")
+
+    return nodes, A
+
+
+def degreeVector(A):
+    """
+    Degree of every node of an undirected adjacency matrix
+
+    Self-loops count twice, as in G.degree().
+
+    Args:
+        A - (N, N) symmetric scipy.sparse matrix
+
+    Return:
+        (N,) float array of (weighted) degrees
+    """
+
+    return np.asarray(A.sum(axis=1)).ravel() + A.diagonal()
+
+
+def groupLabels(nodes, groups):
+    """
+    Integer group label of every node
+
+    Args:
+        nodes - list of nodes, position is the node id
+        groups - dict of group name -> iterable of member nodes
+
+    Return:
+        tuple of ((N,) int array of labels with -1 for ungrouped nodes, list of group names)
+    """
+
+    names = sorted(groups)
+    label = {}
+    for k, name in enumerate(names):
+        for node in groups[name]:
+            label[node] = k
+    labels = np.array([label.get(node, -1) for node in nodes], dtype=np.int32)
+
+    return labels, names
+
+
+def letterGroups(nodes):
+    """
+    Group JEL codes by their top-level letter
+
+    Args:
+        nodes - iterable of JEL codes
+
+    Return:
+        dict of letter -> list of codes
+    """
+
+    groups = {}
+    for node in nodes:
+        groups.setdefault(node[0], []).append(node)
+
+    return groups
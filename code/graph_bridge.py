@@ -0,0 +1,161 @@
+# -*- coding: utf-8 -*-
+
+from itertools import islice, izip
+
+import networkx as nx
+import numpy as np
+import zen
+
+from cotag_tensor import INDEX_DTYPE
+
+# Zen docs:      http://www.networkdynamics.org/static/zen/html/api/api.html
+# NetworkX docs: https://networkx.github.io/documentation/latest/
+
+
+#################################
+###     UTILITY FUNCTIONS     ###
+#################################
+
+def graphArrays(G, weight="weight"):
+    """
+    Integer edge and weight arrays of a NetworkX graph
+
+    The attribute dicts are the graph's own (G.node[n], G.edge[u][v]), not
+    copies, so a graph built from them shares its payloads with G.
+
+    Args:
+        G - nx.Graph() object
+        weight - edge attribute holding the weight, edges without it weigh 1
+
+    Return:
+        tuple of (list of nodes, (E, 2) int array of node ids, (E,) float array of weights,
+        list of node attribute dicts, list of edge attribute dicts)
+    """
+
+    nodes = G.nodes()
+    index = dict((node, i) for i, node in enumerate(nodes))
+    node_data = [G.node[node] for node in nodes]
+
+    # walk the adjacency once, keeping each edge from its lower node id
+    ids, edge_data = [], []
+    for u, nbrs in G.adj.iteritems():
+        i = index[u]
+        for v, data in nbrs.iteritems():
+            j = index[v]
+            if j >= i:
+                ids.append(i)
+                ids.append(j)
+                edge_data.append(data)
+    edges = np.array(ids, dtype=INDEX_DTYPE).reshape(-1, 2)
+    weights = np.array([data.get(weight, 1.0) for data in edge_data], dtype=np.float64)
+
+    return nodes, edges, weights, node_data, edge_data
+
+
+def buildZen(nodes, edges, weights, node_data=None, edge_data=None):
+    """
+    Zen graph of node and edge arrays, added by index without node lookups
+
+    Args:
+        nodes - list of node objects, position is the node id
+        edges - (E, 2) int array of node ids
+        weights - (E,) array of edge weights
+        node_data - optional list of node attribute dicts, referenced as the nodes' data
+        edge_data - optional list of edge attribute dicts, referenced as the edges' data
+
+    Return:
+        zen.Graph() object
+    """
+
+    G_zen = zen.Graph(node_capacity=max(len(nodes), 1), edge_capacity=max(len(edges), 1))
+    if node_data is None:
+        node_data = [None] * len(nodes)
+    if edge_data is None:
+        edge_data = [None] * len(edges)
+
+    # a fresh graph hands out ids in order, but map them in case it does not
+    ids = np.array([G_zen.add_node(node, data=data) for node, data in zip(nodes, node_data)], dtype=INDEX_DTYPE)
+    edges = ids[np.asarray(edges, dtype=INDEX_DTYPE).reshape(-1, 2)]
+    # flat lists of plain ints and floats, so the loop allocates no containers for the collector to scan
+    ends = edges.ravel().tolist()
+    add_edge = G_zen.add_edge_
+    for u, v, w, data in izip(islice(ends, 0, None, 2), islice(ends, 1, None, 2),
+                              np.asarray(weights, dtype=np.float64).tolist(), edge_data):
+        add_edge(u, v, data, w)
+
+    return G_zen
+
+
+def buildNetworkx(nodes, edges, weights, node_data=None, edge_data=None, weight="weight"):
+    """
+    NetworkX graph of node and edge arrays, sharing the attribute dicts given
+
+    Edges without a dict get one holding only the weight.
+
+    Args:
+        nodes - list of node objects, position is the node id
+        edges - (E, 2) int array of node ids
+        weights - (E,) array of edge weights
+        node_data - optional list of node attribute dicts, used as the nodes' dicts
+        edge_data - optional list of edge attribute dicts, used as the edges' dicts
+        weight - edge attribute for the weight of edges without a dict
+
+    Return:
+        nx.Graph() object
+    """
+
+    G = nx.Graph()
+    for i, node in enumerate(nodes):
+        G.node[node] = node_data[i] if node_data is not None else {}
+        G.adj[node] = {}
+    adj = G.adj
+    ends = np.asarray(edges).ravel().tolist()
+    if edge_data is None:
+        edge_data = [{weight: w} for w in np.asarray(weights).tolist()]
+    for u, v, data in izip(islice(ends, 0, None, 2), islice(ends, 1, None, 2), edge_data):
+        u, v = nodes[u], nodes[v]
+        adj[u][v] = data
+        adj[v][u] = data
+
+    return G
+
+
+# Graph builders by backend name, each taking (nodes, edges, weights, node_data, edge_data)
+BACKENDS = {"zen": buildZen, "networkx": buildNetworkx}
+
+
+def convertGraph(G, backend="zen", weight="weight"):
+    """
+    Convert a NetworkX graph to another backend in one pass over its edges
+
+    Args:
+        G - nx.Graph() object
+        backend - key of BACKENDS
+        weight - edge attribute holding the weight
+
+    Return:
+        graph object of the backend, sharing its attribute dicts with G
+    """
+
+    if backend not in BACKENDS:
+        raise ValueError("Unknown graph backend '%s', expected one of %s" % (backend, ", ".join(sorted(BACKENDS))))
+    return BACKENDS[backend](*graphArrays(G, weight))
+
+
+def writeZenGml(G, filename, use_zen_data=False):
+    """
+    Write a NetworkX graph as Zen GML with its node and edge attributes
+
+    Args:
+        G - nx.Graph() object
+        filename - GML file to write
+        use_zen_data - write the attribute dicts as Zen data rather than GML attributes
+
+    Return:
+        zen.Graph() object that was written
+    """
+
+    G_zen = convertGraph(G, "zen")
+    zen.io.gml.write(G_zen, filename, write_data=True, use_zen_data=use_zen_data)
+
+    return G_zen
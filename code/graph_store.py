@@ -0,0 +1,297 @@
+# -*- coding: utf-8 -*-
+
+import json
+import os
+import shutil
+from time import strftime
+
+import networkx as nx
+import numpy as np
+
+from cotag_tensor import CoTagTensor
+
+# NumPy docs:    https://docs.scipy.org/doc/numpy/reference/generated/numpy.load.html
+# NetworkX docs: https://networkx.github.io/documentation/latest/
+
+
+################################
+###     GLOBAL VARIABLES     ###
+################################
+
+# File extension of a co-tagging network store (a directory)
+STORE_EXT = ".cotag"
+
+# Store format version, bumped on incompatible layout changes
+STORE_VERSION = 1
+
+# Publication years stored when no bounds are given (others are incorrect metadata), None is the current year
+STORE_YEARS = (1900, None)
+
+# Files inside a store
+META_FILE = "meta.json"         # format version, year axis, year key prefix
+NODES_FILE = "nodes.json"       # node table: code and non-count attributes per node id
+ARRAY_FILES = ("edges", "edge_counts", "edge_total", "node_counts", "node_total")
+FOLD_FILES = ("edge_fold", "node_fold")  # only there when papers of earlier years sit in the first column
+
+# Suffixes of a store being written, and of the store it replaces while the two are swapped
+TMP_SUFFIX = ".tmp"
+OLD_SUFFIX = ".old"
+
+
+#################################
+###     UTILITY FUNCTIONS     ###
+#################################
+
+def storeYears(years=None):
+    """
+    Resolve (lower, upper) bounds of stored years
+
+    Args:
+        years - optional (lower, upper) bounds, defaults to STORE_YEARS; a None upper bound
+            is the current year, a None lower bound that of STORE_YEARS
+
+    Return:
+        tuple of integer (lower, upper) bounds
+    """
+
+    lower, upper = STORE_YEARS if years is None else years
+    if lower is None:
+        lower = STORE_YEARS[0]
+    if upper is None:
+        upper = int(strftime("%Y"))
+    return int(lower), int(upper)
+
+
+def saveTensor(tensor, path, year_prefix="", extra=None):
+    """
+    Write a co-tagging network to a columnar store
+
+    The store is written to a temporary directory and swapped in with
+    renames, so a crash leaves either the previous store or the new one.
+
+    Args:
+        tensor - CoTagTensor object
+        path - store directory, replaced if it exists
+        year_prefix - year attribute prefix of the graph it came from ("" raw, "weight" cleaned)
+        extra - optional dict of further meta.json entries, committed together with the arrays
+
+    Return:
+        None
+    """
+
+    tmp = path + TMP_SUFFIX
+    if os.path.isdir(tmp):
+        shutil.rmtree(tmp)
+    os.makedirs(tmp)
+
+    for name in ARRAY_FILES:
+        np.save(os.path.join(tmp, name + ".npy"), np.ascontiguousarray(getattr(tensor, name)))
+    for name in FOLD_FILES:
+        if getattr(tensor, name) is not None:
+            np.save(os.path.join(tmp, name + ".npy"), getattr(tensor, name))
+
+    nodes = []
+    for code, data in zip(tensor.nodes, tensor.node_data):
+        row = dict(data)
+        row["code"] = code
+        nodes.append(row)
+    with open(os.path.join(tmp, NODES_FILE), "w") as f:
+        json.dump(nodes, f)
+
+    # meta last, a store without it is incomplete
+    meta = dict(extra or {})
+    meta.update({"version": STORE_VERSION, "years": list(tensor.years), "year_prefix": year_prefix})
+    with open(os.path.join(tmp, META_FILE), "w") as f:
+        json.dump(meta, f)
+
+    recoverStore(path)
+    if os.path.isdir(path):
+        os.rename(path, path + OLD_SUFFIX)
+    os.rename(tmp, path)
+    shutil.rmtree(path + OLD_SUFFIX, ignore_errors=True)
+
+
+def recoverStore(path):
+    """Put the previous store back if a crash came between the renames of saveTensor"""
+    old = path + OLD_SUFFIX
+    if os.path.isdir(old):
+        if os.path.isdir(path):
+            shutil.rmtree(old)
+        else:
+            os.rename(old, path)
+
+
+def storeMeta(path):
+    """
+    Contents of a store's meta.json
+
+    Args:
+        path - store directory
+
+    Return:
+        dict with "version", "years", "year_prefix" and any extra entries, or None if there is no store
+    """
+
+    recoverStore(path)
+    if not os.path.exists(os.path.join(path, META_FILE)):
+        return None
+    with open(os.path.join(path, META_FILE)) as f:
+        return json.load(f)
+
+
+def loadTensor(path, mmap=True):
+    """
+    Read a co-tagging network from a columnar store
+
+    Args:
+        path - store directory
+        mmap - memory-map the arrays instead of reading them into RAM
+
+    Return:
+        tuple of (CoTagTensor object, year attribute prefix string)
+    """
+
+    meta = storeMeta(path)
+    if meta is None:
+        raise IOError("No network store at '%s'" % path)
+    if meta["version"] != STORE_VERSION:
+        raise IOError("'%s' has store version %s, expected %i" % (path, meta["version"], STORE_VERSION))
+
+    with open(os.path.join(path, NODES_FILE)) as f:
+        rows = json.load(f)
+    nodes, node_data = [], []
+    for row in rows:
+        nodes.append(str(row.pop("code")))
+        node_data.append(dict((str(k), v) for k, v in row.iteritems()))
+
+    arrays = {}
+    for name in ARRAY_FILES:
+        arrays[name] = np.load(os.path.join(path, name + ".npy"), mmap_mode="r" if mmap else None)
+    for name in FOLD_FILES:
+        if os.path.exists(os.path.join(path, name + ".npy")):
+            arrays[name] = np.load(os.path.join(path, name + ".npy"))
+
+    tensor = CoTagTensor(nodes, meta["years"], arrays["edges"], arrays["edge_counts"],
+                         arrays["node_counts"], edge_total=arrays["edge_total"],
+                         node_total=arrays["node_total"], node_data=node_data,
+                         edge_fold=arrays.get("edge_fold"), node_fold=arrays.get("node_fold"))
+
+    return tensor, str(meta["year_prefix"])
+
+
+def tensorToGraph(tensor, year_prefix=""):
+    """
+    Materialise a NetworkX graph with the usual count attributes
+
+    Nodes get their stored attributes plus "citations" and one key per year
+    with papers; edges get "weight" and one key per year with papers. Cleaned
+    graphs ("weight" prefix) get a key for every year of the axis, zero
+    where there are no papers, as cleaning.AddMissingYears left them.
+
+    Args:
+        tensor - CoTagTensor object
+        year_prefix - prefix of the year keys ("" gives "2006", "weight" gives "weight2006")
+
+    Return:
+        nx.Graph() object
+    """
+
+    keys = [year_prefix + str(y) for y in tensor.years]
+    zeros = dict.fromkeys(keys, 0) if year_prefix == "weight" else {}
+
+    node_data = []
+    for data, total in zip(tensor.node_data, tensor.node_total.tolist()):
+        data = dict(data, **zeros)
+        data["citations"] = total
+        node_data.append(data)
+    rows, cols = np.nonzero(tensor.node_counts)
+    for i, col, c in zip(rows.tolist(), cols.tolist(), tensor.node_counts[rows, cols].tolist()):
+        node_data[i][keys[col]] = c
+
+    edge_data = [dict(zeros, weight=total) for total in tensor.edge_total.tolist()]
+    rows, cols = np.nonzero(tensor.edge_counts)
+    for e, col, c in zip(rows.tolist(), cols.tolist(), tensor.edge_counts[rows, cols].tolist()):
+        edge_data[e][keys[col]] = c
+
+    G = nx.Graph()
+    G.add_nodes_from(zip(tensor.nodes, node_data))
+    nodes = tensor.nodes
+    G.add_edges_from((nodes[u], nodes[v], data) for (u, v), data in zip(tensor.edges.tolist(), edge_data))
+
+    return G
+
+
+def readNetwork(base, years=None):
+    """
+    Read a network saved under a base path, preferring the columnar store over GEXF
+
+    The store's arrays are memory-mapped and no graph is built; callers
+    that edit or export a NetworkX graph use readGraph instead.
+
+    Args:
+        base - path without extension; base + STORE_EXT or base + ".gexf" is read
+        years - optional (lower, upper) bounds of the returned tensor's year axis
+
+    Return:
+        CoTagTensor object
+    """
+
+    recoverStore(base + STORE_EXT)
+    if os.path.isdir(base + STORE_EXT):
+        tensor, _ = loadTensor(base + STORE_EXT)
+        return tensor.restrictYears(*years) if years is not None else tensor
+
+    return CoTagTensor.fromGraph(nx.read_gexf(base + ".gexf"), years)
+
+
+def readGraph(base):
+    """
+    Read a network saved under a base path as a NetworkX graph, preferring the columnar store over GEXF
+
+    Args:
+        base - path without extension; base + STORE_EXT or base + ".gexf" is read
+
+    Return:
+        nx.Graph() object with the count attributes of the saved graph
+    """
+
+    recoverStore(base + STORE_EXT)
+    if os.path.isdir(base + STORE_EXT):
+        return tensorToGraph(*loadTensor(base + STORE_EXT))
+
+    return nx.read_gexf(base + ".gexf")
+
+
+def writeNetwork(G, base, year_prefix="", years=None, gexf=False, extra=None):
+    """
+    Write a network under a base path as a columnar store, optionally also as GEXF
+
+    Args:
+        G - nx.Graph() object
+        base - path without extension
+        year_prefix - year attribute prefix used in G ("" raw, "weight" cleaned)
+        years - optional (lower, upper) bounds of stored years, others are dropped (see storeYears);
+            the year axis spans the observed years inside them
+        gexf - also write base + ".gexf" for Gephi
+        extra - optional dict of further entries for the store's meta.json
+
+    Return:
+        CoTagTensor object that was stored
+    """
+
+    tensor = CoTagTensor.fromGraph(G, storeYears(years), fold=False)
+    saveTensor(tensor, base + STORE_EXT, year_prefix, extra)
+    if gexf:
+        nx.write_gexf(G, base + ".gexf")
+
+    return tensor
+
+
+def writeGexf(tensor, filename, year_prefix=""):
+    """Export a stored network to GEXF for Gephi"""
+    nx.write_gexf(tensorToGraph(tensor, year_prefix), filename)
+
+
+def writeGml(tensor, filename, year_prefix=""):
+    """Export a stored network to GML"""
+    nx.write_gml(tensorToGraph(tensor, year_prefix), filename)
@@ -0,0 +1,196 @@
+# -*- coding: utf-8 -*-
+
+import cPickle as pickle
+import os
+import re
+import xml.etree.ElementTree as ET
+
+
+################################
+###     GLOBAL VARIABLES     ###
+################################
+
+# Default JEL classification file
+JEL_XML_PATH = "jel_classification.xml"
+
+# Sidecar cache written next to the XML file
+CACHE_EXT = ".pickle"
+
+# Cache format version, bumped when the indexes change
+CACHE_VERSION = 1
+
+# A JEL code: top-level letter, then subcategory digit, then code digit
+JEL_CODE = re.compile('([A-Z])([0-9])[0-9]')
+
+
+#################################
+###     UTILITY FUNCTIONS     ###
+#################################
+
+class JelTaxonomy(object):
+    """
+    Integer-indexed JEL classification
+
+    Codes are interned and numbered in sorted order, so every top-level
+    letter owns a contiguous range of ids.
+
+    Attributes:
+        codes - list of JEL codes, position is the code id
+        ids - dict of JEL code -> code id
+        descriptions - list of descriptions, indexed by code id
+        letters - dict of letter -> (first id, last id + 1)
+        children - dict of parent ("F" or "F1") -> sorted list of children ("F1" or code ids)
+    """
+
+    def __init__(self, pairs):
+        pairs = sorted(pairs)
+        self.codes = [intern(str(code)) for code, _ in pairs]
+        self.descriptions = [desc for _, desc in pairs]
+        self.ids = dict((code, i) for i, code in enumerate(self.codes))
+
+        self.letters = {}
+        self.children = {}
+        for i, code in enumerate(self.codes):
+            m = JEL_CODE.match(code)
+            if not m:
+                continue
+            letter, sub = m.group(1), m.group(1) + m.group(2)
+            start, stop = self.letters.get(letter, (i, i))
+            self.letters[letter] = (start, i + 1)
+            subs = self.children.setdefault(letter, [])
+            if not subs or subs[-1] != sub:
+                subs.append(sub)
+            self.children.setdefault(sub, []).append(i)
+
+    def __len__(self):
+        return len(self.codes)
+
+    def __contains__(self, code):
+        return code in self.ids
+
+    def description(self, code):
+        """Description of a JEL code"""
+        return self.descriptions[self.ids[code]]
+
+    def parent(self, code):
+        """Subcategory ("F1") of a JEL code ("F14")"""
+        return code[:2]
+
+    def letterIds(self, letter):
+        """
+        Code ids of a top-level category
+
+        Args:
+            letter - top-level JEL letter
+
+        Return:
+            xrange of code ids
+        """
+
+        return xrange(*self.letters.get(letter, (0, 0)))
+
+    def letterCodes(self, letter):
+        """List of JEL codes of a top-level category"""
+        start, stop = self.letters.get(letter, (0, 0))
+        return self.codes[start:stop]
+
+    def subcategoryCodes(self, sub):
+        """List of JEL codes of a subcategory such as "F1" """
+        return [self.codes[i] for i in self.children.get(sub, [])]
+
+    def select(self, categories):
+        """
+        Codes of chosen top-level categories with their descriptions
+
+        Args:
+            categories - list of top-level JEL codes
+
+        Return:
+            dict of JEL code -> description
+        """
+
+        selected = {}
+        for letter in categories:
+            for i in self.letterIds(letter):
+                selected[self.codes[i]] = self.descriptions[i]
+        return selected
+
+    def groupByLetter(self, categories):
+        """
+        Codes of chosen top-level categories, grouped by category
+
+        Args:
+            categories - list of top-level JEL codes
+
+        Return:
+            dict of top-level JEL code -> list of codes
+        """
+
+        return dict((letter, self.letterCodes(letter)) for letter in categories)
+
+
+def parseJelXML(path):
+    """
+    Stream (code, description) pairs out of the JEL classification XML
+
+    Args:
+        path - JEL classification XML file
+
+    Return:
+        list of (code, description) tuples
+    """
+
+    pairs = []
+    code = desc = None
+    for event, elem in ET.iterparse(path, events=("end",)):
+        if elem.tag == "code":
+            code = elem.text.strip()
+        elif elem.tag == "description":
+            desc = elem.text
+        elif elem.tag == "classification":
+            pairs.append((code, desc))
+            code = desc = None
+            elem.clear()
+
+    return pairs
+
+
+def loadTaxonomy(path=JEL_XML_PATH, cache=True):
+    """
+    Load the JEL taxonomy, from the sidecar cache when it matches the XML file
+
+    The cache is keyed on the XML file's modification time and size and is
+    rewritten whenever they change.
+
+    Args:
+        path - JEL classification XML file
+        cache - read and write the sidecar cache at path + CACHE_EXT
+
+    Return:
+        JelTaxonomy object
+    """
+
+    stat = os.stat(path)
+    key = (CACHE_VERSION, stat.st_mtime, stat.st_size)
+    sidecar = path + CACHE_EXT
+
+    if cache and os.path.exists(sidecar):
+        try:
+            with open(sidecar, "rb") as f:
+                cached_key, pairs = pickle.load(f)
+            if cached_key == key:
+                return JelTaxonomy(pairs)
+        except (IOError, EOFError, ValueError, pickle.UnpicklingError):
+            pass    # unreadable cache, rebuild it
+
+    pairs = parseJelXML(path)
+    if cache:
+        try:
+            tmp = "%s.%i.tmp" % (sidecar, os.getpid())
+            with open(tmp, "wb") as f:
+                pickle.dump((key, pairs), f, pickle.HIGHEST_PROTOCOL)
+            os.rename(tmp, sidecar)
+        except (IOError, OSError):
+            pass    # read-only location, parse again next time
+
+    return JelTaxonomy(pairs)
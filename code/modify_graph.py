@@ -5,13 +5,23 @@ from collections import Counter
 import re
 
 import matplotlib.pyplot as plt
-import networkx as nx
-import zen
+
+from cleaning import defaultPipeline, printReport
+from graph_bridge import writeZenGml
+from graph_store import readGraph, writeNetwork
 
 # Zen docs:      http://www.networkdynamics.org/static/zen/html/api/api.html
 # NetworkX docs: https://networkx.github.io/documentation/latest/
 
 
+#################################
+###      RUNTIME OPTIONS      ###
+#################################
+
+# Choose which publication years to keep (others are incorrect metadata or out of scope)
+YEARS = (2000, 2016)
+
+
 #################################
 ###     UTILITY FUNCTIONS     ###
 #################################
@@ -97,12 +107,12 @@ def removeIncorrectYears(G):
 
 def modifyAttributeKeys(G):
     for node in G.nodes():
-        for y in G.node[node]:
+        for y in list(G.node[node]):
             if representsFloat(y):
                 G.node[node]["weight" + y] = G.node[node][y]
                 del G.node[node][y]
     for e1, e2 in G.edges():
-        for y in G.edge[e1][e2]:
+        for y in list(G.edge[e1][e2]):
             if representsFloat(y):
                 G.edge[e1][e2]["weight" + y] = G.edge[e1][e2][y]
                 del G.edge[e1][e2][y]
@@ -119,19 +129,6 @@ def removeSelfEdge(G):
     return
 
 
-# converts NetworkX GEXF graph to Zen GML graph
-def writeToZenGML(G):
-
-    G_zen = zen.Graph()
-    for node in G.nodes_iter():
-        G_zen.add_node(node, data=G.node[node])
-    for e1, e2 in G.edges_iter():
-        G_zen.add_edge(e1, e2, data=G.edge[e1][e2], weight=G.edge[e1][e2]["weight"])
-    zen.io.gml.write(G_zen, "../graphs/econs5_ALL.gml", write_data=True)
-
-    return
-
-
 
 
 #################################
@@ -141,20 +138,17 @@ def writeToZenGML(G):
 # main sentinelk
 def main():
     # read existing graph
-    G = nx.read_gexf('../graphs/econs5_ALL.gexf')
-
-    # cleaning up of graph/node/edge attributes
-    removeSelfEdge(G)
-    removeNodeOthersCategory(G)
-    removeIncorrectYears(G)
-    addNodeCategoryDesc(G)
-    modifyAttributeKeys(G)
-    addMissingYears(G, 2000, 2016)  # we are only concerned with years 2000 to 2016
+    G = readGraph('../graphs/econs5_ALL')
 
+    # cleaning up of graph/node/edge attributes in a single pass
+    # (removeSelfEdge, removeNodeOthersCategory, removeIncorrectYears, addNodeCategoryDesc,
+    #  addMissingYears, modifyAttributeKeys)
+    G, report = defaultPipeline(*YEARS).run(G)
+    printReport(report)
 
-    # write to new file
-    nx.write_gexf("../graphs/econs5_ALL_modified.gexf")
-    writeToZenGML(G)
+    # write to new file (GEXF and Zen GML for Gephi/Zen)
+    writeNetwork(G, "../graphs/econs5_ALL_modified", "weight", YEARS, gexf=True)
+    writeZenGml(G, "../graphs/econs5_ALL.gml")
 
 
 if __name__ == '__main__':
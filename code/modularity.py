@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+
+import numpy as np
+
+from graph_arrays import adjacencyMatrix, degreeVector, groupLabels
+
+# SciPy docs:    https://docs.scipy.org/doc/scipy/reference/sparse.html
+
+
+#################################
+###     UTILITY FUNCTIONS     ###
+#################################
+
+def sparseModularity(A, labels, n_groups=None, degrees=None):
+    """
+    Modularity of a partition, aggregated per community in one pass over the edges
+
+    Uses the same definition as calc_metrics.modularity, with m the total
+    edge weight (the number of edges when A is unweighted):
+
+        Q    = sum_c (e_c - D_c^2 / m) / m
+        Qmax = 1 - sum_c D_c^2 / m^2
+
+    where e_c sums A over ordered node pairs inside community c and D_c is
+    the total degree of its members. Nodes labelled -1 belong to no
+    community; they still count towards m. Community c's share of Qmax is
+    D_c / sum_c D_c - D_c^2 / m^2, so the shares add up to Qmax even when
+    some nodes are unlabelled.
+
+    Args:
+        A - (N, N) symmetric scipy.sparse adjacency matrix, binary or weighted
+        labels - (N,) int array of community labels, -1 for none
+        n_groups - number of communities, defaults to max(labels) + 1
+        degrees - optional precomputed (N,) degree vector of A
+
+    Return:
+        tuple of (Q, Qmax, (K,) array of Q per community, (K,) array of Qmax per community)
+    """
+
+    labels = np.asarray(labels)
+    if n_groups is None:
+        n_groups = int(labels.max()) + 1
+    if degrees is None:
+        degrees = degreeVector(A)
+    m = degrees.sum() / 2.0
+
+    # weight inside each community
+    A = A.tocoo()
+    lu, lv = labels[A.row], labels[A.col]
+    inside = (lu == lv) & (lu >= 0)
+    e = np.bincount(lu[inside], weights=A.data[inside], minlength=n_groups)
+
+    # total degree of each community
+    member = labels >= 0
+    D = np.bincount(labels[member], weights=degrees[member], minlength=n_groups)
+
+    q = (e - D * D / m) / m
+    share = np.zeros_like(D)
+    np.divide(D, D.sum(), out=share, where=D > 0)
+    qmax = share - D * D / (m * m)
+
+    return q.sum(), 1.0 - (D * D).sum() / (m * m), q, qmax
+
+
+def graphModularity(G, groups, weight=None):
+    """
+    Modularity of a NetworkX graph under a grouping of its nodes
+
+    Args:
+        G - nx.Graph() object
+        groups - dict of group name -> iterable of member nodes
+        weight - edge attribute for the weighted form, None for the unweighted form
+
+    Return:
+        tuple of (Q, Qmax, dict of group name -> (Q, Qmax) contribution)
+    """
+
+    nodes, A = adjacencyMatrix(G, weight)
+    labels, names = groupLabels(nodes, groups)
+    Q, Qmax, q, qmax = sparseModularity(A, labels, len(names))
+
+    return Q, Qmax, dict((name, (q[k], qmax[k])) for k, name in enumerate(names))
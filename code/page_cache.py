@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+
+import hashlib
+import os
+import threading
+import zlib
+
+
+################################
+###     GLOBAL VARIABLES     ###
+################################
+
+# Layout of a cache directory
+INDEX_NAME = "index"        # append-only lines of "<url>\t<content sha1>"
+OBJECTS_DIR = "objects"     # zlib-compressed page bodies at objects/<sha1[:2]>/<sha1[2:]>
+
+# zlib compression level of stored pages
+COMPRESS_LEVEL = 6
+
+
+#################################
+###     UTILITY FUNCTIONS     ###
+#################################
+
+class PageCache(object):
+    """
+    Compressed on-disk cache of raw fetched pages, keyed by URL
+
+    Page bodies are stored once per distinct content (content-addressed by
+    SHA-1), so identical pages fetched under different URLs or in repeated
+    crawls share storage. An append-only index maps every URL to the
+    content hash of its latest fetch.
+
+    Args:
+        root - cache directory, created if missing
+    """
+
+    def __init__(self, root):
+        self.root = root
+        self.index = {}
+        self.lock = threading.Lock()
+        objects = os.path.join(root, OBJECTS_DIR)
+        if not os.path.isdir(objects):
+            os.makedirs(objects)
+
+        # later lines override earlier fetches of the same URL
+        index_path = os.path.join(root, INDEX_NAME)
+        if os.path.exists(index_path):
+            with open(index_path, "rb") as f:
+                for line in f:
+                    if line.endswith("\n"):
+                        url, digest = line.rstrip("\n").split("\t")
+                        self.index[url] = digest
+        self.f = open(index_path, "ab")
+
+    def __contains__(self, url):
+        return url in self.index
+
+    def __len__(self):
+        return len(self.index)
+
+    def objectPath(self, digest):
+        """Path of a stored page body"""
+        return os.path.join(self.root, OBJECTS_DIR, digest[:2], digest[2:])
+
+    def put(self, url, s):
+        """
+        Store a fetched page
+
+        Args:
+            url - URL string the page was fetched from
+            s - page body string
+
+        Return:
+            digest - SHA-1 hex digest of the page body
+        """
+
+        digest = hashlib.sha1(s).hexdigest()
+        path = self.objectPath(digest)
+        if not os.path.exists(path):
+            folder = os.path.dirname(path)
+            if not os.path.isdir(folder):
+                try:
+                    os.makedirs(folder)
+                except OSError:
+                    pass    # created by another thread
+            tmp = "%s.%i.%i.tmp" % (path, os.getpid(), threading.current_thread().ident)
+            with open(tmp, "wb") as f:
+                f.write(zlib.compress(s, COMPRESS_LEVEL))
+            os.rename(tmp, path)
+
+        with self.lock:
+            if self.index.get(url) != digest:
+                self.index[url] = digest
+                self.f.write("%s\t%s\n" % (url, digest))
+                self.f.flush()
+
+        return digest
+
+    def get(self, url):
+        """
+        Read a cached page
+
+        Args:
+            url - URL string the page was fetched from
+
+        Return:
+            page body string, or None if the URL is not cached
+        """
+
+        digest = self.index.get(url)
+        if digest is None:
+            return None
+        with open(self.objectPath(digest), "rb") as f:
+            return zlib.decompress(f.read())
+
+    def urls(self, prefix=""):
+        """
+        Cached URLs starting with a prefix
+
+        Args:
+            prefix - URL prefix string, e.g. a search query without page number
+
+        Return:
+            list of URL strings
+        """
+
+        return [url for url in self.index if url.startswith(prefix)]
+
+    def close(self):
+        """Close the index file"""
+        with self.lock:
+            self.f.close()
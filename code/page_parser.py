@@ -0,0 +1,306 @@
+# -*- coding: utf-8 -*-
+
+import glob
+import multiprocessing
+import re
+import threading
+from time import strftime, time
+
+
+#################################
+###      RUNTIME OPTIONS      ###
+#################################
+
+# Choose saved search result pages to benchmark the parser against
+BENCH_HTML_GLOB = "../pages/*.html"
+
+# Choose a raw page cache to benchmark against instead (None to use BENCH_HTML_GLOB)
+BENCH_CACHE_PATH = None
+
+# Choose which JEL codes count as selected while benchmarking (None keeps every code)
+BENCH_CODES = None
+
+
+################################
+###     GLOBAL VARIABLES     ###
+################################
+
+# String delimiters for paper metadata
+RESULTS_START = "<h1 class='colored'>Search Results</h1>"
+PPS_DELIM = "<li>"
+PPS_DELIM_LAST = "</ol>"
+PAPER_LINK_START = "href='"
+PAPER_TITLE_START = ".htm'>"
+PAPER_TITLE_END = "</a>"
+PAPER_AUTH_START = "<i>"
+PAPER_AUTH_END = "</i><br>"
+PAPER_JEL_START = "JEL-codes:</b> "
+PAPER_JEL_END = "<br>"
+PAPER_YEAR_START = "Revised:</b> "
+PAPER_YEAR_END = "<b>Added"
+PAPER_ALTYEAR_START = "Modified:</b>"
+PAPER_ALTYEAR_END = "</small>"
+PAPER_ADDED_DATE = re.compile(r"\d{4}-\d{2}-\d{2}")   # first date after PAPER_YEAR_END
+
+# Timestamp
+TIME = "%Y-%m-%d %H:%M:%S"
+
+# JEL codes selected in a parse worker process, and whether it returns paper handles and added dates,
+# set by initParseWorker
+WORKER_CODES = None
+WORKER_HANDLES = False
+WORKER_ADDED = False
+
+
+#################################
+###     UTILITY FUNCTIONS     ###
+#################################
+
+def paperHandle(pp):
+    """
+    Handle of a paper, the link path in front of PAPER_TITLE_START
+
+    Args:
+        pp - HTML string of one search result
+
+    Return:
+        handle string such as "/paper/sae/wpaper/2014_5f03", or None without a link
+    """
+
+    head = pp.split(PAPER_TITLE_START, 1)
+    if len(head) < 2:
+        return None
+    link = head[0].rsplit(PAPER_LINK_START, 1)
+    return link[1] if len(link) == 2 else None
+
+
+def paperAdded(pp):
+    """
+    Date a paper was added to the database, right after PAPER_YEAR_END
+
+    Args:
+        pp - HTML string of one search result
+
+    Return:
+        "YYYY-MM-DD" string, or None for papers listed without an added date
+    """
+
+    tail = pp.split(PAPER_YEAR_END, 1)
+    if len(tail) < 2:
+        return None
+    m = PAPER_ADDED_DATE.search(tail[1].split("<br>", 1)[0].split("</small>", 1)[0])
+    return m.group(0) if m else None
+
+
+def parseDbPage(s, codes=None, handles=False, added=False):
+    """
+    Parse and isolate relevant HTML segments containing paper metadata
+
+    Args:
+        s - HTML string of a search results page
+        codes - set of selected JEL codes, None keeps every code
+        handles - also return the handle of every paper (see paperHandle)
+        added - also return the date every paper was added (see paperAdded)
+
+    Return:
+        records - list of (year, codes tuple) tuples, one per paper, followed by
+            the handle if handles is True and the added date if added is True
+    """
+
+    main = s.split(RESULTS_START)[1]
+
+    # get list of papers
+    pps = main.split(PPS_DELIM)[1:]
+    pps[-1] = pps[-1].split(PPS_DELIM_LAST)[0]
+
+    # iterate over each paper and collect its year and selected codes
+    records = []
+    for pp in pps:
+
+        # extract paper metadata
+        # pp_title = pp.split(PAPER_TITLE_START)[1].split(PAPER_TITLE_END)[0]
+        # pp_auth = pp.split(PAPER_AUTH_START)[1].split(PAPER_AUTH_END)[0]
+        pp_jel = pp.split(PAPER_JEL_START)[1].split(PAPER_JEL_END)[0].strip()
+        try:
+            pp_year = pp.split(PAPER_YEAR_START)[1].split(PAPER_YEAR_END)[0].strip().split("-")[0]
+        except IndexError:
+            pp_year = pp.split(PAPER_ALTYEAR_START)[1].split(PAPER_ALTYEAR_END)[0].strip().split("-")[0]
+
+        # remove unwanted JEL codes not in selected classification
+        pp_codes = pp_jel.split()
+        if codes is not None:
+            pp_codes = [code for code in pp_codes if code in codes]
+
+        record = (pp_year, tuple(pp_codes))
+        if handles:
+            record += (paperHandle(pp),)
+        if added:
+            record += (paperAdded(pp),)
+        records.append(record)
+
+    return records
+
+
+def initParseWorker(codes, handles=False, added=False):
+    """Store the selected JEL codes, and whether to return handles and added dates, once per parse worker process"""
+    global WORKER_CODES, WORKER_HANDLES, WORKER_ADDED
+    WORKER_CODES = codes
+    WORKER_HANDLES = handles
+    WORKER_ADDED = added
+
+
+def parseTask(key, s):
+    """
+    Parse a page inside a worker process without raising
+
+    Args:
+        key - identifier of the page, passed back untouched
+        s - HTML string of the page
+
+    Return:
+        tuple of (key, records or None, error string or None, seconds spent parsing)
+    """
+
+    start = time()
+    try:
+        return key, parseDbPage(s, WORKER_CODES, WORKER_HANDLES, WORKER_ADDED), None, time() - start
+    except Exception as e:
+        return key, None, "%s: %s" % (e.__class__.__name__, e), time() - start
+
+
+class ParseStage(object):
+    """
+    Process pool parsing fetched pages independently of the fetch threads
+
+    Fetch threads hand pages over with submit(), which blocks while
+    max_pending pages are waiting, so the hand-off behaves as a bounded
+    queue. Results come back as compact (year, codes) records on the pool's
+    result thread through the done callback.
+
+    Args:
+        codes - set of selected JEL codes, None keeps every code
+        done - callable taking (key, records) for every parsed page
+        failed - callable taking (key, error string) for every page that failed to parse
+        processes - number of parse processes, defaults to the number of cores
+        max_pending - maximum number of pages submitted but not yet parsed
+        stats - optional CrawlStats object recording parse time and queue waits
+        handles - add the paper handle to the records passed to done
+        added - add the paper's added date to the records passed to done (after the handle)
+    """
+
+    def __init__(self, codes, done, failed=None, processes=None, max_pending=64, stats=None,
+                 handles=False, added=False):
+        self.done = done
+        self.failed = failed
+        self.stats = stats
+        self.slots = threading.BoundedSemaphore(max_pending)
+        self.pool = multiprocessing.Pool(processes, initParseWorker, (codes, handles, added))
+
+    def submit(self, key, s):
+        """
+        Queue a page for parsing, blocking while the queue is full
+
+        Args:
+            key - identifier of the page, passed back to the callbacks
+            s - HTML string of the page
+
+        Return:
+            None
+        """
+
+        if self.stats is None:
+            self.slots.acquire()
+        else:
+            with self.stats.timer("queue_wait"):
+                self.slots.acquire()
+        self.pool.apply_async(parseTask, (key, s), callback=self.collect)
+
+    def collect(self, result):
+        """
+        Dispatch a finished parse to the callbacks and free its queue slot
+
+        Runs on the pool's result thread, which an escaping exception would
+        kill (no later page would be collected and submit would block), so
+        an error of the done callback is passed on to failed instead.
+        """
+
+        key, records, error, seconds = result
+        try:
+            if self.stats is not None:
+                self.stats.add("parse", seconds)
+            if error is None:
+                try:
+                    self.done(key, records)
+                except Exception as e:
+                    error = "%s in done callback: %s" % (e.__class__.__name__, e)
+            if error is not None and self.failed is not None:
+                self.failed(key, error)
+        except Exception as e:
+            print ">>> %s | !!! %s in failed callback, skipping '%s'" % (strftime(TIME), e.__class__.__name__, key)
+        finally:
+            self.slots.release()
+
+    def close(self):
+        """Wait for every submitted page to be parsed"""
+        self.pool.close()
+        self.pool.join()
+
+
+def benchmarkParser(pages, codes=None, processes=None):
+    """
+    Parse saved HTML pages offline and report throughput
+
+    Args:
+        pages - list of saved search result HTML strings
+        codes - set of selected JEL codes, None keeps every code
+        processes - number of parse processes, 1 parses in the calling process
+
+    Return:
+        tuple of (pages per second, papers per second)
+    """
+
+    papers = [0]
+
+    def done(key, records):
+        papers[0] += len(records)
+
+    start = time()
+    if processes == 1:
+        for s in pages:
+            done(None, parseDbPage(s, codes))
+    else:
+        stage = ParseStage(codes, done, processes=processes)
+        for i, s in enumerate(pages):
+            stage.submit(i, s)
+        stage.close()
+    elapsed = max(time() - start, 1e-9)
+
+    return len(pages) / elapsed, papers[0] / elapsed
+
+
+######################
+###     OUTPUT     ###
+######################
+
+# main sentinel
+def main():
+    pages = []
+    if BENCH_CACHE_PATH is not None:
+        from page_cache import PageCache
+        cache = PageCache(BENCH_CACHE_PATH)
+        for url in sorted(cache.urls()):
+            pages.append(cache.get(url))
+        cache.close()
+    else:
+        for path in sorted(glob.glob(BENCH_HTML_GLOB)):
+            with open(path, "rb") as f:
+                pages.append(f.read())
+
+    print ">>> %s | Benchmarking parser on %i saved pages" % (strftime(TIME), len(pages))
+    for processes in sorted(set((1, multiprocessing.cpu_count()))):
+        pps, papers = benchmarkParser(pages, BENCH_CODES, processes)
+        print "  %2i process(es): %10.1f pages/s, %12.1f papers/s" % (processes, pps, papers)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,470 @@
+# -*- coding: utf-8 -*-
+
+import json
+import os
+import threading
+
+import numpy as np
+
+from aggregation import BulkCounts
+
+# NumPy docs: https://docs.scipy.org/doc/numpy/reference/generated/numpy.memmap.html
+
+
+################################
+###     GLOBAL VARIABLES     ###
+################################
+
+# File extension of a paper store (a directory)
+PAPERS_EXT = ".papers"
+
+# Paper store format version, bumped on incompatible layout changes
+PAPERS_VERSION = 2
+
+# Files inside a paper store
+META_FILE = "meta.json"         # format version, code and year tables, network codes, committed row counts, merge number
+COLUMNS = (                     # append-only raw columns, one row per paper, per code entry or per handle byte
+    ("years", np.uint16),       # year id of every paper
+    ("lengths", np.uint16),     # number of codes of every paper
+    ("codes", np.uint16),       # code ids of all papers back to back
+    ("handle_lengths", np.uint16),  # number of bytes of every paper's handle, 0 if it has none
+    ("handles", np.uint8))      # handles of all papers back to back
+
+# Papers buffered in memory before they are appended to the columns
+FLUSH_PAPERS = 100000
+
+# Papers aggregated at a time when rebuilding a network
+CHUNK_PAPERS = 1 << 20
+
+
+#################################
+###     UTILITY FUNCTIONS     ###
+#################################
+
+class PaperArrays(object):
+    """
+    Papers of a store as ragged code-id arrays
+
+    The paper id is the row number: paper i was published in
+    years[year_ids[i]] and has codes codes[j] for j in
+    ids[offsets[i]:offsets[i + 1]]. Its handle, which ties the row back to
+    the paper, is handle_chars[handle_offsets[i]:handle_offsets[i + 1]].
+
+    Args:
+        codes - list of JEL codes, position is the code id
+        years - list of year strings, position is the year id
+        year_ids - (P,) int array of year ids
+        offsets - (P + 1,) int array of code offsets
+        ids - int array of code ids
+        handle_offsets - optional (P + 1,) int array of handle offsets, None if no paper has a handle
+        handle_chars - optional uint8 array of handle bytes
+    """
+
+    def __init__(self, codes, years, year_ids, offsets, ids, handle_offsets=None, handle_chars=None):
+        self.codes = list(codes)
+        self.years = list(years)
+        self.year_ids = year_ids
+        self.offsets = offsets
+        self.ids = ids
+        if handle_offsets is None:
+            handle_offsets = np.zeros(len(year_ids) + 1, dtype=np.int64)
+            handle_chars = np.zeros(0, dtype=np.uint8)
+        self.handle_offsets = handle_offsets
+        self.handle_chars = handle_chars
+
+    def __len__(self):
+        return len(self.year_ids)
+
+    def lengths(self):
+        """Number of codes of every paper"""
+        return np.diff(self.offsets)
+
+    def yearValues(self):
+        """Integer year of every paper, -1 where the year is not a number"""
+        value = np.array([int(y) if y.isdigit() else -1 for y in self.years] or [-1], dtype=np.int64)
+        return value[self.year_ids]
+
+    def handle(self, i):
+        """Handle of paper i, None if it has none"""
+        lo, hi = self.handle_offsets[i], self.handle_offsets[i + 1]
+        return self.handle_chars[lo:hi].tostring() if hi > lo else None
+
+    def handles(self):
+        """List of the handle of every paper, None where it has none"""
+        chars = self.handle_chars.tostring()
+        offsets = self.handle_offsets.tolist()
+        return [chars[lo:hi] or None for lo, hi in zip(offsets[:-1], offsets[1:])]
+
+    def records(self):
+        """Generator of (year, codes) records, as parsed from the pages"""
+        codes, years = self.codes, self.years
+        ids, offsets = self.ids.tolist(), self.offsets.tolist()
+        for i, y in enumerate(self.year_ids.tolist()):
+            yield years[y], tuple(codes[j] for j in ids[offsets[i]:offsets[i + 1]])
+
+    def select(self, nodes=None, years=None, min_codes=None, max_codes=None, papers=None):
+        """
+        Papers and codes passing filters, without copying the store
+
+        The number of codes a paper must have is counted over all its stored
+        codes; codes outside nodes are dropped from the papers kept after that.
+
+        Args:
+            nodes - optional list of codes to keep, in the order of the new code ids
+            years - optional (lower, upper) bounds of the publication year
+            min_codes - optional smallest number of codes of a paper kept
+            max_codes - optional largest number of codes of a paper kept
+            papers - optional (P,) bool array, False for papers left out
+
+        Return:
+            PaperArrays object
+        """
+
+        codes, year_ids, offsets, ids = self.codes, self.year_ids, self.offsets, self.ids
+        lengths = np.diff(offsets)
+
+        keep = np.ones(len(year_ids), dtype=bool) if papers is None else np.array(papers, dtype=bool)
+        if years is not None:
+            value = self.yearValues()
+            keep &= (value >= int(years[0])) & (value <= int(years[1]))
+        if min_codes is not None:
+            keep &= lengths >= min_codes
+        if max_codes is not None:
+            keep &= lengths <= max_codes
+
+        if nodes is not None:
+            index = dict((code, i) for i, code in enumerate(codes))
+            remap = np.full(len(codes) + 1, -1, dtype=np.int64)
+            for i, code in enumerate(nodes):
+                if code in index:
+                    remap[index[code]] = i
+            paper = np.repeat(np.arange(len(year_ids)), lengths)
+            new_ids = remap[ids]
+            entry = new_ids >= 0
+            ids = new_ids[entry]
+            lengths = np.bincount(paper[entry], minlength=len(year_ids))
+            codes = list(nodes)
+
+        handle_offsets, handle_chars = self.handle_offsets, self.handle_chars
+        if not keep.all():
+            ids = ids[np.repeat(keep, lengths)]
+            year_ids, lengths = year_ids[keep], lengths[keep]
+            handle_lengths = np.diff(handle_offsets)
+            handle_chars = handle_chars[np.repeat(keep, handle_lengths)]
+            handle_offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+            np.cumsum(handle_lengths[keep], out=handle_offsets[1:])
+        offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+
+        return PaperArrays(codes, self.years, year_ids, offsets, ids, handle_offsets, handle_chars)
+
+    def toCounts(self, chunk=CHUNK_PAPERS, counts=None):
+        """
+        Count the papers' nodes and code pairs
+
+        Args:
+            chunk - number of papers aggregated at a time
+            counts - optional BulkCounts object with this object's codes to add to
+
+        Return:
+            BulkCounts object with this object's codes
+        """
+
+        if counts is None:
+            counts = BulkCounts(self.codes)
+        year_map = np.array([counts.yearId(year) for year in self.years] or [0], dtype=np.int64)
+        offsets = np.asarray(self.offsets, dtype=np.int64)
+        for start in xrange(0, len(self), chunk):
+            stop = min(start + chunk, len(self))
+            lo, hi = offsets[start], offsets[stop]
+            counts.addArrays(year_map[self.year_ids[start:stop]], offsets[start:stop + 1] - lo, self.ids[lo:hi])
+
+        return counts
+
+    def toTensor(self, years=None, chunk=CHUNK_PAPERS):
+        """
+        Rebuild the co-tagging network of the papers
+
+        Args:
+            years - optional (lower, upper) year bounds for the year axis
+            chunk - number of papers aggregated at a time
+
+        Return:
+            CoTagTensor object
+        """
+
+        return self.toCounts(chunk).toTensor(years)
+
+
+class PaperStore(object):
+    """
+    Append-only columnar store of parsed papers
+
+    Every paper is kept as a year id, all its code ids and its handle, in raw columns that
+    grow by appending, so a network can be rebuilt or re-aggregated with
+    other filters or categories without crawling again. Codes are stored
+    unfiltered; the codes of the crawled network are recorded apart as
+    nodes, and aggregatePapers applies them. Appended papers are buffered and
+    committed by flush(), which rewrites meta.json last: rows beyond the
+    committed counts, left by a crash, are never read and are cut before
+    the next append.
+
+    Args:
+        path - store directory, created if missing
+        codes - optional list of codes to fix the first code ids (new codes are added as seen)
+        flush_papers - number of buffered papers that triggers a commit, None to commit only on flush()
+        nodes - optional list of the codes of the crawled network, None keeps those recorded in the store
+    """
+
+    def __init__(self, path, codes=None, flush_papers=FLUSH_PAPERS, nodes=None):
+        self.path = path
+        self.flush_papers = flush_papers
+        self.lock = threading.Lock()
+        self.codes, self.years = [], []
+        self.papers = self.entries = self.handle_bytes = 0
+        self.merged = 0
+        self.nodes = None
+        if os.path.exists(os.path.join(path, META_FILE)):
+            with open(os.path.join(path, META_FILE)) as f:
+                meta = json.load(f)
+            if meta["version"] != PAPERS_VERSION:
+                raise IOError("'%s' has paper store version %i, expected %i" % (path, meta["version"], PAPERS_VERSION))
+            self.codes = [str(code) for code in meta["codes"]]
+            self.years = [str(year) for year in meta["years"]]
+            self.papers, self.entries, self.handle_bytes = meta["papers"], meta["entries"], meta["handle_bytes"]
+            self.merged = meta.get("merged", 0)
+            self.nodes = [str(code) for code in meta["nodes"]] if meta.get("nodes") is not None else None
+        elif not os.path.isdir(path):
+            os.makedirs(path)
+        self.code_ids = dict((code, i) for i, code in enumerate(self.codes))
+        self.year_ids = dict((year, i) for i, year in enumerate(self.years))
+        for code in codes or ():
+            self.codeId(code)
+        if nodes is not None:
+            self.nodes = list(nodes)
+        self.checked = False
+        self.buffer_years, self.buffer_lengths, self.buffer_ids, self.buffer_handles = [], [], [], []
+
+    @classmethod
+    def create(cls, path, codes=None, flush_papers=FLUSH_PAPERS, nodes=None):
+        """Empty store at path, replacing any store there"""
+        for name in [META_FILE] + [column + ".bin" for column, _ in COLUMNS]:
+            if os.path.exists(os.path.join(path, name)):
+                os.remove(os.path.join(path, name))
+        return cls(path, codes, flush_papers, nodes)
+
+    @staticmethod
+    def exists(path):
+        """Whether a committed store is at path"""
+        return os.path.exists(os.path.join(path, META_FILE))
+
+    def __len__(self):
+        return self.papers + len(self.buffer_years)
+
+    def columnPath(self, column):
+        """File of a column"""
+        return os.path.join(self.path, column + ".bin")
+
+    def committedRows(self, column):
+        """Number of committed rows of a column"""
+        return {"codes": self.entries, "handles": self.handle_bytes}.get(column, self.papers)
+
+    def truncateTornTail(self):
+        """Cut column rows appended after the last commit"""
+        for column, dtype in COLUMNS:
+            size = self.committedRows(column) * np.dtype(dtype).itemsize
+            path = self.columnPath(column)
+            actual = os.path.getsize(path) if os.path.exists(path) else 0
+            if actual < size:
+                raise IOError("'%s' is shorter than its committed %i rows" % (path, self.committedRows(column)))
+            if actual > size or not os.path.exists(path):
+                with open(path, "ab") as f:
+                    f.truncate(size)
+
+    def codeId(self, code):
+        """Integer id of a code, assigned on first use"""
+        i = self.code_ids.get(code)
+        if i is None:
+            i = self.code_ids[code] = len(self.codes)
+            self.codes.append(code)
+            if i > np.iinfo(np.uint16).max:
+                raise ValueError("More than %i distinct codes" % (np.iinfo(np.uint16).max + 1))
+        return i
+
+    def yearId(self, year):
+        """Integer id of a year string, assigned on first use"""
+        y = self.year_ids.get(year)
+        if y is None:
+            y = self.year_ids[year] = len(self.years)
+            self.years.append(year)
+            if y > np.iinfo(np.uint16).max:
+                raise ValueError("More than %i distinct years" % (np.iinfo(np.uint16).max + 1))
+        return y
+
+    def append(self, records, handles=None):
+        """
+        Add parsed papers
+
+        Args:
+            records - list of (year, codes) tuples
+            handles - optional list of the papers' handles, None where a paper has none
+
+        Return:
+            None
+        """
+
+        with self.lock:
+            for year, codes in records:
+                self.buffer_years.append(self.yearId(year))
+                self.buffer_lengths.append(len(codes))
+                self.buffer_ids.extend(self.codeId(code) for code in codes)
+            self.buffer_handles.extend([handle or "" for handle in handles] if handles is not None
+                                       else [""] * len(records))
+            if self.flush_papers is not None and len(self.buffer_years) >= self.flush_papers:
+                self.commit()
+
+    def appendArrays(self, year_ids, offsets, ids, handles=None):
+        """
+        Add papers given as arrays of this store's year and code ids
+
+        Args:
+            year_ids - (P,) int array of ids from yearId
+            offsets - (P + 1,) int array, paper i has codes ids[offsets[i]:offsets[i + 1]]
+            ids - int array of ids from codeId
+            handles - optional list of the papers' handles, None where a paper has none
+
+        Return:
+            None
+        """
+
+        with self.lock:
+            self.commit()
+            self.write(np.asarray(year_ids), np.diff(offsets), np.asarray(ids)[offsets[0]:offsets[-1]],
+                       [handle or "" for handle in handles] if handles is not None else [""] * len(year_ids))
+
+    def write(self, year_ids, lengths, ids, handles):
+        """Append rows to the columns and commit them"""
+        if not self.checked:
+            self.truncateTornTail()
+            self.checked = True
+        handle_lengths = [len(handle) for handle in handles]
+        handle_chars = np.frombuffer("".join(handles), dtype=np.uint8)
+        for (column, dtype), rows in zip(COLUMNS, (year_ids, lengths, ids, handle_lengths, handle_chars)):
+            with open(self.columnPath(column), "ab") as f:
+                np.asarray(rows, dtype=dtype).tofile(f)
+                f.flush()
+                os.fsync(f.fileno())
+        self.papers += len(year_ids)
+        self.entries += len(ids)
+        self.handle_bytes += len(handle_chars)
+        self.writeMeta()
+
+    def writeMeta(self):
+        """Replace meta.json atomically, committing the column rows it counts"""
+        meta = {"version": PAPERS_VERSION, "codes": self.codes, "years": self.years,
+                "papers": self.papers, "entries": self.entries, "handle_bytes": self.handle_bytes,
+                "merged": self.merged, "nodes": self.nodes}
+        tmp = os.path.join(self.path, "%s.%i.tmp" % (META_FILE, os.getpid()))
+        with open(tmp, "w") as f:
+            json.dump(meta, f)
+        os.rename(tmp, os.path.join(self.path, META_FILE))
+
+    def commit(self, force=False):
+        """Write buffered papers, the lock must be held"""
+        if self.buffer_years or force or not os.path.exists(os.path.join(self.path, META_FILE)):
+            self.write(self.buffer_years, self.buffer_lengths, self.buffer_ids, self.buffer_handles)
+            self.buffer_years, self.buffer_lengths, self.buffer_ids, self.buffer_handles = [], [], [], []
+
+    def flush(self):
+        """Write and commit buffered papers"""
+        with self.lock:
+            self.commit()
+
+    def close(self, merged=None):
+        """
+        Commit buffered papers
+
+        Args:
+            merged - optional number of the crawl (see delta_crawl.mergeNumber) the
+                papers complete, committed in the same meta.json
+
+        Return:
+            None
+        """
+
+        with self.lock:
+            if merged is not None:
+                self.merged = merged
+            self.commit(merged is not None)
+
+    def arrays(self, mmap=True):
+        """
+        Committed papers as ragged arrays
+
+        Args:
+            mmap - memory-map the columns instead of reading them into RAM
+
+        Return:
+            PaperArrays object
+        """
+
+        columns = []
+        for column, dtype in COLUMNS:
+            n = self.committedRows(column)
+            if n == 0:
+                columns.append(np.zeros(0, dtype=dtype))
+            elif mmap:
+                columns.append(np.memmap(self.columnPath(column), dtype=dtype, mode="r", shape=(n,)))
+            else:
+                columns.append(np.fromfile(self.columnPath(column), dtype=dtype, count=n))
+        year_ids, lengths, ids, handle_lengths, handle_chars = columns
+        offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        handle_offsets = np.zeros(len(handle_lengths) + 1, dtype=np.int64)
+        np.cumsum(handle_lengths, out=handle_offsets[1:])
+
+        return PaperArrays(self.codes, self.years, year_ids, offsets, ids, handle_offsets, handle_chars)
+
+
+def aggregatePapers(path, nodes=None, years=None, min_codes=None, max_codes=None, categories=None):
+    """
+    Rebuild a co-tagging network, or a filtered variant, from paper stores
+
+    The stores of several shards, such as per-category or parallel crawls,
+    are merged by handle: a paper already in an earlier store is counted
+    once, with the codes stored there.
+
+    Args:
+        path - paper store directory, or list of them
+        nodes - optional list of codes making up the network (the crawled networks' codes by
+            default, or all stored codes, sorted, if a store has none recorded)
+        years - optional (lower, upper) bounds of the publication years counted
+        min_codes - optional smallest number of JEL codes of a paper counted, over all its codes
+        max_codes - optional largest number of JEL codes of a paper counted, over all its codes
+        categories - optional list of top-level JEL codes, nodes outside them are dropped
+
+    Return:
+        CoTagTensor object
+    """
+
+    stores = [PaperStore(p) for p in ([path] if isinstance(path, basestring) else path)]
+    if nodes is None:
+        recorded = [store.nodes for store in stores]
+        if categories is not None or None in recorded:
+            recorded = [store.codes for store in stores]
+        nodes = sorted(set().union(*recorded))
+    if categories is not None:
+        nodes = [code for code in nodes if code[:1] in categories]
+
+    counts = BulkCounts(nodes)
+    seen = set()
+    for store in stores:
+        papers = store.arrays()
+        first = None
+        if len(stores) > 1:
+            handles = papers.handles()
+            if seen:
+                first = [handle is None or handle not in seen for handle in handles]
+            seen.update(handles)
+        papers.select(nodes, years, min_codes, max_codes, first).toCounts(counts=counts)
+    return counts.toTensor(years)
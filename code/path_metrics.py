@@ -0,0 +1,222 @@
+# -*- coding: utf-8 -*-
+
+import multiprocessing
+
+import networkx as nx
+import numpy as np
+import scipy.sparse as sp
+from scipy.sparse.csgraph import connected_components
+
+# NetworkX docs: https://networkx.github.io/documentation/latest/
+# SciPy docs:    https://docs.scipy.org/doc/scipy/reference/sparse.html
+
+
+################################
+###     GLOBAL VARIABLES     ###
+################################
+
+# BFS sources expanded together as the columns of one frontier matrix
+SOURCE_CHUNK = 64
+
+# Adjacency matrix of the BFS worker processes
+WORKER_ADJ = None
+
+
+#################################
+###     UTILITY FUNCTIONS     ###
+#################################
+
+def bfsSources(A, sources):
+    """
+    Breadth-first search from a batch of sources by sparse frontier expansion
+
+    The frontiers of all sources are the columns of one (N, S) matrix, so
+    each BFS level is a single sparse x dense product.
+
+    Args:
+        A - (N, N) symmetric scipy.sparse.csr_matrix, non-zero entries are edges
+        sources - list of source node ids
+
+    Return:
+        tuple of ((S,) eccentricities, (S,) sums of distances, (S,) reached node counts)
+    """
+
+    n, s = A.shape[0], len(sources)
+    cols = np.arange(s)
+    visited = np.zeros((n, s), dtype=bool)
+    visited[sources, cols] = True
+    frontier = visited.astype(np.float64)
+
+    ecc = np.zeros(s, dtype=np.int64)
+    dist = np.zeros(s, dtype=np.int64)
+    level = 0
+    while True:
+        level += 1
+        reached = (A.dot(frontier) > 0) & ~visited
+        found = reached.sum(axis=0)
+        if not found.any():
+            break
+        visited |= reached
+        dist += level * found
+        ecc[found > 0] = level
+        frontier = reached.astype(np.float64)
+
+    return ecc, dist, visited.sum(axis=0)
+
+
+def initBfsWorker(A):
+    """Store the adjacency matrix once per BFS worker process"""
+    global WORKER_ADJ
+    WORKER_ADJ = A
+
+
+def bfsTask(sources):
+    """Run bfsSources on the worker's adjacency matrix"""
+    return bfsSources(WORKER_ADJ, sources)
+
+
+def runBfs(A, sources, processes=None):
+    """
+    Breadth-first search from many sources, split into chunks across a process pool
+
+    Args:
+        A - (N, N) symmetric scipy.sparse matrix
+        sources - (S,) array of source node ids
+        processes - number of worker processes, 1 to stay in this process, None for all CPUs
+
+    Return:
+        tuple of ((S,) eccentricities, (S,) sums of distances, (S,) reached node counts)
+    """
+
+    A = sp.csr_matrix(A)
+    chunks = [list(sources[i:i + SOURCE_CHUNK]) for i in xrange(0, len(sources), SOURCE_CHUNK)]
+    if processes is None:
+        processes = multiprocessing.cpu_count()
+    processes = min(processes, len(chunks))
+
+    if processes <= 1:
+        results = [bfsSources(A, chunk) for chunk in chunks]
+    else:
+        pool = multiprocessing.Pool(processes, initBfsWorker, (A,))
+        try:
+            results = pool.map(bfsTask, chunks)
+        finally:
+            pool.close()
+            pool.join()
+
+    if not results:
+        empty = np.zeros(0, dtype=np.int64)
+        return empty, empty, empty
+    return tuple(np.concatenate(parts) for parts in zip(*results))
+
+
+def pathMetrics(A, processes=None):
+    """
+    Diameter and average shortest path length from one all-pairs BFS pass
+
+    Same results as nx.diameter and nx.average_shortest_path_length on
+    the unweighted graph, which also raise on a disconnected graph.
+
+    Args:
+        A - (N, N) symmetric scipy.sparse matrix, non-zero entries are edges
+        processes - number of worker processes, None for all CPUs
+
+    Return:
+        tuple of (diameter, average shortest path length)
+    """
+
+    n = A.shape[0]
+    if n < 2:
+        return 0, 0.0
+    ecc, dist, reached = runBfs(A, np.arange(n), processes)
+    if (reached < n).any():
+        raise nx.NetworkXError("Graph is not connected.")
+
+    return int(ecc.max()), float(dist.sum()) / (n * (n - 1))
+
+
+def samplePathMetrics(A, samples=64, seed=None, processes=None):
+    """
+    Estimate diameter and average shortest path length from BFS of sampled sources
+
+    The average shortest path length is the mean over sampled sources of
+    their mean distance, with the half-width of its 95% confidence interval
+    (finite population corrected, so it is 0 when every node is sampled).
+    The diameter is bracketed by the largest sampled eccentricity and twice
+    the smallest one, since no node's eccentricity is below half the diameter.
+
+    Args:
+        A - (N, N) symmetric scipy.sparse matrix of a connected graph
+        samples - number of BFS sources
+        seed - optional random seed
+        processes - number of worker processes, None for all CPUs
+
+    Return:
+        tuple of (average shortest path length, its 95% error bound, diameter lower bound, diameter upper bound)
+    """
+
+    n = A.shape[0]
+    if n < 2:
+        return 0.0, 0.0, 0, 0
+    samples = min(samples, n)
+    sources = np.sort(np.random.RandomState(seed).choice(n, samples, replace=False))
+    ecc, dist, reached = runBfs(A, sources, processes)
+    if (reached < n).any():
+        raise nx.NetworkXError("Graph is not connected.")
+
+    means = dist / float(n - 1)
+    err = 0.0
+    if samples > 1:
+        err = 1.96 * means.std(ddof=1) / np.sqrt(samples) * np.sqrt(float(n - samples) / (n - 1))
+
+    return float(means.mean()), float(err), int(ecc.max()), int(min(2 * ecc.min(), n - 1))
+
+
+def largestComponent(A):
+    """
+    Restrict an adjacency matrix to its largest connected component
+
+    Args:
+        A - (N, N) symmetric scipy.sparse matrix
+
+    Return:
+        tuple of ((M,) node ids of the component, (M, M) scipy.sparse.csr_matrix)
+    """
+
+    A = sp.csr_matrix(A)
+    _, labels = connected_components(A, directed=False)
+    keep = np.flatnonzero(labels == np.bincount(labels).argmax())
+
+    return keep, A[keep][:, keep]
+
+
+def pathMetricSeries(tensor, years=None, samples=None, processes=None, seed=None):
+    """
+    Path metrics of every cumulative yearly snapshot
+
+    Early snapshots have codes without papers yet, so each snapshot is
+    measured on its largest connected component.
+
+    Args:
+        tensor - CoTagTensor object
+        years - optional list of "up to" years, defaults to the tensor's year axis
+        samples - number of BFS sources per year for estimates, None for exact metrics
+        processes - number of worker processes, None for all CPUs
+        seed - optional random seed of the sampled mode
+
+    Return:
+        list of (year, component size, metrics tuple of pathMetrics or samplePathMetrics)
+    """
+
+    if years is None:
+        years = tensor.years
+    series = []
+    for year in years:
+        keep, A = largestComponent(tensor.adjacency(year, weighted=False))
+        if samples is None:
+            metrics = pathMetrics(A, processes)
+        else:
+            metrics = samplePathMetrics(A, samples, seed, processes)
+        series.append((year, len(keep), metrics))
+
+    return series
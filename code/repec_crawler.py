@@ -1,15 +1,25 @@
 # -*- coding: utf-8 -*-
 
-import itertools
-from multiprocessing.dummy import Pool
-from random import randint
+import os
 import re
-from time import strftime, sleep
+from time import strftime
 import urllib2
-import xml.etree.ElementTree as ET
 
 import networkx as nx
-import zen
+
+from aggregation import BulkCounts, addCountsToGraph
+from crawl_engine import CrawlEngine
+from crawl_journal import CrawlJournal
+from crawl_stats import CrawlStats, profileCall
+from dedup import BloomFilter, PaperSet, dropDuplicates
+from delta_crawl import (DELTA_EXT, DELTA_JOURNAL_EXT, DeltaTracker, affectedYears, archiveJournal, loadDeltaState,
+                         mergedJournals, mergeNumber, saveDeltaState)
+from graph_bridge import writeZenGml
+from graph_store import STORE_EXT, readGraph, storeMeta, storeYears, writeNetwork
+from jel_taxonomy import loadTaxonomy
+from page_cache import PageCache
+from page_parser import ParseStage
+from paper_store import PAPERS_EXT, PaperStore
 
 # Zen docs:      http://www.networkdynamics.org/static/zen/html/api/api.html
 # NetworkX docs: https://networkx.github.io/documentation/latest/
@@ -19,24 +29,74 @@ import zen
 ###      RUNTIME OPTIONS      ###
 #################################
 
-# Choose how many threads to spawn
-THREADS_NUM = 1     # 128 threads for amazon ec2 (don't actually do this)
+# Choose how many requests to keep in flight
+CONCURRENCY = 8
+
+# Choose the politeness budget per host (sustained requests per second, back-to-back burst)
+RATE_PER_HOST = 0.1
+BURST = 2
+
+# Choose how many processes parse pages (None for one per core), and how many fetched pages may wait for them
+PARSE_PROCESSES = None
+PARSE_QUEUE = 64
 
-# Choose how long to sleep between each page retrieval
-SLEEP = randint(10, 30)
+# Choose how many times to retry a page, and the base delay (seconds) of the jittered backoff
+RETRIES = 5
+BACKOFF = 5
 
-# Choose whether to output additional Zen GML file alongside NetworkX GEXF file
+# Choose whether to output additional NetworkX GEXF (for Gephi) and Zen GML files alongside the columnar store
+OUTPUT_GEXF = False
 OUTPUT_ZEN_GML = True
 
+# Choose which publication years to store (others are incorrect metadata), None as upper bound for the current year
+STORE_YEARS = (1900, None)
+
 # Choose filepaths (no need to specify file extension for OUTPUT_PATH)
 JEL_XML_PATH = "jel_classification.xml"
 OUTPUT_PATH = "../graphs/econs6"
 
+# Choose whether to resume from the crawl journal at OUTPUT_PATH + '.journal' (otherwise it is started afresh, as is
+# the journal of a crawl that finished without failed pages)
+RESUME = True
+
+# Choose whether to only crawl papers added since the last run and merge them into the network stored at
+# OUTPUT_PATH (paging stops at papers already recorded; needs a completed crawl of the same CATEGORIES first)
+DELTA = False
+
+# Choose whether to drop papers seen before (on another page, or in another run if DEDUP_PATH is set)
+DEDUP = True
+
+# Choose a Bloom filter file shared by runs over different categories or shards (None to deduplicate within a run
+# only), with its capacity (papers) and false positive rate. Each paper is recorded by one run only, so every run
+# keeps a paper store with all codes of its papers, and the runs' stores are combined with
+# paper_store.aggregatePapers. Delete it together with the journals to crawl afresh
+DEDUP_PATH = None
+DEDUP_CAPACITY = 5000000
+DEDUP_ERROR = 1e-4
+
+# Choose whether to keep every counted paper, with all its JEL codes, in a columnar store at OUTPUT_PATH + '.papers',
+# rewritten each run, from which the network can be re-aggregated with other filters or categories without crawling
+# (see paper_store.aggregatePapers)
+STORE_PAPERS = True
+
+# Choose whether to keep compressed raw pages, and where (needed for REPLAY)
+CACHE_PAGES = True
+CACHE_PATH = "../cache"
+
+# Choose whether to rebuild the graph by re-parsing cached pages only (no network access)
+REPLAY = False
+
 # Choose which JEL classification codes to include in search
 # CATEGORIES = ['A', 'B', 'C', 'D', 'E', 'F', 'G', 'H', 'I', 'J', 'K', 'L', 'M', 'N', 'O', 'P', 'Q', 'R'] # noqa
 # CATEGORIES = ['C', 'D', 'E', 'F', 'G']
 CATEGORIES = ['F']
 
+# Choose how often (seconds) to print a JSON stats line while crawling (None to disable)
+STATS_INTERVAL = 30
+
+# Choose a file to write cProfile data of the whole run to (None to disable profiling)
+PROFILE_PATH = None
+
 # Choose whether to capture additonal node/edge data
 NODE_DATA = True
 EDGE_DATA = True
@@ -59,20 +119,6 @@ DB_SEARCH_PG = ";pg="
 DB_QUERY = urllib2.quote("* ".join(CATEGORIES) + "*", ":/")
 URL = DB_ROOT + DB_SEARCH_JEL + DB_QUERY + DB_SEARCH_PG
 
-# String delimiters for paper metadata
-PPS_DELIM = "<li>"
-PPS_DELIM_LAST = "</ol>"
-PAPER_TITLE_START = ".htm'>"
-PAPER_TITLE_END = "</a>"
-PAPER_AUTH_START = "<i>"
-PAPER_AUTH_END = "</i><br>"
-PAPER_JEL_START = "JEL-codes:</b> "
-PAPER_JEL_END = "<br>"
-PAPER_YEAR_START = "Revised:</b> "
-PAPER_YEAR_END = "<b>Added"
-PAPER_ALTYEAR_START = "Modified:</b>"
-PAPER_ALTYEAR_END = "</small>"
-
 # Timestamp
 TIME = "%Y-%m-%d %H:%M:%S"
 
@@ -92,41 +138,23 @@ def jelXMLParser(categories):
         jel_dict - dict of chosen JEL classification info
     """
 
-    jel = ET.parse(JEL_XML_PATH)
-    root = jel.getroot()
-
-    # iterate over xml tags and insert into dict
-    jel_dict = {}
-    for child in root.iter('classification'):
-        m = re.search('([A-Z])(?=[0-9][0-9])', child[0].text)
-        if m.group(0) in categories:
-            jel_dict[child[0].text] = child[1].text
+    return loadTaxonomy(JEL_XML_PATH).select(categories)
 
-    return jel_dict
 
-
-def getPages(url):
+def getPages(engine, url):
     """
     Get number of pages in the database
 
     Args:
+        engine - CrawlEngine object used for fetching
         url - URL string containing relevant JEL code
 
     Return:
         pgs - integer of number of pages
     """
 
-    try:
-        req = urllib2.Request(url)
-        req.add_header("User-Agent", AGENT)
-        print ">>> %s | Getting pages to parse..." % strftime(TIME)
-        f = urllib2.urlopen(req)
-        s = f.read()
-        f.close()
-    except:
-        print '>>> %s | !!! ConnectionError, retrying...' % strftime(TIME)
-        sleep(5)
-        getPages(url)
+    print ">>> %s | Getting pages to parse..." % strftime(TIME)
+    s = engine.fetch(url)
 
     pgs = int(re.search('(?<=of )\d+', s.split('<br>Documents')[1]).group(0))
     print ">>> %s | Success! Total pages to parse: %i" % (strftime(TIME), pgs)
@@ -134,169 +162,180 @@ def getPages(url):
     return pgs
 
 
-def parseDbPageWrapper(pg):
+def parseDbPageWrapper(url, s):
     """
-    Wrapper function for parsing a single page of the database
+    Wrapper function handing a single fetched page of the database to the parse stage
 
     Args:
-        pg - integer value of a database page
+        url - URL string of the page
+        s - HTML string of the page
 
     Return:
         None
     """
 
-    try:
-        url_full = URL + str(pg)
-        parseDbPage(G, url_full)
-        sleep(SLEEP)
-    except:
-        print ">>> %s | !!! ParseError, skipping '%s'" % (strftime(TIME), url_full)
+    if cache is not None:
+        with stats.timer("cache"):
+            cache.put(url, s)
+    stage.submit(url, s)
 
 
-def parseDbPage(G, url):
+def pageParsed(url, records):
     """
-    Parse and isolate relevant HTML segments containing paper metadata
+    Count, store and journal the papers of a parsed page
 
     Args:
-        G - zen.Graph() or networkx.Graph() object
-        url - URL string to parse
+        url - URL string of the page
+        records - list of (year, codes, added) tuples, one per paper, or
+            (year, codes, handle, added) tuples when deduplicating or storing papers
 
     Return:
         None
     """
 
-    try:
-        print ">>> %s | Opening '%s'" % (strftime(TIME), url)
-        req = urllib2.Request(url)
-        req.add_header("User-Agent", AGENT)
-        f = urllib2.urlopen(req)
-        s = f.read()
-        f.close()
-    except:
-        print '>>> %s | !!! ConnectionError, retrying...' % strftime(TIME)
-        sleep(2)
-        getPages(url)
-
-    main = s.split("<h1 class='colored'>Search Results</h1>")[1]
-
-    # get list of papers
-    pps = main.split(PPS_DELIM)[1:]
-    pps[-1] = pps[-1].split(PPS_DELIM_LAST)[0]
-
-    # iterate over each paper and append data to nodes and edges
-    for pp in pps:
-
-        # extract paper metadata
-        # pp_title = pp.split(PAPER_TITLE_START)[1].split(PAPER_TITLE_END)[0]
-        # pp_auth = pp.split(PAPER_AUTH_START)[1].split(PAPER_AUTH_END)[0]
-        pp_jel = pp.split(PAPER_JEL_START)[1].split(PAPER_JEL_END)[0].strip()
-        try:
-            pp_year = pp.split(PAPER_YEAR_START)[1].split(PAPER_YEAR_END)[0].strip().split("-")[0]
-        except:
-            pp_year = pp.split(PAPER_ALTYEAR_START)[1].split(PAPER_ALTYEAR_END)[0].strip().split("-")[0]
-
-        # remove unwanted JEL codes not in selected classification
-        codes = pp_jel.split()
-        new_codes = []
-        for idx in xrange(len(codes)):
-            if G.has_node(codes[idx]):
-                new_codes.append(codes[idx])
-
-        # add node data
-        addNodeData(G, pp_year, new_codes)
-
-        # add edge data
-        addEdgeData(G, pp_year, new_codes)
-
-
-def addNodeData(G, year, codes):
+    dates = [record[-1] for record in records]
+    records = [record[:-1] for record in records]
+    total = len(records)
+    # papers added before the watermark are in the network even if the paper index does not know them
+    records, dropped = tracker.recent(records, dates)
+    stats.count("recorded", dropped)
+    handles = ()
+    if papers is not None:
+        with stats.timer("dedup"):
+            records, handles, duplicates = dropDuplicates(papers, records)
+        stats.count("duplicates", duplicates)
+        dropped += duplicates
+    # the handles tie stored papers back to the database
+    stored = [record[2] for record in records] if paper_store is not None else None
+    records = [record[:2] for record in records]
+    if tracker.addPage(urlPage(url), dates, total, dropped):
+        print ">>> %s | Page %i reaches papers recorded before, no further pages are queued" % (strftime(TIME), urlPage(url))
+    stats.count("pages")
+    stats.count("papers", len(records))
+    with stats.timer("aggregate"):
+        counts.addRecords(records)
+    if paper_store is not None:
+        with stats.timer("store"):
+            paper_store.append(records, stored)
+    if journal is not None:
+        with stats.timer("journal"):
+            journal.recordPage(urlPage(url), records, handles, stored)
+    print ">>> %s | Parsed '%s'" % (strftime(TIME), url)
+
+
+def urlPage(url):
+    """
+    Page number of a database search URL
+
+    Args:
+        url - URL string ending in DB_SEARCH_PG and a page number
+
+    Return:
+        integer page number
+    """
+
+    return int(url.rsplit(DB_SEARCH_PG, 1)[1])
+
+
+def pageFailed(url, error):
     """
-    Add data from a single paper to node attributes
+    Report a page that could not be parsed
 
     Args:
-        G - nx.Graph() object
-        year - single year string
-        codes - list of JEL codes
+        url - URL string of the page
+        error - error description string
 
     Return:
         None
     """
 
-    for code in codes:
-        G.node[code]["citations"] += 1
-        if year in G.node[code]:
-            G.node[code][year] += 1
-        else:
-            G.node[code][year] = 1
+    stats.count("failed")
+    parse_failed.append(url)
+    print ">>> %s | !!! ParseError (%s), skipping '%s'" % (strftime(TIME), error, url)
 
 
-def addEdgeData(G, year, codes):
+def replayJournalPage(pg, records, handles):
     """
-    Add data from a single paper to edges
+    Add the records of a page completed in a previous run to the counts and the paper store
 
     Args:
-        G - nx.Graph() object
-        year - single year string
-        codes - list of JEL codes
+        pg - integer value of a database page
+        records - list of (year, codes) tuples
+        handles - list of the records' paper handles, None where the journal has none
 
     Return:
         None
     """
 
-    links = list(itertools.combinations(codes, 2))
-    for link in links:
+    counts.addRecords(records)
+    if paper_store is not None:
+        paper_store.append(records, handles)
 
-        # if edge already exists
-        if G.has_edge(link[0], link[1]):
 
-            # get edge info
-            data = G[link[0]][link[1]]
-            wg = data["weight"]
+def replayJournalHandles(handles):
+    """
+    Mark the papers of a page completed in a previous run as seen
 
-            # print "Setting weight: %s %s %i" % (link[0], link[1], wg)
+    Args:
+        handles - list of paper handle strings
 
-            # set new weight
-            G[link[0]][link[1]]["weight"] = wg + 1
+    Return:
+        None
+    """
 
-            # then, set new edge data
-            if EDGE_DATA:
-                if year in data:
-                    G[link[0]][link[1]][year] += 1
-                else:
-                    G[link[0]][link[1]][year] = 1
+    for handle in handles:
+        papers.add(handle)
 
-        # if edge does not already exist
-        else:
 
-            # print "Adding link: %s %s" % (link[0], link[1])
+def loadStoredNetwork(jel):
+    """
+    Read the network of an earlier crawl at OUTPUT_PATH to merge a delta crawl into
 
-            if EDGE_DATA:
-                G.add_edge(link[0], link[1], weight=1)
-                G[link[0]][link[1]][year] = 1
-            else:
-                G.add_edge(link[0], link[1], weight=1)
-        # print G.edge_data(link[0], link[1])
+    Args:
+        jel - dict of JEL code -> description of the chosen codes
+
+    Return:
+        nx.Graph() object with the crawler's raw attributes, and a node for every code
+    """
+
+    G = readGraph(OUTPUT_PATH)
+    for code in jel:
+        if code not in G:
+            G.add_node(code, description=jel[code], citations=0)
 
+    return G
 
-def networkxToZen(G):
+
+def deltaState(delta):
     """
-    Convert NetworkX graph to Zen graph
+    Delta state of the network at OUTPUT_PATH, checked when running a delta crawl
+
+    The state committed with the network store is newer than the state
+    file if a merge was interrupted after the store was swapped in; the
+    merge is then completed by archiving its journal, which would otherwise
+    be replayed into the network a second time.
 
     Args:
-        G - nx.Graph() object
+        delta - whether this run is a delta crawl
 
     Return:
-        zen.Graph() object
+        state dict (see delta_crawl.loadDeltaState) or None
     """
 
-    G_zen = zen.Graph()
-    for node in G.nodes_iter():
-        G_zen.add_node(node, data=G.node[node])
-    for e1,e2 in G.edges_iter():
-        G_zen.add_edge(e1, e2, data=G.edge[e1][e2], weight=G.edge[e1][e2]["weight"])
-    zen.io.gml.write(G_zen, "econs5_ALL_zen.gml", write_data=True)
+    state = loadDeltaState(OUTPUT_PATH + DELTA_EXT)
+    committed = (storeMeta(OUTPUT_PATH + STORE_EXT) or {}).get("delta")
+    if delta and committed is not None and committed["query"] == URL and committed != state:
+        if committed["merged"] > mergeNumber(OUTPUT_PATH) and os.path.exists(OUTPUT_PATH + DELTA_JOURNAL_EXT):
+            archiveJournal(OUTPUT_PATH + DELTA_JOURNAL_EXT, OUTPUT_PATH)
+        saveDeltaState(OUTPUT_PATH + DELTA_EXT, committed)
+        print ">>> %s | Completed the interrupted merge of delta crawl %i" % (strftime(TIME), committed["merged"])
+        state = committed
+    if state is not None and state["query"] != URL:
+        state = None
+    if delta and (state is None or not os.path.isdir(OUTPUT_PATH + STORE_EXT)):
+        raise IOError("No completed crawl of '%s' at '%s' to add a delta to" % (URL, OUTPUT_PATH))
+    return state
 
-    return G_zen
 
 #################################
 ###          RUNTIME          ###
@@ -304,8 +343,11 @@ def networkxToZen(G):
 
 # main sentinel
 def main():
-    # set workers
-    pool = Pool(THREADS_NUM)
+    # set crawl instrumentation and fetch scheduler
+    global stats
+    stats = CrawlStats(STATS_INTERVAL)
+    engine = CrawlEngine(concurrency=CONCURRENCY, rate=RATE_PER_HOST, burst=BURST,
+                         retries=RETRIES, backoff=BACKOFF, agent=AGENT, stats=stats)
 
     # init JEL dict and empty graph
     print ">>> %s | Initialising nodes..." % strftime(TIME)
@@ -316,28 +358,143 @@ def main():
         G.add_node(code, description=jel[code], citations=0)
     print ">>> %s | Initialisation complete" % strftime(TIME)
 
-    # add nodedata and edgedata to graph
-    if DEBUG:
-        pages = xrange(1, 6)
-        print ">>> %s | DEBUG MODE: Proceeding to parse first 5 pages..." % strftime(TIME)
+    # a delta crawl stops at the newest paper recorded by the previous run
+    global tracker
+    delta = DELTA and not REPLAY
+    state = deltaState(delta)
+    tracker = DeltaTracker(state["added"] if delta else None, delta, delta and state.get("indexed", False))
+    if delta:
+        print ">>> %s | DELTA MODE: Crawling papers added since %s..." % (strftime(TIME), state["added"])
+
+    # start parse workers before any fetch thread exists
+    global counts, journal, stage, cache, papers, paper_store, parse_failed
+    counts = BulkCounts(sorted(jel))
+    parse_failed = []
+    merged = mergeNumber(OUTPUT_PATH, delta)
+    paper_store = None
+    finishing = False
+    if delta and PaperStore.exists(OUTPUT_PATH + PAPERS_EXT):
+        # committed before the network, so a crashed delta crawl adds nothing to the store
+        paper_store = PaperStore(OUTPUT_PATH + PAPERS_EXT, sorted(jel), flush_papers=None)
+        # the store already holds this delta crawl: it was complete, only the network merge is left
+        finishing = paper_store.merged >= merged
+        if finishing:
+            paper_store = None
+            print ">>> %s | Finishing the interrupted merge of delta crawl %i from its journal" % (strftime(TIME), merged)
+    elif (STORE_PAPERS or DEDUP_PATH is not None) and not delta:
+        paper_store = PaperStore.create(OUTPUT_PATH + PAPERS_EXT, sorted(jel), nodes=sorted(jel))
+    papers = None
+    if (DEDUP or delta) and DEDUP_PATH is not None and not REPLAY:
+        papers = BloomFilter.forCapacity(DEDUP_CAPACITY, DEDUP_ERROR, DEDUP_PATH)
+        print ">>> %s | Loaded paper index with %i papers" % (strftime(TIME), len(papers))
+    elif DEDUP or delta:
+        papers = PaperSet()
+        if delta:
+            # papers of the full crawl and of merged delta crawls
+            for path in [OUTPUT_PATH + '.journal'] + mergedJournals(OUTPUT_PATH):
+                CrawlJournal(path, URL).replay(lambda pg, records, handles: None, replayJournalHandles)
+            print ">>> %s | Loaded paper index with %i papers" % (strftime(TIME), len(papers))
+    # a paper store keeps every code of its papers, the counts ignore codes outside jel
+    stage = ParseStage(None if paper_store is not None else frozenset(jel), pageParsed, pageFailed,
+                       PARSE_PROCESSES, PARSE_QUEUE, stats, handles=papers is not None or paper_store is not None, added=True)
+    cache = PageCache(CACHE_PATH) if CACHE_PAGES or REPLAY else None
+    stats.start()
+
+    if REPLAY:
+        # re-parse cached pages of this query at disk speed
+        journal = None
+        urls = sorted(cache.urls(URL), key=urlPage)
+        if DEBUG:
+            urls = [url for url in urls if urlPage(url) <= 5]
+        print ">>> %s | REPLAY MODE: Re-parsing %i cached pages..." % (strftime(TIME), len(urls))
+        for url in urls:
+            stage.submit(url, cache.get(url))
+        stage.close()
+        failed = list(parse_failed)
+
     else:
-        pages = xrange(1, getPages(URL) + 1)
-    pool.map(parseDbPageWrapper, pages)
-    pool.close()
-    pool.join()
-    print ">>> %s | Parsing completed!" % strftime(TIME)
-
-    # write to file
-    print ">>> %s | Now writing GEXF file at '%s.gexf'" % (strftime(TIME), OUTPUT_PATH)
-    nx.write_gexf(G, OUTPUT_PATH + '.gexf')
+        # replay pages completed by a previous run
+        journal = CrawlJournal(OUTPUT_PATH + (DELTA_JOURNAL_EXT if delta else '.journal'), URL)
+        done = set()
+        resume = RESUME or finishing
+        if resume and not finishing and journal.isComplete():
+            # every page of it is done: resuming would fetch nothing and write the old network again
+            print ">>> %s | Journal '%s' is of a finished crawl, starting afresh" % (strftime(TIME), journal.path)
+            resume = False
+        if resume:
+            done = journal.replay(replayJournalPage, replayJournalHandles if papers is not None else None)
+            print ">>> %s | Resumed %i completed pages from journal" % (strftime(TIME), len(done))
+        # not resuming: pages journaled by an earlier run must not be replayed by a later resume
+        journal.open(fresh=not resume)
+
+        # add nodedata and edgedata to graph
+        if finishing:
+            pages = []
+        elif DEBUG:
+            pages = tracker.pages(1, 5)
+            print ">>> %s | DEBUG MODE: Proceeding to parse first 5 pages..." % strftime(TIME)
+        else:
+            pages = tracker.pages(1, getPages(engine, URL))
+        failed = engine.map(parseDbPageWrapper, (URL + str(pg) for pg in pages if pg not in done))
+        stage.close()
+        failed = failed + parse_failed
+        journal.close()
+
+        # saved only once the journal is complete, so a crashed run never marks unjournaled papers as seen
+        if papers is not None:
+            papers.close()
+
+    if cache is not None:
+        cache.close()
+
+    # merge per-worker counts into the graph, or into the stored network for a delta crawl
+    with stats.timer("merge"):
+        shard = counts.toShard()
+        if delta:
+            G = loadStoredNetwork(jel)
+        addCountsToGraph(G, shard, EDGE_DATA)
+    stats.stop()
+    print ">>> %s | Parsing completed! (%i pages failed)" % (strftime(TIME), len(failed))
+    stats.summary()
+
+    # write to file: the paper store, then the network with the delta state (the commit point of a
+    # delta merge), then the journal and the state file, each recording the crawl's merge number
+    years = affectedYears(shard, storeYears(STORE_YEARS))
+    added, indexed = (state["added"], state.get("indexed", False)) if state else (None, False)
+    if delta and failed:
+        # the failed pages' papers are newer than the old watermark, the next delta crawl fetches them
+        print ">>> %s | Keeping the watermark at %s, %i pages failed" % (strftime(TIME), added, len(failed))
+    elif not delta or tracker.latest() != added:
+        added, indexed = tracker.latest(), papers is not None
+    new_state = {"query": URL, "added": added, "indexed": indexed, "updated": strftime(TIME),
+                 "affected_years": years, "merged": merged}
+    if paper_store is not None:
+        paper_store.close(None if REPLAY else merged)
+        print ">>> %s | Stored %i papers at '%s%s'" % (strftime(TIME), len(paper_store), OUTPUT_PATH, PAPERS_EXT)
+    print ">>> %s | Now writing network store at '%s%s'" % (strftime(TIME), OUTPUT_PATH, STORE_EXT)
+    writeNetwork(G, OUTPUT_PATH, "", STORE_YEARS, OUTPUT_GEXF, None if REPLAY else {"delta": new_state})
+    if not REPLAY:
+        if not failed:
+            # a later run starts afresh instead of replaying every page as done
+            journal.complete()
+        elif not delta:
+            print ">>> %s | Journal left open, a resumed run fetches the %i failed pages" % (strftime(TIME), len(failed))
+        if delta:
+            # merged: later delta crawls start afresh and only read the archived journal's handles
+            archiveJournal(journal.path, OUTPUT_PATH)
+            print ">>> %s | Merged new papers into '%s%s', years affected: %s" % (
+                strftime(TIME), OUTPUT_PATH, STORE_EXT, ", ".join(str(y) for y in years) or "none")
+        saveDeltaState(OUTPUT_PATH + DELTA_EXT, new_state)
     if OUTPUT_ZEN_GML:
-        G_zen = networkxToZen(G)
         print ">>> %s | Now writing GML file at '%s.gml'" % (strftime(TIME), OUTPUT_PATH)
-        zen.io.gml.write(G_zen, OUTPUT_PATH + '.gml', write_data=True, use_zen_data=True)
+        writeZenGml(G, OUTPUT_PATH + '.gml', use_zen_data=True)
     print ">>> %s | All done!" % strftime(TIME)
 
     return
 
 
 if __name__ == "__main__":
-    main()
+    if PROFILE_PATH is not None:
+        profileCall(main, PROFILE_PATH)
+    else:
+        main()
@@ -0,0 +1,386 @@
+# -*- coding: utf-8 -*-
+
+import cPickle as pickle
+import hashlib
+import multiprocessing
+import os
+import Queue
+import traceback
+
+import numpy as np
+import scipy.sparse as sp
+
+from centrality import sparseEigenvector, sparsePageRank, topNodes
+from clustering import averageClustering
+from cotag_tensor import CoTagTensor, weightedAdjacency
+from edge_weights import topNeighbourSeries
+from graph_arrays import degreeVector, groupLabels, letterGroups
+from modularity import sparseModularity
+from path_metrics import pathMetrics
+
+# Python docs: https://docs.python.org/2/library/multiprocessing.html
+
+
+################################
+###     GLOBAL VARIABLES     ###
+################################
+
+# Name under which a report's tasks receive the graph variant (a CoTagTensor)
+GRAPH = "graph"
+
+# Status of a task result
+COMPUTED = "computed"
+CACHED = "cached"
+FAILED = "failed"
+
+
+#################################
+###     UTILITY FUNCTIONS     ###
+#################################
+
+class Task(object):
+    """
+    One step of a report
+
+    Shared tasks build cheap structures (adjacency matrices, degree vectors)
+    in the calling process; a result is identified by the hash of its
+    content. Other tasks are metrics, run in the process pool and cached
+    on disk under the hash of their name, version, arguments and the
+    identities of their inputs, so a metric is only recomputed when an
+    input it reads has changed.
+
+    Args:
+        name - task name, unique in a report
+        func - module-level function called with the results of deps followed by args
+        deps - names of the tasks (or GRAPH) whose results func takes
+        args - tuple of further picklable arguments
+        shared - whether the task is a shared structure rather than a metric
+        version - bump to invalidate cached results when func changes
+    """
+
+    def __init__(self, name, func, deps=(GRAPH,), args=(), shared=False, version=1):
+        self.name = name
+        self.func = func
+        self.deps = tuple(deps)
+        self.args = tuple(args)
+        self.shared = shared
+        self.version = version
+
+
+def updateHash(h, value):
+    """Feed a value (arrays, sparse matrices, tensors and nested containers) into a hash object"""
+    if isinstance(value, CoTagTensor):
+        updateHash(h, ("CoTagTensor", value.nodes, value.years, value.edges, value.edge_counts,
+                       value.node_counts, value.edge_total, value.node_total))
+    elif sp.issparse(value):
+        value = value.tocsr()
+        updateHash(h, ("csr", value.shape, value.indptr, value.indices, value.data))
+    elif isinstance(value, np.ndarray):
+        h.update("ndarray %s %r:" % (value.dtype.str, value.shape))
+        h.update(np.ascontiguousarray(value).tobytes())
+    elif isinstance(value, (list, tuple)):
+        h.update("%s %i:" % (type(value).__name__, len(value)))
+        for item in value:
+            updateHash(h, item)
+    elif isinstance(value, dict):
+        updateHash(h, ("dict", sorted(value.items())))
+    else:
+        h.update("%s %r;" % (type(value).__name__, value))
+
+
+def contentHash(*values):
+    """SHA-1 hex digest of the content of values"""
+    h = hashlib.sha1()
+    for value in values:
+        updateHash(h, value)
+    return h.hexdigest()
+
+
+def taskOrder(tasks):
+    """
+    Tasks sorted so that every task comes after its dependencies
+
+    Args:
+        tasks - list of Task objects
+
+    Return:
+        list of Task objects
+    """
+
+    by_name = dict((task.name, task) for task in tasks)
+    if len(by_name) != len(tasks) or GRAPH in by_name:
+        raise ValueError("Task names must be unique and differ from '%s'" % GRAPH)
+
+    order, state = [], {}
+
+    def visit(task, path):
+        if state.get(task.name) == "done":
+            return
+        if state.get(task.name) == "visiting":
+            raise ValueError("Task dependency cycle: %s" % " -> ".join(path + [task.name]))
+        state[task.name] = "visiting"
+        for dep in task.deps:
+            if dep == GRAPH:
+                continue
+            if dep not in by_name:
+                raise ValueError("Task '%s' depends on unknown task '%s'" % (task.name, dep))
+            visit(by_name[dep], path + [task.name])
+        state[task.name] = "done"
+        order.append(task)
+
+    for task in tasks:
+        visit(task, [])
+
+    return order
+
+
+def runTask(func, inputs):
+    """Call a task function in a worker, returning (value, None) or (None, traceback string)"""
+    try:
+        return func(*inputs), None
+    except Exception:
+        return None, traceback.format_exc()
+
+
+class ResultCache(object):
+    """
+    Task results pickled on disk at <root>/<key[:2]>/<key>.pickle
+
+    Args:
+        root - cache directory, created if missing; None keeps nothing
+    """
+
+    def __init__(self, root):
+        self.root = root
+
+    def path(self, key):
+        """File of a key"""
+        return os.path.join(self.root, key[:2], key + ".pickle")
+
+    def get(self, key):
+        """
+        Cached result of a key
+
+        Return:
+            tuple of (found, value)
+        """
+
+        if self.root is None or not os.path.exists(self.path(key)):
+            return False, None
+        try:
+            with open(self.path(key), "rb") as f:
+                return True, pickle.load(f)
+        except (EOFError, pickle.UnpicklingError):
+            return False, None
+
+    def put(self, key, value):
+        """Store a result atomically"""
+        if self.root is None:
+            return
+        path = self.path(key)
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        tmp = "%s.%i.tmp" % (path, os.getpid())
+        with open(tmp, "wb") as f:
+            pickle.dump(value, f, pickle.HIGHEST_PROTOCOL)
+        os.rename(tmp, path)
+
+
+def runReport(variants, tasks, cache_dir=None, processes=None):
+    """
+    Run a report's tasks over graph variants, metrics in parallel
+
+    Shared structures are built in this process as soon as their inputs
+    exist; metrics whose inputs are unchanged since an earlier run are read
+    from the cache, the others go to one process pool shared by all
+    variants. A failed task is reported and its dependants are skipped.
+
+    Args:
+        variants - dict of variant name -> CoTagTensor object
+        tasks - list of Task objects
+        cache_dir - optional directory of cached metric results
+        processes - number of worker processes, 1 to stay in this process, None for all CPUs
+
+    Return:
+        tuple of (dict of variant -> dict of task name -> result, dict of variant ->
+        dict of task name -> COMPUTED, CACHED, or FAILED plus the error)
+    """
+
+    order = taskOrder(tasks)
+    cache = ResultCache(cache_dir)
+    values = dict((v, {GRAPH: variants[v]}) for v in variants)
+    keys = dict((v, {GRAPH: contentHash(variants[v])}) for v in variants)
+    status = dict((v, {}) for v in variants)
+
+    if processes is None:
+        processes = multiprocessing.cpu_count()
+    pool = multiprocessing.Pool(processes) if processes > 1 else None
+    done = Queue.Queue()
+    running = 0
+
+    def finish(variant, task, key, value, error):
+        if error is not None:
+            status[variant][task.name] = "%s: %s" % (FAILED, error.strip().splitlines()[-1])
+            return
+        values[variant][task.name] = value
+        keys[variant][task.name] = contentHash(value) if task.shared else key
+        if not task.shared and task.name not in status[variant]:
+            cache.put(key, value)
+            status[variant][task.name] = COMPUTED
+
+    try:
+        pending = [(variant, task) for variant in sorted(variants) for task in order]
+        while pending or running:
+            waiting = []
+            for variant, task in pending:
+                failed = [dep for dep in task.deps if status[variant].get(dep, "").startswith(FAILED)]
+                if failed:
+                    status[variant][task.name] = "%s: input '%s' failed" % (FAILED, failed[0])
+                    continue
+                if any(dep not in keys[variant] for dep in task.deps):
+                    waiting.append((variant, task))
+                    continue
+
+                inputs = [values[variant][dep] for dep in task.deps] + list(task.args)
+                key = contentHash(task.name, task.version, task.args, [keys[variant][dep] for dep in task.deps])
+                found, value = (False, None) if task.shared else cache.get(key)
+                if found:
+                    status[variant][task.name] = CACHED
+                    finish(variant, task, key, value, None)
+                elif task.shared or pool is None:
+                    finish(variant, task, key, *runTask(task.func, inputs))
+                else:
+                    pool.apply_async(runTask, (task.func, inputs),
+                                     callback=lambda result, job=(variant, task, key): done.put(job + result))
+                    running += 1
+
+            if not running and waiting and len(waiting) == len(pending):
+                raise RuntimeError("Report tasks cannot make progress")
+            # wait for a metric only when nothing else can start
+            if running and (len(waiting) == len(pending) or not waiting):
+                finish(*done.get())
+                running -= 1
+                while not done.empty():
+                    finish(*done.get())
+                    running -= 1
+            pending = waiting
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+    results = dict((v, dict((name, value) for name, value in values[v].items() if name != GRAPH)) for v in variants)
+    return results, status
+
+
+def snapshotVariants(tensor, years):
+    """
+    Cumulative yearly snapshots of a network as graph variants
+
+    Args:
+        tensor - CoTagTensor object
+        years - list of "up to" years
+
+    Return:
+        dict of "upto<year>" -> CoTagTensor object of the nodes with papers and the edges
+        present up to that year, whose totals are the weights up to that year
+    """
+
+    variants = {}
+    for year in years:
+        k = tensor.yearIndex(year) + 1
+        keep = tensor.edgeWeightsUpTo(year) > 0
+        edges = tensor.edges[keep]
+
+        # codes without papers yet are not part of the snapshot
+        present = tensor.nodeWeightsUpTo(year) > 0
+        present[edges.ravel()] = True
+        ids = np.cumsum(present) - 1
+        nodes = [code for code, p in zip(tensor.nodes, present) if p]
+        node_data = [data for data, p in zip(tensor.node_data, present) if p]
+
+        variants["upto%s" % year] = CoTagTensor(nodes, tensor.years[:k], ids[edges].astype(edges.dtype),
+                                                tensor.edge_counts[keep, :k], tensor.node_counts[present, :k],
+                                                node_data=node_data,
+                                                edge_fold=None if tensor.edge_fold is None else tensor.edge_fold[keep],
+                                                node_fold=None if tensor.node_fold is None else tensor.node_fold[present])
+    return variants
+
+
+def binaryAdjacency(tensor):
+    """Adjacency matrix, every edge (even of zero weight) counting 1"""
+    return weightedAdjacency(tensor.edges, np.ones(len(tensor.edges)), len(tensor.nodes), False)
+
+
+def weightAdjacency(tensor):
+    """Adjacency matrix of overall edge weights"""
+    return tensor.adjacency()
+
+
+def nodeList(tensor):
+    """Node codes, position is the node id"""
+    return tensor.nodes
+
+
+def nodeGroups(nodes, groups=None):
+    """Group label of every node and the group names, by top-level JEL letter if groups is None"""
+    return groupLabels(nodes, letterGroups(nodes) if groups is None else groups)
+
+
+def meanValue(x):
+    """Mean of an array"""
+    return float(np.mean(x)) if len(x) else 0.0
+
+
+def labelModularity(A, groups, degrees):
+    """(Q, Qmax) of a grouping given as (labels, names)"""
+    labels, names = groups
+    Q, Qmax, _, _ = sparseModularity(A, labels, len(names), degrees)
+    return Q, Qmax
+
+
+def pathReport(A):
+    """(diameter, average shortest path length), inside the worker process"""
+    return pathMetrics(A, processes=1)
+
+
+def eigenvectorReport(nodes, A, k=10):
+    """Top k nodes by eigenvector centrality and the solver diagnostics"""
+    x, info = sparseEigenvector(A)
+    return topNodes(nodes, x, k), info
+
+
+def pageRankReport(nodes, A, k=10):
+    """Top k nodes by PageRank and the number of iterations"""
+    x, iterations = sparsePageRank(A)
+    return topNodes(nodes, x, k), iterations
+
+
+def reportTasks(groups=None):
+    """
+    Tasks of the metrics printed by calc_metrics, with the structures they share
+
+    Args:
+        groups - optional dict of group name -> list of codes for modularity, top-level letters by default
+
+    Return:
+        list of Task objects
+    """
+
+    return [
+        Task("nodes", nodeList, shared=True),
+        Task("adjacency", binaryAdjacency, shared=True),
+        Task("weighted", weightAdjacency, shared=True),
+        Task("groups", nodeGroups, ("nodes",), (groups,), shared=True),
+        Task("degree", degreeVector, ("adjacency",), shared=True),
+        Task("weighted_degree", degreeVector, ("weighted",), shared=True),
+        Task("average_degree", meanValue, ("degree",)),
+        Task("average_weighted_degree", meanValue, ("weighted_degree",)),
+        Task("clustering", averageClustering, ("adjacency",)),
+        Task("weighted_clustering", averageClustering, ("weighted",), (True,)),
+        Task("modularity", labelModularity, ("adjacency", "groups", "degree")),
+        Task("paths", pathReport, ("adjacency",)),
+        Task("eigenvector", eigenvectorReport, ("nodes", "weighted")),
+        Task("pagerank", pageRankReport, ("nodes", "weighted")),
+        Task("normalised_weights", topNeighbourSeries),
+    ]
@@ -0,0 +1,154 @@
+# -*- coding: utf-8 -*-
+
+import numpy as np
+import scipy.sparse as sp
+
+from cotag_tensor import CoTagTensor, INDEX_DTYPE
+from graph_arrays import groupLabels
+
+# SciPy docs:    https://docs.scipy.org/doc/scipy/reference/sparse.html
+
+
+################################
+###     GLOBAL VARIABLES     ###
+################################
+
+# Built-in grouping levels of JEL codes ("F14")
+LEVELS = {
+    "letter": lambda code: code[:1],        # top-level category, "F"
+    "subcategory": lambda code: code[:2]}   # second level, "F1"
+
+
+#################################
+###     UTILITY FUNCTIONS     ###
+#################################
+
+class Rollup(object):
+    """
+    Co-tagging network collapsed onto groups of JEL codes, with drill-down
+
+    Group edges are unordered pairs of groups; a pair of codes inside the
+    same group contributes to that group's self-loop. Per-year counts are
+    summed with one sparse matrix product per array, so node counts of a
+    group are the number of code taggings of its members.
+
+    Attributes:
+        base - CoTagTensor of the code network
+        tensor - CoTagTensor of the group network (nodes are group names)
+        labels - (N,) int array of the group id of every code, -1 if ungrouped
+    """
+
+    def __init__(self, base, groups):
+        self.base = base
+        self.labels, names = groupLabels(base.nodes, groups)
+        k = len(names)
+        grouped = self.labels >= 0
+
+        # node contraction: (K, N) membership matrix
+        P = sp.csr_matrix((np.ones(grouped.sum()), (self.labels[grouped], np.flatnonzero(grouped))),
+                          shape=(k, len(base.nodes)))
+        node_counts = P.dot(base.node_counts)
+        node_total = P.dot(base.node_total)
+
+        # edge contraction: each code edge maps to one unordered group pair
+        gu, gv = self.labels[base.edges[:, 0]], self.labels[base.edges[:, 1]]
+        keep = np.flatnonzero((gu >= 0) & (gv >= 0))
+        lo, hi = np.minimum(gu[keep], gv[keep]), np.maximum(gu[keep], gv[keep])
+        pairs, inverse = np.unique(lo.astype(np.int64) * k + hi, return_inverse=True)
+        M = sp.csr_matrix((np.ones(len(keep)), (inverse, keep)), shape=(len(pairs), len(base.edges)))
+        edge_counts = M.dot(base.edge_counts)
+        edge_total = M.dot(base.edge_total)
+        edges = np.column_stack((pairs // k, pairs % k)).astype(INDEX_DTYPE)
+
+        # drill-down index: code edges of every group edge, contiguous after sorting
+        order = np.argsort(inverse, kind="mergesort")
+        self.member_edges = keep[order]
+        self.member_offsets = np.concatenate(([0], np.cumsum(np.bincount(inverse, minlength=len(pairs)))))
+
+        node_data = [{"members": int(c)} for c in np.bincount(self.labels[grouped], minlength=k)]
+        self.tensor = CoTagTensor(names, base.years, edges, edge_counts, node_counts,
+                                  edge_total=edge_total, node_total=node_total, node_data=node_data,
+                                  edge_fold=None if base.edge_fold is None else M.dot(base.edge_fold),
+                                  node_fold=None if base.node_fold is None else P.dot(base.node_fold))
+
+    def strengthSeries(self, cumulative=True):
+        """
+        Weighted degree of every group for every year, in one sparse product
+
+        Args:
+            cumulative - count papers up to each year instead of within it
+
+        Return:
+            (K, Y) array, edges inside a group count twice as in degreeVector
+        """
+
+        t = self.tensor
+        k, e = len(t.nodes), len(t.edges)
+        ends = np.concatenate((t.edges[:, 0], t.edges[:, 1]))
+        S = sp.csr_matrix((np.ones(2 * e), (ends, np.tile(np.arange(e), 2))), shape=(k, e))
+        counts = t.cumulativeEdgeCounts() if cumulative else t.edge_counts
+
+        return S.dot(counts)
+
+    def members(self, group):
+        """
+        JEL codes in a group
+
+        Args:
+            group - group name
+
+        Return:
+            list of JEL codes
+        """
+
+        k = self.tensor.index[group]
+        return [self.base.nodes[i] for i in np.flatnonzero(self.labels == k)]
+
+    def groupEdge(self, group_a, group_b):
+        """Position of the edge between two groups in self.tensor.edges, or None"""
+        a, b = sorted((self.tensor.index[group_a], self.tensor.index[group_b]))
+        e = np.searchsorted(self.tensor.edges[:, 0] * len(self.tensor.nodes) + self.tensor.edges[:, 1],
+                            a * len(self.tensor.nodes) + b)
+        if e < len(self.tensor.edges) and tuple(self.tensor.edges[e]) == (a, b):
+            return e
+        return None
+
+    def drillDown(self, group_a, group_b):
+        """
+        Code edges that make up the edge between two groups
+
+        Args:
+            group_a - group name
+            group_b - group name, equal to group_a for edges inside a group
+
+        Return:
+            (M,) int array of edge positions in self.base.edges
+        """
+
+        e = self.groupEdge(group_a, group_b)
+        if e is None:
+            return np.zeros(0, dtype=np.int64)
+        return self.member_edges[self.member_offsets[e]:self.member_offsets[e + 1]]
+
+
+def rollUp(tensor, level="letter"):
+    """
+    Collapse the code network onto a coarser level of the JEL hierarchy
+
+    Args:
+        tensor - CoTagTensor of the code network
+        level - "letter", "subcategory", or a dict of group name -> list of codes
+
+    Return:
+        Rollup object
+    """
+
+    if isinstance(level, dict):
+        groups = level
+    else:
+        key = LEVELS[level]
+        groups = {}
+        for code in tensor.nodes:
+            groups.setdefault(key(code), []).append(code)
+
+    return Rollup(tensor, groups)
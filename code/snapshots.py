@@ -0,0 +1,226 @@
+# -*- coding: utf-8 -*-
+
+import numpy as np
+
+from cotag_tensor import weightedAdjacency
+
+
+#################################
+###     UTILITY FUNCTIONS     ###
+#################################
+
+def windowSum(cum, years, start, end, fold=None):
+    """
+    Counts of a year window from cumulative counts
+
+    A window starting at the first year leaves out the papers of earlier
+    years folded into that column. A window starting before it cannot tell
+    which of them fall inside, so it is rejected when any were folded.
+
+    Args:
+        cum - (R, Y) array of cumulative counts
+        years - list of years of the columns
+        start - first year of the window, None for everything before end
+        end - last year of the window
+        fold - optional (R,) array of the counts folded into the first column
+
+    Return:
+        (R,) read-only array, a view of cum when start is None
+    """
+
+    first, last = years[0], years[-1]
+    if start is not None and int(start) < first and fold is not None and fold.any():
+        raise ValueError("Window %s-%s starts before %s, whose column holds papers of earlier years"
+                         % (start, end, first))
+    if int(end) < first or (start is not None and int(start) > last):
+        out = np.zeros(cum.shape[0], dtype=cum.dtype)
+    else:
+        out = cum[:, min(int(end), last) - first]
+        if start is not None and int(start) > first:
+            out = out - cum[:, int(start) - 1 - first]
+        elif start is not None and fold is not None:
+            out = out - fold
+    out.flags.writeable = False
+
+    return out
+
+
+class SnapshotView(object):
+    """
+    Read-only view of the network over a window of years
+
+    Edge and node weights are the paper counts inside the window; an edge
+    is present when its weight is non-zero. The view holds no copy of the
+    network, only two weight vectors read off the store's cumulative arrays.
+
+    Attributes:
+        store - SnapshotStore the view belongs to
+        start - first year of the window, None for a cumulative "up to" view
+        end - last year of the window, None (with start None) for the overall totals
+        edge_weights - (E,) read-only array aligned with store.tensor.edges
+        node_weights - (N,) read-only array aligned with store.tensor.nodes
+    """
+
+    def __init__(self, store, start, end):
+        t = store.tensor
+        self.store = store
+        self.start = start
+        self.end = end
+        if end is None:
+            # papers of every year, also those outside the year axis
+            self.edge_weights, self.node_weights = t.edge_total.view(), t.node_total.view()
+            self.edge_weights.flags.writeable = self.node_weights.flags.writeable = False
+        else:
+            self.edge_weights = windowSum(t.cumulativeEdgeCounts(), t.years, start, end, t.edge_fold)
+            self.node_weights = windowSum(t.cumulativeNodeCounts(), t.years, start, end, t.node_fold)
+
+    def __len__(self):
+        return len(self.store.tensor.nodes)
+
+    def __contains__(self, code):
+        return code in self.store.tensor.index
+
+    def __getitem__(self, code):
+        """Neighbours of a node as {neighbour: {"weight": w}}, like G[code]"""
+        return dict((nbr, {"weight": w}) for nbr, w in self.neighbourWeights(code))
+
+    def size(self, weight=None):
+        """Number of edges, or their total weight if weight is not None"""
+        if weight is None:
+            return int(np.count_nonzero(self.edge_weights))
+        return int(self.edge_weights.sum())
+
+    def nodes(self):
+        return list(self.store.tensor.nodes)
+
+    def edges_iter(self, data=False):
+        """Iterate over edges with non-zero weight, like G.edges_iter()"""
+        nodes = self.store.tensor.nodes
+        active = np.flatnonzero(self.edge_weights)
+        for (u, v), w in zip(self.store.tensor.edges[active].tolist(), self.edge_weights[active].tolist()):
+            if data:
+                yield nodes[u], nodes[v], {"weight": w}
+            else:
+                yield nodes[u], nodes[v]
+
+    def citations(self, code):
+        """Weight of a node (its "citations") inside the window"""
+        return int(self.node_weights[self.store.tensor.index[code]])
+
+    def weight(self, u, v):
+        """Weight of an edge inside the window, 0 if absent"""
+        e = self.store.edgeId(u, v)
+        return 0 if e < 0 else int(self.edge_weights[e])
+
+    def has_edge(self, u, v):
+        return self.weight(u, v) > 0
+
+    def neighbourWeights(self, code):
+        """
+        Neighbours of a node with their edge weights inside the window
+
+        Args:
+            code - JEL code
+
+        Return:
+            list of (neighbour code, weight) tuples
+        """
+
+        nbrs, eids = self.store.incident(code)
+        w = self.edge_weights[eids]
+        keep = w > 0
+        nodes = self.store.tensor.nodes
+        return [(nodes[j], c) for j, c in zip(nbrs[keep].tolist(), w[keep].tolist())]
+
+    def neighbors(self, code):
+        return [nbr for nbr, _ in self.neighbourWeights(code)]
+
+    def degree(self, code, weight=None):
+        """Degree of a node, or its weighted degree if weight is not None"""
+        nbrs, eids = self.store.incident(code)
+        w = self.edge_weights[eids]
+        loops = w[nbrs == self.store.tensor.index[code]]
+        if weight is None:
+            return int(np.count_nonzero(w) + np.count_nonzero(loops))
+        return int(w.sum() + loops.sum())
+
+    def adjacency(self, weighted=True):
+        """
+        Symmetric sparse adjacency matrix of the view
+
+        Args:
+            weighted - if False, every edge counts as 1
+
+        Return:
+            (N, N) scipy.sparse.csr_matrix indexed by node id
+        """
+
+        t = self.store.tensor
+        return weightedAdjacency(t.edges, self.edge_weights, len(t.nodes), weighted)
+
+
+class SnapshotStore(object):
+    """
+    Year and window views of a co-tagging network, in any order
+
+    The cumulative count arrays and a node -> incident edge index are built
+    once and shared by every view; the tensor is never modified.
+
+    Args:
+        tensor - CoTagTensor object
+    """
+
+    def __init__(self, tensor):
+        self.tensor = tensor
+        tensor.cumulativeEdgeCounts()
+        tensor.cumulativeNodeCounts()
+
+        # incident edges of every node in CSR form, self-loops listed once
+        u, v = tensor.edges[:, 0], tensor.edges[:, 1]
+        eid = np.arange(len(tensor.edges))
+        off = u != v
+        rows = np.concatenate([u, v[off]])
+        order = np.argsort(rows, kind="mergesort")
+        self.nbrs = np.concatenate([v, u[off]])[order]
+        self.eids = np.concatenate([eid, eid[off]])[order]
+        self.indptr = np.concatenate(([0], np.cumsum(np.bincount(rows, minlength=len(tensor.nodes)))))
+
+    def incident(self, code):
+        """(neighbour ids, edge ids) of every edge of a node, in any year"""
+        i = self.tensor.index[code]
+        lo, hi = self.indptr[i], self.indptr[i + 1]
+        return self.nbrs[lo:hi], self.eids[lo:hi]
+
+    def edgeId(self, u, v):
+        """Position of an edge in tensor.edges, -1 if the codes were never co-tagged"""
+        nbrs, eids = self.incident(u)
+        hit = np.flatnonzero(nbrs == self.tensor.index[v])
+        return int(eids[hit[0]]) if len(hit) else -1
+
+    def upTo(self, year):
+        """View of the network with all papers up to and including a year"""
+        return SnapshotView(self, None, year)
+
+    def overall(self):
+        """View of the network with the overall weights ("weight" and "citations" attributes)"""
+        return SnapshotView(self, None, None)
+
+    def window(self, start, end):
+        """View of the network with the papers of years start to end inclusive"""
+        return SnapshotView(self, start, end)
+
+    def slidingWindows(self, width, step=1):
+        """
+        Views of consecutive windows over the year axis
+
+        Args:
+            width - number of years per window
+            step - years between window starts
+
+        Return:
+            generator of SnapshotView objects
+        """
+
+        years = self.tensor.years
+        for start in xrange(years[0], years[-1] - width + 2, step):
+            yield self.window(start, start + width - 1)
@@ -0,0 +1,173 @@
+# -*- coding: utf-8 -*-
+
+import numpy as np
+
+from page_parser import RESULTS_START
+
+
+################################
+###     GLOBAL VARIABLES     ###
+################################
+
+# Rough share of papers per top-level JEL category
+LETTER_SHARE = {
+    "A": 0.010, "B": 0.015, "C": 0.120, "D": 0.130, "E": 0.090, "F": 0.070,
+    "G": 0.110, "H": 0.060, "I": 0.060, "J": 0.080, "K": 0.020, "L": 0.060,
+    "M": 0.020, "N": 0.020, "O": 0.080, "P": 0.015, "Q": 0.060, "R": 0.030}
+
+# Distribution of the number of JEL codes per paper (1 to 6)
+CODES_PER_PAPER = (0.20, 0.32, 0.26, 0.13, 0.06, 0.03)
+
+# Chance that each further code of a paper comes from the same category as its first code
+SAME_LETTER = 0.55
+
+# Zipf exponent of code popularity inside a category
+CODE_ZIPF = 1.1
+
+# Publication years and yearly growth of the number of papers
+FIRST_YEAR = 1990
+LAST_YEAR = 2016
+GROWTH = 1.06
+
+# Share of papers listed with "Modified:" instead of "Revised:"
+MODIFIED_SHARE = 0.1
+
+
+#################################
+###     UTILITY FUNCTIONS     ###
+#################################
+
+class SyntheticCorpus(object):
+    """
+    Deterministic generator of econpapers-like papers and search result pages
+
+    Codes are drawn with realistic skew: categories by LETTER_SHARE, codes
+    inside a category by a Zipf law, and further codes of a paper mostly
+    from the category of its first code. Papers come out as ragged arrays,
+    so millions of them fit in memory.
+
+    Args:
+        codes - list of JEL codes, e.g. JelTaxonomy.codes
+        seed - random seed, the same seed gives the same corpus
+    """
+
+    def __init__(self, codes, seed=0):
+        self.codes = sorted(codes)
+        self.seed = seed
+        letters = [code[0] for code in self.codes]
+
+        # code probabilities: category share split by Zipf rank inside the category
+        rs = np.random.RandomState(seed)
+        weights = np.zeros(len(self.codes))
+        self.letter_span = {}
+        for letter in sorted(set(letters)):
+            start = letters.index(letter)
+            stop = len(letters) - letters[::-1].index(letter)
+            rank = rs.permutation(stop - start) + 1
+            zipf = 1.0 / rank ** CODE_ZIPF
+            weights[start:stop] = LETTER_SHARE.get(letter, 0.01) * zipf / zipf.sum()
+            self.letter_span[letter] = (start, stop)
+        self.cdf = np.cumsum(weights / weights.sum())
+        self.letter_of = np.array([sorted(self.letter_span).index(l) for l in letters])
+        spans = [self.letter_span[l] for l in sorted(self.letter_span)]
+        self.span_start = np.array([start for start, _ in spans])
+        self.span_stop = np.array([stop for _, stop in spans])
+
+        years = np.arange(FIRST_YEAR, LAST_YEAR + 1)
+        growth = GROWTH ** (years - FIRST_YEAR)
+        self.years = years
+        self.year_p = growth / growth.sum()
+
+    def paperArrays(self, n, seed=None):
+        """
+        Generate papers as ragged arrays
+
+        Args:
+            n - number of papers
+            seed - optional random seed, defaults to the corpus seed
+
+        Return:
+            tuple of ((n,) int array of years, (n + 1,) offsets, code id array), paper i
+            has codes ids[offsets[i]:offsets[i + 1]], without repeats
+        """
+
+        rs = np.random.RandomState(self.seed if seed is None else seed)
+        years = rs.choice(self.years, n, p=self.year_p)
+        k = rs.choice(np.arange(1, len(CODES_PER_PAPER) + 1), n, p=CODES_PER_PAPER)
+        offsets = np.concatenate(([0], np.cumsum(k)))
+        total = offsets[-1]
+
+        # first code of every paper from the global distribution
+        first = np.searchsorted(self.cdf, rs.random_sample(n), side="right")
+        first = np.minimum(first, len(self.codes) - 1)
+        ids = np.searchsorted(self.cdf, rs.random_sample(total), side="right")
+        ids = np.minimum(ids, len(self.codes) - 1)
+        ids[offsets[:-1]] = first
+
+        # further codes: some redrawn from the first code's category
+        paper = np.repeat(np.arange(n), k)
+        same = rs.random_sample(total) < SAME_LETTER
+        same[offsets[:-1]] = False
+        lt = self.letter_of[first[paper[same]]]
+        lo, hi = self.span_start[lt], self.span_stop[lt]
+        cdf_lo = np.where(lo > 0, self.cdf[np.maximum(lo - 1, 0)], 0.0)
+        target = cdf_lo + rs.random_sample(len(lt)) * (self.cdf[hi - 1] - cdf_lo)
+        ids[same] = np.clip(np.searchsorted(self.cdf, target, side="right"), lo, hi - 1)
+
+        # drop repeated codes inside a paper
+        order = np.lexsort((ids, paper))
+        ids, paper = ids[order], paper[order]
+        keep = np.ones(total, dtype=bool)
+        keep[1:] = (paper[1:] != paper[:-1]) | (ids[1:] != ids[:-1])
+        ids, paper = ids[keep], paper[keep]
+        offsets = np.concatenate(([0], np.cumsum(np.bincount(paper, minlength=n))))
+
+        return years, offsets, ids
+
+    def records(self, n, seed=None):
+        """
+        Generate papers as parsed page records
+
+        Args:
+            n - number of papers
+            seed - optional random seed, defaults to the corpus seed
+
+        Return:
+            list of (year string, codes tuple) tuples
+        """
+
+        years, offsets, ids = self.paperArrays(n, seed)
+        codes = self.codes
+        ids = ids.tolist()
+        offsets = offsets.tolist()
+        return [(str(y), tuple(codes[j] for j in ids[offsets[i]:offsets[i + 1]]))
+                for i, y in enumerate(years.tolist())]
+
+    def pages(self, n, per_page=100, seed=None):
+        """
+        Render papers as econpapers search result pages
+
+        Args:
+            n - number of papers
+            per_page - papers per page
+            seed - optional random seed, defaults to the corpus seed
+
+        Return:
+            generator of HTML strings
+        """
+
+        records = self.records(n, seed)
+        pages = (n + per_page - 1) // per_page
+        modified = np.random.RandomState(self.seed if seed is None else seed).random_sample(n) < MODIFIED_SHARE
+        for pg in xrange(pages):
+            items = []
+            for i in xrange(pg * per_page, min(n, (pg + 1) * per_page)):
+                year, codes = records[i]
+                if modified[i]:
+                    date = "<b>Modified:</b> %s-03-01</small>" % year
+                else:
+                    date = "<b>Revised:</b> %s-01<b>Added</b> %s-02-03</small>" % (year, year)
+                items.append("<li><a href='/paper/syn/p%07i.htm'>Paper %i</a><br><i>Author %i</i><br>"
+                             "<small><b>JEL-codes:</b> %s<br>%s" % (i, i, i % 997, " ".join(codes), date))
+            yield ("<html><body>%s<br>Documents %i-%i of %i pages<ol>%s</ol></body></html>" % (
+                RESULTS_START, pg * per_page + 1, min(n, (pg + 1) * per_page), pages, "".join(items)))
@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+
+import unittest
+
+import networkx as nx
+import numpy as np
+
+from centrality import eigenvectorSeries
+from cotag_tensor import CoTagTensor
+
+# NetworkX docs: https://networkx.github.io/documentation/latest/
+
+
+#################################
+###     UTILITY FUNCTIONS     ###
+#################################
+
+def yearGraph(tensor, col):
+    """NetworkX graph of the weights up to a column of the year axis"""
+    weights = tensor.edge_counts[:, :col + 1].sum(axis=1)
+    G = nx.Graph()
+    G.add_nodes_from(tensor.nodes)
+    for (u, v), w in zip(tensor.edges.tolist(), weights.tolist()):
+        if w:
+            G.add_edge(tensor.nodes[u], tensor.nodes[v], weight=w)
+    return G
+
+
+class EigenvectorSeriesTest(unittest.TestCase):
+    """eigenvectorSeries against nx.eigenvector_centrality"""
+
+    def testLaterComponent(self):
+        # a light triangle in 2000, a heavy triangle of new codes from 2001 on dominates
+        nodes = ["A1", "A2", "A3", "B1", "B2", "B3"]
+        edges = np.array([[0, 1], [0, 2], [1, 2], [3, 4], [3, 5], [4, 5]])
+        edge_counts = np.array([[1, 0], [1, 0], [1, 0], [0, 10], [0, 10], [0, 10]])
+        node_counts = np.zeros((len(nodes), 2), dtype=np.int64)
+        tensor = CoTagTensor(nodes, [2000, 2001], edges, edge_counts, node_counts)
+
+        years, table, diagnostics = eigenvectorSeries(tensor)
+        self.assertEqual(years, [2000, 2001])
+        for col in xrange(len(years)):
+            expected = nx.eigenvector_centrality(yearGraph(tensor, col), max_iter=1000, weight="weight")
+            self.assertTrue(diagnostics[col]["converged"])
+            np.testing.assert_allclose(table[col], [expected[code] for code in nodes], atol=1e-4)
+        # the heavy triangle holds the leading eigenvector, the light one has all but vanished
+        self.assertTrue((table[1, 3:] > 0.5).all())
+        self.assertTrue((table[1, :3] < 1e-3).all())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,189 @@
+# -*- coding: utf-8 -*-
+
+import BaseHTTPServer
+import SocketServer
+import threading
+from time import time
+import unittest
+
+import crawl_engine
+from crawl_engine import CrawlEngine
+from crawl_stats import CrawlStats
+
+# Python docs: https://docs.python.org/2/library/basehttpserver.html
+
+
+################################
+###     GLOBAL VARIABLES     ###
+################################
+
+# Canned pages by path
+PAGES = dict(("/page%i" % i, "<html>page %i</html>" % i) for i in xrange(8))
+
+# Paths answered with HTTP 503 on their first requests, and how many times
+FLAKY = {"/flaky": 2}
+
+# Paths always answered with HTTP 500
+DOWN = ("/down",)
+
+# Paths whose connection is closed after the response without announcing it, as an idle keep-alive timeout does
+DROP = ("/drop",)
+
+
+#################################
+###     UTILITY FUNCTIONS     ###
+#################################
+
+class CannedHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """Keep-alive handler serving PAGES, FLAKY and DOWN, logging every request"""
+
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.hits.append((self.path, self.client_address[1], time()))
+            hits = sum(1 for path, _, _ in server.hits if path == self.path)
+        if self.path in DOWN or hits <= FLAKY.get(self.path, 0):
+            status, body = (500 if self.path in DOWN else 503), ""
+        elif self.path in PAGES or self.path in FLAKY or self.path in DROP:
+            status, body = 200, PAGES.get(self.path, "<html>recovered</html>")
+        else:
+            status, body = 404, ""
+        self.send_response(status)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        if self.path in DROP:
+            self.close_connection = 1
+
+    def log_message(self, *args):
+        pass
+
+
+class CannedServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    """Local HTTP stand-in for the paper database, on a free port"""
+
+    daemon_threads = True
+
+    def __init__(self):
+        BaseHTTPServer.HTTPServer.__init__(self, ("127.0.0.1", 0), CannedHandler)
+        self.lock = threading.Lock()
+        self.hits = []
+
+    def url(self, path):
+        """Absolute URL of a path on this server"""
+        return "http://127.0.0.1:%i%s" % (self.server_address[1], path)
+
+
+class CrawlEngineTest(unittest.TestCase):
+    """CrawlEngine.map against canned pages"""
+
+    def setUp(self):
+        self.server = CannedServer()
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+        self.pages = {}
+        self.lock = threading.Lock()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def handler(self, url, body):
+        with self.lock:
+            self.pages[url] = body
+
+    def crawl(self, paths, **options):
+        engine = CrawlEngine(timeout=5, **options)
+        failed = engine.map(self.handler, [self.server.url(path) for path in paths])
+        return engine, failed
+
+    def testFetchesEveryPage(self):
+        paths = sorted(PAGES)
+        _, failed = self.crawl(paths, concurrency=4, rate=1000, burst=100)
+        self.assertEqual(failed, [])
+        self.assertEqual(self.pages, dict((self.server.url(path), PAGES[path]) for path in paths))
+
+    def testRateLimit(self):
+        # 6 requests at 20 per second after a burst of 1 take at least 5 intervals
+        paths = sorted(PAGES)[:6]
+        start = time()
+        self.crawl(paths, concurrency=3, rate=20, burst=1)
+        stamps = sorted(stamp for _, _, stamp in self.server.hits)
+        self.assertEqual(len(stamps), 6)
+        self.assertGreaterEqual(stamps[-1] - start, 5 / 20.0 * 0.9)
+
+    def testKeepAliveReuse(self):
+        # one worker sends every request over a single connection
+        _, failed = self.crawl(sorted(PAGES), concurrency=1, rate=1000, burst=100)
+        self.assertEqual(failed, [])
+        self.assertEqual(len(set(port for _, port, _ in self.server.hits)), 1)
+
+    def testRetryBackoff(self):
+        delays = []
+        backoff = crawl_engine.backoffDelay
+
+        def recordDelay(attempt, base, cap):
+            delays.append((attempt, base))
+            return backoff(attempt, base, cap)
+
+        crawl_engine.backoffDelay = recordDelay
+        try:
+            stats = CrawlStats(None)
+            _, failed = self.crawl(["/flaky"], concurrency=1, rate=1000, burst=100,
+                                   retries=3, backoff=0.01, stats=stats)
+        finally:
+            crawl_engine.backoffDelay = backoff
+        self.assertEqual(failed, [])
+        self.assertEqual(self.pages, {self.server.url("/flaky"): "<html>recovered</html>"})
+        self.assertEqual([path for path, _, _ in self.server.hits], ["/flaky"] * 3)
+        self.assertEqual(delays, [(0, 0.01), (1, 0.01)])
+        self.assertEqual(stats.counters["retries"], 2)
+
+    def testNoBackoffAfterLastAttempt(self):
+        delays = []
+        backoff = crawl_engine.backoffDelay
+
+        def recordDelay(attempt, base, cap):
+            delays.append(attempt)
+            return backoff(attempt, base, cap)
+
+        crawl_engine.backoffDelay = recordDelay
+        try:
+            stats = CrawlStats(None)
+            _, failed = self.crawl(["/down"], concurrency=1, rate=1000, burst=100,
+                                   retries=3, backoff=0.01, stats=stats)
+        finally:
+            crawl_engine.backoffDelay = backoff
+        self.assertEqual(failed, [self.server.url("/down")])
+        # three attempts, two waits between them and none after the last
+        self.assertEqual(sum(1 for path, _, _ in self.server.hits if path == "/down"), 3)
+        self.assertEqual(delays, [0, 1])
+        self.assertEqual(stats.counters["retries"], 2)
+
+    def testStaleConnectionReconnects(self):
+        # the second request finds its kept-alive connection closed and is resent at once
+        stats = CrawlStats(None)
+        start = time()
+        _, failed = self.crawl(["/drop", "/page0"], concurrency=1, rate=1000, burst=100,
+                               retries=3, backoff=30, stats=stats)
+        self.assertEqual(failed, [])
+        self.assertLess(time() - start, 5)
+        self.assertEqual(set(self.pages), set([self.server.url("/drop"), self.server.url("/page0")]))
+        self.assertEqual(stats.counters.get("retries", 0), 0)
+        self.assertEqual(stats.counters["reconnects"], 1)
+
+    def testFailedUrlReturned(self):
+        paths = ["/page0", "/down", "/missing"]
+        _, failed = self.crawl(paths, concurrency=2, rate=1000, burst=100, retries=2, backoff=0.01)
+        self.assertEqual(sorted(failed), sorted([self.server.url("/down"), self.server.url("/missing")]))
+        self.assertEqual(self.pages.keys(), [self.server.url("/page0")])
+        # 5xx is retried, 404 is not
+        self.assertEqual(sum(1 for path, _, _ in self.server.hits if path == "/down"), 2)
+        self.assertEqual(sum(1 for path, _, _ in self.server.hits if path == "/missing"), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from crawl_journal import CrawlJournal, JournalMismatchError
+
+
+################################
+###     GLOBAL VARIABLES     ###
+################################
+
+# Search query the journals belong to
+QUERY = "http://127.0.0.1/scripts/search.pl?jel=F*;pg="
+
+# Parsed pages: page -> ((year, codes) records, handles of the records)
+PAGES = {
+    1: ([("2001", ("F10", "F11")), ("2002", ())], ["/paper/x/p1", None]),
+    2: ([("2003", ("F12",))], ["/paper/x/p3"])}
+
+
+#################################
+###     UTILITY FUNCTIONS     ###
+#################################
+
+class CrawlJournalTest(unittest.TestCase):
+    """CrawlJournal replay, torn tail recovery and completion"""
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, "test.journal")
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def write(self, pages, query=QUERY):
+        journal = CrawlJournal(self.path, query).open()
+        for page in sorted(pages):
+            records, papers = PAGES[page]
+            journal.recordPage(page, records, [h for h in papers if h], papers)
+        journal.close()
+        return journal
+
+    def replay(self, query=QUERY):
+        pages, handles = {}, []
+        done = CrawlJournal(self.path, query).replay(
+            lambda page, records, papers: pages.__setitem__(page, (records, papers)), handles.extend)
+        return done, pages, handles
+
+    def testReplayRoundTrip(self):
+        self.write([1, 2])
+        done, pages, handles = self.replay()
+        self.assertEqual(done, set([1, 2]))
+        self.assertEqual(pages, PAGES)
+        self.assertEqual(handles, ["/paper/x/p1", "/paper/x/p3"])
+
+    def testTornTail(self):
+        self.write([1])
+        # a crash in the middle of page 2's block: a whole record, then half of one
+        with open(self.path, "ab") as f:
+            f.write("R\t2\t2003\tF12\t/paper/x/p3\nR\t2\t20")
+        done, pages, _ = self.replay()
+        self.assertEqual(done, set([1]))
+        self.assertEqual(pages, {1: PAGES[1]})
+
+        # reopening cuts the torn block, so page 2 written again is replayed once
+        self.write([2])
+        done, pages, _ = self.replay()
+        self.assertEqual(done, set([1, 2]))
+        self.assertEqual(pages, PAGES)
+
+    def testQueryMismatch(self):
+        self.write([1])
+        other = QUERY.replace("F*", "G*")
+        self.assertRaises(JournalMismatchError, self.replay, other)
+        self.assertRaises(JournalMismatchError, CrawlJournal(self.path, other).open)
+        # a fresh journal replaces it
+        CrawlJournal(self.path, other).open(fresh=True).close()
+        self.assertEqual(self.replay(other)[0], set())
+
+    def testComplete(self):
+        journal = self.write([1, 2])
+        self.assertFalse(journal.isComplete())
+        journal.complete()
+        self.assertTrue(journal.isComplete())
+        # the marker survives reopening and replay ignores it
+        self.assertEqual(self.replay()[1], PAGES)
+        CrawlJournal(self.path, QUERY).open().close()
+        self.assertTrue(journal.isComplete())
+        # a fresh start clears it
+        CrawlJournal(self.path, QUERY).open(fresh=True).close()
+        self.assertFalse(journal.isComplete())
+        self.assertEqual(self.replay()[0], set())
+
+
+if __name__ == "__main__":
+    unittest.main()
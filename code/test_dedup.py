@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+import dedup
+from dedup import BloomFilter, PaperSet, dropDuplicates
+
+
+################################
+###     GLOBAL VARIABLES     ###
+################################
+
+# Paper handles added to the indexes
+HANDLES = ["/paper/x/p%05d" % i for i in xrange(2000)]
+
+# Handles never added
+UNSEEN = ["/paper/y/p%05d" % i for i in xrange(2000)]
+
+
+#################################
+###     UTILITY FUNCTIONS     ###
+#################################
+
+class PaperIndexTest(unittest.TestCase):
+    """PaperSet and BloomFilter membership, persistence and dropDuplicates"""
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, "papers.bloom")
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def testPaperSet(self):
+        papers = PaperSet()
+        self.assertTrue(all(papers.add(handle) for handle in HANDLES))
+        self.assertFalse(any(papers.add(handle) for handle in HANDLES))
+        self.assertEqual(len(papers), len(HANDLES))
+        self.assertFalse(any(handle in papers for handle in UNSEEN))
+
+    def testBloomFilterError(self):
+        papers = BloomFilter.forCapacity(len(HANDLES), 0.01)
+        # a new paper is taken for a seen one about as often as the rate the filter was sized for
+        self.assertGreater(sum(papers.add(handle) for handle in HANDLES), 0.97 * len(HANDLES))
+        # no false negatives, and false positives near that rate
+        self.assertTrue(all(handle in papers for handle in HANDLES))
+        self.assertLess(sum(handle in papers for handle in UNSEEN), 0.03 * len(UNSEEN))
+
+    def testBloomFilterPersists(self):
+        papers = BloomFilter.forCapacity(len(HANDLES), 1e-4, self.path)
+        for handle in HANDLES[:1000]:
+            papers.add(handle)
+        papers.close()
+
+        # a later run loads the saved filter instead of sizing a new one
+        papers = BloomFilter.forCapacity(10, 0.5, self.path)
+        self.assertEqual(len(papers), 1000)
+        self.assertFalse(any(papers.add(handle) for handle in HANDLES[:1000]))
+        self.assertTrue(papers.add(HANDLES[1000]))
+
+    def testBloomFilterVersion(self):
+        BloomFilter.forCapacity(len(HANDLES), 1e-4, self.path).close()
+        with open(self.path, "rb") as f:
+            data = dict(np.load(f))
+        data["version"] = dedup.BLOOM_VERSION - 1
+        with open(self.path, "wb") as f:
+            np.savez(f, **data)
+        self.assertRaises(IOError, BloomFilter.load, self.path)
+
+    def testDropDuplicates(self):
+        papers = PaperSet()
+        first = [("2001", ("F10",), "/a"), ("2002", ("F11",), None), ("2003", ("F12",), "/b")]
+        self.assertEqual(dropDuplicates(papers, first), (first, ["/a", "/b"], 0))
+        # seen papers go, papers without a handle are always kept
+        second = [("2001", ("F10",), "/a"), ("2002", ("F11",), None), ("2004", ("F13",), "/c")]
+        self.assertEqual(dropDuplicates(papers, second), (second[1:], ["/c"], 1))
+
+
+if __name__ == "__main__":
+    unittest.main()
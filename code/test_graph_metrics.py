@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+
+import random
+import unittest
+
+import networkx as nx
+import numpy as np
+
+from clustering import averageClustering, localClustering
+from graph_arrays import adjacencyMatrix, letterGroups
+from modularity import graphModularity
+from path_metrics import pathMetrics, samplePathMetrics
+
+# NetworkX docs: https://networkx.github.io/documentation/latest/
+
+
+#################################
+###     UTILITY FUNCTIONS     ###
+#################################
+
+def codeGraph(n=40, k=4, p=0.3, seed=1):
+    """Connected small-world graph of JEL-like codes with integer edge weights"""
+    G = nx.connected_watts_strogatz_graph(n, k, p, seed=seed)
+    G = nx.relabel_nodes(G, dict((i, "%s%i" % ("ABC"[i % 3], i)) for i in G))
+    rs = random.Random(seed)
+    for u, v in G.edges():
+        G[u][v]["weight"] = rs.randint(1, 20)
+    return G
+
+
+def loopModularity(G, groups, weight=None):
+    """Modularity by the double loop over node pairs the sparse form replaced"""
+    group = dict((node, name) for name, members in groups.items() for node in members)
+    m = float(G.size(weight=weight))
+    degree = G.degree(weight=weight)
+    Q, Qmax = 0.0, 1.0
+    for u in G:
+        for v in G:
+            if group[u] == group[v]:
+                a = G[u][v].get(weight, 1) if weight is not None and G.has_edge(u, v) else int(G.has_edge(u, v))
+                Q += (a - degree[u] * degree[v] / m) / m
+                Qmax -= degree[u] * degree[v] / m / m
+    return Q, Qmax
+
+
+class GraphMetricsTest(unittest.TestCase):
+    """Sparse modularity, clustering and path metrics against NetworkX"""
+
+    def setUp(self):
+        self.G = codeGraph()
+
+    def testModularity(self):
+        groups = letterGroups(self.G.nodes())
+        for weight in (None, "weight"):
+            Q, Qmax, per_group = graphModularity(self.G, groups, weight)
+            expected = loopModularity(self.G, groups, weight)
+            np.testing.assert_allclose((Q, Qmax), expected, atol=1e-12)
+            np.testing.assert_allclose(sum(q for q, _ in per_group.values()), Q, atol=1e-12)
+
+    def testClustering(self):
+        nodes, A = adjacencyMatrix(self.G, "weight")
+        for weight in (None, "weight"):
+            expected = nx.clustering(self.G, weight=weight)
+            np.testing.assert_allclose(localClustering(A, weight is not None), [expected[node] for node in nodes],
+                                       atol=1e-12)
+            self.assertAlmostEqual(averageClustering(A, weight is not None),
+                                   nx.average_clustering(self.G, weight=weight), places=12)
+
+    def testPathMetrics(self):
+        _, A = adjacencyMatrix(self.G)
+        diameter, apl = pathMetrics(A, processes=1)
+        self.assertEqual(diameter, nx.diameter(self.G))
+        self.assertAlmostEqual(apl, nx.average_shortest_path_length(self.G), places=12)
+        # every node sampled gives the exact values
+        mean, err, lower, upper = samplePathMetrics(A, samples=len(self.G), seed=0, processes=1)
+        self.assertAlmostEqual(mean, apl, places=12)
+        self.assertEqual(err, 0.0)
+        self.assertLessEqual(lower, diameter)
+        self.assertGreaterEqual(upper, diameter)
+
+    def testDisconnected(self):
+        self.G.add_edge("X1", "X2")
+        _, A = adjacencyMatrix(self.G)
+        self.assertRaises(nx.NetworkXError, pathMetrics, A, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
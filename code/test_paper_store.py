@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+
+import os
+import random
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from aggregation import BulkCounts
+from paper_store import COLUMNS, PaperStore, aggregatePapers
+
+
+################################
+###     GLOBAL VARIABLES     ###
+################################
+
+# Codes the papers are drawn from, and the network's codes among them
+CODES = ["F10", "F11", "F12", "F13", "G11", "G12", "JEL"]
+NODES = ["F10", "F11", "F12", "F13"]
+
+
+#################################
+###     UTILITY FUNCTIONS     ###
+#################################
+
+def makePapers(n, seed=0):
+    """Random (year, codes) records and their handles, every third paper without one"""
+    rs = random.Random(seed)
+    records = [(str(rs.randint(1998, 2005)), tuple(rs.sample(CODES, rs.randint(0, 4)))) for _ in xrange(n)]
+    handles = [None if i % 3 == 0 else "/paper/x/p%05d" % i for i in xrange(n)]
+    return records, handles
+
+
+def assertTensorsEqual(a, b):
+    """Raise AssertionError unless two CoTagTensor objects hold the same counts"""
+    assert a.nodes == b.nodes and a.years == b.years, (a.nodes, b.nodes, a.years, b.years)
+    for name in ("edges", "edge_counts", "node_counts"):
+        np.testing.assert_array_equal(getattr(a, name), getattr(b, name))
+
+
+class PaperStoreTest(unittest.TestCase):
+    """PaperStore round trips, crash recovery and re-aggregation"""
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, "test.papers")
+        self.records, self.handles = makePapers(500)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def write(self, records, handles, flush_papers=64):
+        store = PaperStore.create(self.path, NODES, flush_papers, nodes=NODES)
+        store.append(records, handles)
+        store.close()
+        return store
+
+    def testRoundTrip(self):
+        self.write(self.records, self.handles)
+        store = PaperStore(self.path)
+        papers = store.arrays()
+        self.assertEqual(len(papers), len(self.records))
+        self.assertEqual(list(papers.records()), self.records)
+        self.assertEqual(papers.handles(), self.handles)
+        self.assertEqual(papers.handle(1), self.handles[1])
+        self.assertEqual(store.nodes, NODES)
+
+    def testTornTail(self):
+        store = self.write(self.records[:300], self.handles[:300])
+        # rows appended by a crashed run after its last commit
+        for column, dtype in COLUMNS:
+            with open(store.columnPath(column), "ab") as f:
+                np.ones(7, dtype=dtype).tofile(f)
+        self.assertEqual(list(PaperStore(self.path).arrays().records()), self.records[:300])
+
+        # they are cut before the next append
+        store = PaperStore(self.path)
+        store.append(self.records[300:], self.handles[300:])
+        store.close()
+        papers = PaperStore(self.path).arrays(mmap=False)
+        self.assertEqual(list(papers.records()), self.records)
+        self.assertEqual(papers.handles(), self.handles)
+
+    def testRebuild(self):
+        # the network's codes by default, as counted while crawling
+        self.write(self.records, self.handles)
+        counts = BulkCounts(NODES)
+        counts.addRecords(self.records)
+        assertTensorsEqual(aggregatePapers(self.path), counts.toTensor())
+
+        years = ("2000", "2003")
+        counts = BulkCounts(NODES)
+        counts.addRecords([(year, codes) for year, codes in self.records if "2000" <= year <= "2003"])
+        assertTensorsEqual(aggregatePapers(self.path, years=years), counts.toTensor(years))
+
+    def testCategoriesAndCodeCounts(self):
+        self.write(self.records, self.handles)
+        # the codes of other categories are stored and can be counted
+        counts = BulkCounts(["G11", "G12"])
+        counts.addRecords(self.records)
+        assertTensorsEqual(aggregatePapers(self.path, categories=["G"]), counts.toTensor())
+
+        # code counts bound the paper's number of codes, not its number among the nodes
+        counts = BulkCounts(NODES)
+        counts.addRecords([record for record in self.records if 2 <= len(record[1]) <= 3])
+        assertTensorsEqual(aggregatePapers(self.path, min_codes=2, max_codes=3), counts.toTensor())
+
+    def testMergedShards(self):
+        # two shards overlapping in their middle third are counted as one crawl
+        self.write(self.records, self.handles)
+        shard = os.path.join(self.dir, "shard.papers")
+        store = PaperStore.create(shard, nodes=NODES)
+        store.append(self.records[:200] + self.records[300:], self.handles[:200] + self.handles[300:])
+        store.close()
+        self.path = os.path.join(self.dir, "other.papers")
+        self.write(self.records[100:300], self.handles[100:300])
+
+        merged = aggregatePapers([shard, self.path])
+        # papers without a handle cannot be matched, those of the overlap are counted twice
+        twice = [record for record, handle in zip(self.records, self.handles)[100:200] if handle is None]
+        counts = BulkCounts(NODES)
+        counts.addRecords(self.records + twice)
+        assertTensorsEqual(merged, counts.toTensor())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,244 @@
+# -*- coding: utf-8 -*-
+
+import BaseHTTPServer
+import os
+import re
+import shutil
+import SocketServer
+import sys
+import tempfile
+import threading
+import unittest
+import urllib2
+
+import numpy as np
+
+from graph_store import STORE_EXT, loadTensor
+import repec_crawler
+from paper_store import PAPERS_EXT, PaperStore, aggregatePapers
+
+# Python docs: https://docs.python.org/2/library/basehttpserver.html
+
+
+################################
+###     GLOBAL VARIABLES     ###
+################################
+
+# Papers of the stand-in database, newest first: (link, year, JEL codes, date added)
+PAPERS = [
+    ("/paper/x/p4.htm", "2004", ("F11", "G11", "G12"), "2016-01-04"),
+    ("/paper/x/p3.htm", "2003", ("G11", "G12"), "2016-01-03"),
+    ("/paper/x/p2.htm", "2002", ("F10", "G11"), "2016-01-02"),
+    ("/paper/x/p1.htm", "2001", ("F10", "F11"), "2016-01-01")]
+
+# Papers added to the stand-in database later, newest first
+LATER = [
+    ("/paper/x/p9.htm", "2004", ("F12", "F13"), "2016-01-09"),
+    ("/paper/x/p8.htm", "2002", ("F10", "F12", "G12"), "2016-01-08"),
+    ("/paper/x/p7.htm", "2003", ("F11", "F13"), "2016-01-07"),
+    ("/paper/x/p6.htm", "2001", ("F10", "F11", "F13"), "2016-01-06"),
+    ("/paper/x/p5.htm", "2004", ("F12",), "2016-01-05")]
+
+# Papers per results page
+PER_PAGE = 2
+
+# Crawler options of every test run
+OPTIONS = {"CONCURRENCY": 2, "RATE_PER_HOST": 1000, "BURST": 100, "RETRIES": 2, "BACKOFF": 0.01,
+           "PARSE_PROCESSES": 1, "OUTPUT_GEXF": False, "OUTPUT_ZEN_GML": False, "RESUME": True,
+           "DELTA": False, "DEDUP": True, "STORE_PAPERS": True, "CACHE_PAGES": False, "REPLAY": False,
+           "STATS_INTERVAL": None, "DEBUG": False}
+
+
+#################################
+###     UTILITY FUNCTIONS     ###
+#################################
+
+class SearchHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """Keep-alive handler answering JEL searches over the server's papers like the paper database"""
+
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        query = urllib2.unquote(re.search("jel=([^;]*)", self.path).group(1))
+        letters = tuple(term[0] for term in query.split())
+        papers = [paper for paper in self.server.papers if any(code.startswith(letters) for code in paper[2])]
+        pg = int(re.search("pg=(\d*)", self.path).group(1) or 1)
+        if pg in self.server.down:
+            self.send_response(500)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        items = ["<li><a href='%s'>Title</a><br><i>Author</i><br><small><b>JEL-codes:</b> %s<br>"
+                 "<b>Revised:</b> %s-01<b>Added</b> %s</small>" % (link, " ".join(codes), year, added)
+                 for link, year, codes, added in papers[(pg - 1) * PER_PAGE:pg * PER_PAGE]]
+        body = ("<html><h1 class='colored'>Search Results</h1><br>Documents 1-%i of %i pages<ol>%s</ol></html>"
+                % (PER_PAGE, (len(papers) + PER_PAGE - 1) // PER_PAGE, "".join(items)))
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class SearchServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    """Local HTTP stand-in for the paper database, on a free port"""
+
+    daemon_threads = True
+
+    def __init__(self):
+        BaseHTTPServer.HTTPServer.__init__(self, ("127.0.0.1", 0), SearchHandler)
+        self.papers = list(PAPERS)
+        self.down = set()
+
+    def url(self, categories):
+        """Search URL of categories, ending where the page number goes"""
+        query = urllib2.quote("* ".join(categories) + "*", ":/")
+        return "http://127.0.0.1:%i/scripts/search.pl?jel=%s;pg=" % (self.server_address[1], query)
+
+
+def edgeWeight(tensor, a, b):
+    """Total weight of the edge between two codes, 0 if absent"""
+    u, v = sorted([tensor.nodes.index(a), tensor.nodes.index(b)])
+    match = (tensor.edges[:, 0] == u) & (tensor.edges[:, 1] == v)
+    return int(tensor.edge_total[match].sum())
+
+
+class CrawlerTest(unittest.TestCase):
+    """Crawler runs against a stand-in paper database, each in a fresh directory"""
+
+    def setUp(self):
+        self.server = SearchServer()
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+        self.path = tempfile.mkdtemp()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.path)
+
+    def crawl(self, categories, name, dedup_path=None, delta=False):
+        """Run the crawler over categories, returning the path of its paper store"""
+        for option, value in OPTIONS.items():
+            setattr(repec_crawler, option, value)
+        repec_crawler.CATEGORIES = categories
+        repec_crawler.URL = self.server.url(categories)
+        repec_crawler.OUTPUT_PATH = os.path.join(self.path, name)
+        repec_crawler.DEDUP_PATH = dedup_path
+        repec_crawler.DELTA = delta
+        stdout, sys.stdout = sys.stdout, open(os.devnull, "w")
+        try:
+            repec_crawler.main()
+        finally:
+            sys.stdout.close()
+            sys.stdout = stdout
+        return repec_crawler.OUTPUT_PATH + PAPERS_EXT
+
+
+class ShardTest(CrawlerTest):
+    """Per-category crawls of overlapping categories, combined by handle"""
+
+    def assertCountedOnce(self, tensor):
+        # p2 is the only paper with F10 and G11, p3 and p4 both have G11 and G12
+        self.assertEqual(edgeWeight(tensor, "F10", "G11"), 1)
+        self.assertEqual(edgeWeight(tensor, "G11", "G12"), 2)
+        self.assertEqual(edgeWeight(tensor, "F11", "G12"), 1)
+        reference = aggregatePapers(self.crawl(["F", "G"], "fg"))
+        self.assertEqual(tensor.nodes, reference.nodes)
+        self.assertEqual(tensor.years, reference.years)
+        np.testing.assert_array_equal(tensor.edges, reference.edges)
+        np.testing.assert_array_equal(tensor.edge_counts, reference.edge_counts)
+        np.testing.assert_array_equal(tensor.node_counts, reference.node_counts)
+
+    def testSharedIndex(self):
+        # the G shard skips p2 and p4, which the F shard recorded with their G codes
+        dedup_path = os.path.join(self.path, "papers.bloom")
+        stores = [self.crawl(["F"], "f", dedup_path), self.crawl(["G"], "g", dedup_path)]
+        self.assertEqual(len(repec_crawler.papers), len(PAPERS))
+        self.assertEqual(PaperStore(stores[1]).arrays().handles(), ["/paper/x/p3"])
+        self.assertCountedOnce(aggregatePapers(stores))
+
+    def testMergedStores(self):
+        # without a shared index both shards record p2 and p4, the merge counts them once
+        stores = [self.crawl(["F"], "f"), self.crawl(["G"], "g")]
+        self.assertCountedOnce(aggregatePapers(stores))
+
+
+
+class Crash(Exception):
+    """Raised in place of a crawler step to simulate a crash there"""
+    pass
+
+
+class DeltaTest(CrawlerTest):
+    """Delta crawls merged into a stored network, against a full crawl of the same papers"""
+
+    def assertSameCrawl(self, name, reference):
+        base, other = os.path.join(self.path, name), os.path.join(self.path, reference)
+        for a, b in [(loadTensor(base + STORE_EXT)[0], loadTensor(other + STORE_EXT)[0]),
+                     (aggregatePapers(base + PAPERS_EXT), aggregatePapers(other + PAPERS_EXT))]:
+            self.assertEqual(a.nodes, b.nodes)
+            self.assertEqual(a.years, b.years)
+            np.testing.assert_array_equal(a.edges, b.edges)
+            np.testing.assert_array_equal(a.edge_counts, b.edge_counts)
+            np.testing.assert_array_equal(a.node_counts, b.node_counts)
+
+    def crashOnce(self, step):
+        """Make a crawler step raise Crash the next time it is called"""
+        original = getattr(repec_crawler, step)
+
+        def crash(*args, **kwargs):
+            setattr(repec_crawler, step, original)
+            raise Crash(step)
+
+        setattr(repec_crawler, step, crash)
+        self.addCleanup(setattr, repec_crawler, step, original)
+
+    def testDeltaEqualsFullCrawl(self):
+        self.crawl(["F"], "f")
+        self.server.papers = LATER[2:] + PAPERS
+        self.crawl(["F"], "f", delta=True)
+        self.server.papers = LATER + PAPERS
+        self.crawl(["F"], "f", delta=True)
+        self.crawl(["F"], "full")
+        self.assertSameCrawl("f", "full")
+
+        # a delta crawl finding no new papers leaves the network as it was
+        self.crawl(["F"], "f", delta=True)
+        self.assertSameCrawl("f", "full")
+
+    def testInterruptedMerge(self):
+        self.server.papers = LATER + PAPERS
+        self.crawl(["F"], "full")
+        for step in ("writeNetwork", "archiveJournal", "saveDeltaState"):
+            name = "f_" + step
+            self.server.papers = list(PAPERS)
+            self.crawl(["F"], name)
+            self.server.papers = LATER[2:] + PAPERS
+            self.crashOnce(step)
+            self.assertRaises(Crash, self.crawl, ["F"], name, delta=True)
+            # the next delta crawl completes the merge once, then adds the newer papers
+            self.server.papers = LATER + PAPERS
+            self.crawl(["F"], name, delta=True)
+            self.crawl(["F"], name, delta=True)
+            self.assertSameCrawl(name, "full")
+
+    def testFailedPages(self):
+        self.server.papers = LATER + PAPERS
+        self.crawl(["F"], "full")
+        self.server.papers = list(PAPERS)
+        self.crawl(["F"], "f")
+        # the watermark stays, so the next delta crawl fetches the failed page's papers
+        self.server.papers = LATER + PAPERS
+        self.server.down = set([2])
+        self.crawl(["F"], "f", delta=True)
+        self.server.down = set()
+        self.crawl(["F"], "f", delta=True)
+        self.assertSameCrawl("f", "full")
+
+
+if __name__ == "__main__":
+    unittest.main()